@@ -0,0 +1,62 @@
+from fastapi import Request
+from fastapi.responses import Response
+from typing import Awaitable, Callable, Optional
+from urllib.parse import urlencode
+from ..core.metrics import CACHE_REQUESTS
+from ..db.database import SessionLocal
+from ..services.response_cache import CachedResponse, response_cache
+from ..services.session_service import session_service
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
+async def cached_response(
+    request: Request,
+    session_id: str,
+    compute: Callable[[], Awaitable[Response]],
+    body_key: str = ""
+) -> Response:
+    """
+    Serve a deterministic analysis response through ETags and the response cache
+    
+    The ETag is derived from the session's content version and the request's
+    path, query and body_key, so it can be checked with one primary-key
+    lookup before anything is computed. A matching If-None-Match gets a 304;
+    a cache hit is returned as stored; only a miss calls compute.
+    
+    Args:
+        request: Incoming request
+        session_id: Session the response is derived from
+        compute: Produces the response on a cache miss
+        body_key: Canonical form of any request body that affects the result
+    
+    Returns:
+        Response carrying the ETag
+    """
+    # Short-lived session so no connection is held while computing
+    async with SessionLocal() as db:
+        version = await session_service.content_version(db, session_id)
+    query = urlencode(sorted(request.query_params.multi_items()))
+    etag = response_cache.make_etag(session_id, version, f"{request.url.path}?{query}\0{body_key}")
+    # Clients may keep the response but must revalidate, which is nearly free
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        CACHE_REQUESTS.labels("response", "not_modified").inc()
+        return Response(status_code=304, headers=headers)
+    
+    entry = await response_cache.get(etag)
+    if entry is None:
+        response = await compute()
+        if response.status_code != 200:
+            return response
+        entry = CachedResponse(response.body, response.media_type)
+        await response_cache.put(etag, entry)
+    
+    return Response(content=entry.body, media_type=entry.media_type, headers=headers)
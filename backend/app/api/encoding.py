@@ -0,0 +1,116 @@
+from fastapi import Query
+from fastapi.responses import Response
+from pydantic import BaseModel
+from enum import Enum
+import base64
+import numpy as np
+import orjson
+from typing import Any, Dict, List, Optional, Union
+
+# Response fields holding vectors or matrices rather than scalar values
+VECTOR_FIELDS = {"linkage_matrix", "centroid"}
+
+class VectorFormat(str, Enum):
+    LIST = "list"  # Nested JSON number arrays
+    BASE64 = "base64"  # Little-endian float32 blocks, base64 encoded
+
+class EncodingOptions:
+    """Query options controlling how analysis responses are serialized"""
+    
+    def __init__(
+        self,
+        vector_format: VectorFormat = Query(
+            VectorFormat.LIST,
+            description="Encoding for linkage matrices and centroids"
+        ),
+        include_centroids: bool = Query(True, description="Include cluster centroid vectors"),
+        include_nodes: bool = Query(
+            True,
+            description="Include dendrogram nodes; they can be rebuilt from the linkage matrix"
+        ),
+        include_node_items: bool = Query(
+            True,
+            description="List every file id under internal dendrogram nodes (leaves always carry theirs)"
+        ),
+        precision: Optional[int] = Query(
+            None,
+            ge=0,
+            le=15,
+            description="Round distances and scores to this many decimal places"
+        )
+    ):
+        self.vector_format = vector_format
+        self.include_centroids = include_centroids
+        self.include_nodes = include_nodes
+        self.include_node_items = include_node_items
+        self.precision = precision
+
+def encode_array(values: Any) -> Dict[str, Any]:
+    """
+    Pack a vector or matrix as a base64 block of little-endian float32
+    
+    Returns:
+        Dictionary with dtype, shape and base64 data, which clients decode
+        with a single Float32Array view
+    """
+    array = np.ascontiguousarray(values, dtype="<f4")
+    return {
+        "dtype": "float32",
+        "shape": list(array.shape),
+        "data": base64.b64encode(array.tobytes()).decode("ascii")
+    }
+
+def _transform(value: Any, options: EncodingOptions) -> Any:
+    if isinstance(value, dict):
+        result = {}
+        for key, item in value.items():
+            if key in VECTOR_FIELDS and item is not None:
+                if key == "centroid" and not options.include_centroids:
+                    item = None
+                elif options.vector_format == VectorFormat.BASE64:
+                    item = encode_array(item)
+                elif options.precision is not None:
+                    item = np.round(np.asarray(item, dtype=np.float64), options.precision)
+                result[key] = item
+            else:
+                result[key] = _transform(item, options)
+        return result
+    if isinstance(value, list):
+        return [_transform(item, options) for item in value]
+    if isinstance(value, float) and options.precision is not None:
+        return round(value, options.precision)
+    return value
+
+def vector_response(
+    content: Union[BaseModel, List[BaseModel]],
+    options: EncodingOptions
+) -> Response:
+    """
+    Serialize an analysis response with orjson, applying the encoding options
+    
+    The default options skip the transform pass entirely, so the common
+    case is a model dump followed by a single orjson call.
+    
+    Args:
+        content: Response model or list of models
+        options: Encoding options from the request
+    
+    Returns:
+        JSON response
+    """
+    if isinstance(content, list):
+        data = [item.model_dump() for item in content]
+    else:
+        data = content.model_dump()
+    
+    if (
+        options.vector_format != VectorFormat.LIST
+        or not options.include_centroids
+        or options.precision is not None
+    ):
+        data = _transform(data, options)
+    
+    return Response(
+        content=orjson.dumps(data, option=orjson.OPT_SERIALIZE_NUMPY),
+        media_type="application/json"
+    )
@@ -0,0 +1,23 @@
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.responses import FileResponse
+from typing import Any, Dict, List, Optional
+import secrets
+from ...core.config import settings
+from ...core.profiling import profile_store
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    if not settings.ADMIN_TOKEN or not secrets.compare_digest(x_admin_token or "", settings.ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+router = APIRouter(prefix="/api/admin", tags=["admin"], dependencies=[Depends(require_admin)])
+
+@router.get("/profiles")
+async def list_profiles() -> List[Dict[str, Any]]:
+    return profile_store.list()
+
+@router.get("/profiles/{profile_id}")
+async def download_profile(profile_id: str):
+    path = profile_store.path(profile_id)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, media_type="application/octet-stream", filename=f"{profile_id}.pstats")
@@ -0,0 +1,177 @@
+from fastapi import APIRouter, Depends, Query, Request
+from typing import Optional
+from ...core.config import settings
+from ...schemas.clustering import (
+    AnomalyDetectionResponse,
+    AnomalyItem,
+    DuplicateDetectionResponse,
+    DuplicateGroup,
+    DuplicateItem,
+    DuplicatePair
+)
+from ...services.anomaly_service import AnomalyMethod, NeighborSource, anomaly_service
+from ...services.clustering_service import clustering_service
+from ...services.projection_service import projection_service
+from ...services.duplicate_service import duplicate_service
+from ...services.qdrant_service import qdrant_service
+from ..caching import cached_response
+from ..encoding import EncodingOptions, vector_response
+
+router = APIRouter(prefix="/api/analysis", tags=["analysis"])
+
+@router.get("/anomalies/{session_id}", response_model=AnomalyDetectionResponse)
+async def detect_anomalies(
+    session_id: str,
+    http_request: Request,
+    threshold_percentile: float = Query(95.0, gt=0, lt=100),
+    method: AnomalyMethod = Query(AnomalyMethod.CENTROID, description="Anomaly scoring method"),
+    k: Optional[int] = Query(
+        None,
+        ge=1,
+        le=100,
+        description="Neighbours per item for knn and lof (defaults to ANOMALY_KNN_K)"
+    ),
+    neighbors: Optional[NeighborSource] = Query(
+        None,
+        description="Neighbour source for knn and lof (defaults to ANOMALY_NEIGHBOR_SOURCE)"
+    ),
+    projection_dim: Optional[int] = Query(
+        None,
+        ge=0,
+        description="Cluster or search neighbours in this many PCA dimensions; 0 uses the raw vectors "
+                    "(defaults to CLUSTERING_PROJECTION_DIM)"
+    ),
+    options: EncodingOptions = Depends()
+):
+    """
+    Items that sit far from the rest of the session
+    
+    The centroid method scores the distance to the nearest cluster centroid
+    and needs a full clustering first. knn scores the distance to the k-th
+    nearest neighbour and lof the local outlier factor; both skip clustering,
+    so they report that distance as distance_to_nearest_cluster and no
+    cluster_id.
+    
+    With projection_dim, the linkage of the centroid method and the local
+    neighbour search run on the session's PCA projection; centroids and
+    their distances stay in the original space, and Qdrant searches always
+    use the stored vectors.
+    """
+    # Defaults come from settings, so the resolved values must be part of the ETag
+    k = k or settings.ANOMALY_KNN_K
+    source = neighbors or NeighborSource(settings.ANOMALY_NEIGHBOR_SOURCE)
+    projection_dim = projection_service.dimension(projection_dim)
+    
+    async def compute():
+        embeddings = await qdrant_service.get_all_embeddings_for_session(session_id)
+        anomalies, threshold, projection = [], 0.0, None
+        if len(embeddings) >= 2 and (method == AnomalyMethod.CENTROID or source == NeighborSource.LOCAL):
+            projection = await projection_service.reduce(session_id, embeddings, projection_dim)
+        vectors = projection.vectors if projection else None
+        
+        if len(embeddings) >= 2 and method != AnomalyMethod.CENTROID:
+            anomalies, threshold = await anomaly_service.detect_anomalies(
+                embeddings,
+                session_id,
+                method=method,
+                k=k,
+                threshold_percentile=threshold_percentile,
+                neighbor_source=source,
+                vectors=vectors
+            )
+        elif len(embeddings) >= 2:
+            linkage_matrix, embeddings = await clustering_service.perform_agglomerative_clustering(
+                embeddings,
+                vectors=vectors
+            )
+            summaries = await clustering_service.compute_cluster_summaries(embeddings, linkage_matrix)
+            anomalies, threshold = await clustering_service.detect_anomalies(
+                embeddings,
+                summaries,
+                threshold_percentile=threshold_percentile
+            )
+        
+        return vector_response(
+            AnomalyDetectionResponse(
+                session_id=session_id,
+                anomalies=[
+                    AnomalyItem(
+                        file_id=a['file_id'],
+                        filename=a['filename'],
+                        file_type=a['file_type'],
+                        anomaly_score=float(a.get('score', a['distance'])),
+                        distance_to_nearest_cluster=float(a['distance']),
+                        cluster_id=a['cluster_id']
+                    )
+                    for a in anomalies
+                ],
+                threshold=threshold,
+                total_files=len(embeddings),
+                anomaly_count=len(anomalies),
+                projection=projection_service.describe(projection, embeddings)
+            ),
+            options
+        )
+    
+    return await cached_response(
+        http_request,
+        session_id,
+        compute,
+        body_key=f"k={k}&neighbors={source.value}&projection_dim={projection_dim}"
+    )
+
+@router.get("/duplicates/{session_id}", response_model=DuplicateDetectionResponse)
+async def detect_duplicates(
+    session_id: str,
+    http_request: Request,
+    threshold: float = Query(0.95, gt=0, le=1, description="Minimum cosine similarity"),
+    max_pairs: int = Query(0, ge=0, le=settings.DUPLICATE_MAX_PAIRS, description="Duplicate pairs to list"),
+    options: EncodingOptions = Depends()
+):
+    """
+    Groups of near-identical items, e.g. several photos of the same SKU
+    
+    Items are connected when their embeddings' cosine similarity reaches the
+    threshold, and each group is a connected component of that graph, so two
+    members of a group may only be linked through others.
+    """
+    async def compute():
+        embeddings = await qdrant_service.get_all_embeddings_for_session(session_id)
+        result = await duplicate_service.find_session_duplicates(embeddings, threshold, max_pairs)
+        
+        def item(index: int, best_similarity: float) -> DuplicateItem:
+            payload = embeddings[index]['payload']
+            return DuplicateItem(
+                file_id=str(embeddings[index]['id']),
+                filename=payload.get('filename', 'unknown'),
+                file_type=payload.get('file_type', 'unknown'),
+                best_similarity=best_similarity
+            )
+        
+        return vector_response(
+            DuplicateDetectionResponse(
+                session_id=session_id,
+                threshold=threshold,
+                total_files=len(embeddings),
+                groups=[
+                    DuplicateGroup(
+                        group_id=group_id,
+                        item_count=len(members),
+                        items=[item(index, best) for index, best in members]
+                    )
+                    for group_id, members in enumerate(result['groups'])
+                ],
+                pair_count=result['pair_count'],
+                pairs=[
+                    DuplicatePair(
+                        file_id_a=str(embeddings[a]['id']),
+                        file_id_b=str(embeddings[b]['id']),
+                        similarity=similarity
+                    )
+                    for a, b, similarity in result['pairs']
+                ]
+            ),
+            options
+        )
+    
+    return await cached_response(http_request, session_id, compute)
@@ -0,0 +1,162 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import Response
+from typing import Any, Dict, List, Optional
+import numpy as np
+from ...schemas.clustering import ClusterRequest, ClusterSummary, DendrogramResponse, ProjectionReport
+from ...services.clustering_service import clustering_service
+from ...services.projection_service import projection_service
+from ...services.qdrant_service import qdrant_service
+from ..caching import cached_response
+from ..encoding import EncodingOptions, vector_response
+
+router = APIRouter(prefix="/api/clustering", tags=["clustering"])
+
+PROJECTION_DIM_DESCRIPTION = "Cluster in this many PCA dimensions; 0 uses the raw vectors (defaults to CLUSTERING_PROJECTION_DIM)"
+
+async def _session_embeddings(session_id: str) -> List[Dict[str, Any]]:
+    embeddings = await qdrant_service.get_all_embeddings_for_session(session_id)
+    if len(embeddings) < 2:
+        raise HTTPException(status_code=400, detail="Need at least 2 embedded files for clustering")
+    return embeddings
+
+async def _dendrogram(
+    session_id: str,
+    num_clusters: Optional[int],
+    distance_threshold: Optional[float],
+    projection_dim: Optional[int],
+    options: EncodingOptions
+) -> Response:
+    embeddings = await _session_embeddings(session_id)
+    projection = await projection_service.reduce(session_id, embeddings, projection_dim)
+    linkage_matrix, embeddings = await clustering_service.perform_agglomerative_clustering(
+        embeddings,
+        vectors=projection.vectors if projection else None
+    )
+    nodes = []
+    if options.include_nodes:
+        nodes = await clustering_service.generate_dendrogram_structure(
+            linkage_matrix,
+            embeddings,
+            include_items=options.include_node_items
+        )
+    summaries = await clustering_service.compute_cluster_summaries(
+        embeddings,
+        linkage_matrix,
+        num_clusters=num_clusters,
+        distance_threshold=distance_threshold
+    )
+    
+    return vector_response(
+        DendrogramResponse(
+            session_id=session_id,
+            linkage_matrix=linkage_matrix.tolist(),
+            nodes=nodes,
+            cluster_summaries=summaries,
+            total_items=len(embeddings),
+            projection=projection_service.describe(projection, embeddings)
+        ),
+        options
+    )
+
+@router.post("/dendrogram", response_model=DendrogramResponse)
+async def generate_dendrogram(
+    request: ClusterRequest,
+    http_request: Request,
+    options: EncodingOptions = Depends()
+):
+    # Key on the resolved dimension so a changed CLUSTERING_PROJECTION_DIM gets a new ETag
+    request = request.model_copy(update={"projection_dim": projection_service.dimension(request.projection_dim)})
+    return await cached_response(
+        http_request,
+        request.session_id,
+        lambda: _dendrogram(
+            request.session_id,
+            request.num_clusters,
+            request.distance_threshold,
+            request.projection_dim,
+            options
+        ),
+        body_key=request.model_dump_json()
+    )
+
+@router.get("/dendrogram/{session_id}", response_model=DendrogramResponse)
+async def get_dendrogram(
+    session_id: str,
+    http_request: Request,
+    num_clusters: Optional[int] = None,
+    distance_threshold: Optional[float] = None,
+    projection_dim: Optional[int] = Query(None, ge=0, description=PROJECTION_DIM_DESCRIPTION),
+    options: EncodingOptions = Depends()
+):
+    """Same as POST /dendrogram, as a GET so browsers can revalidate it with If-None-Match"""
+    projection_dim = projection_service.dimension(projection_dim)
+    return await cached_response(
+        http_request,
+        session_id,
+        lambda: _dendrogram(session_id, num_clusters, distance_threshold, projection_dim, options),
+        body_key=f"projection_dim={projection_dim}"
+    )
+
+@router.get("/clusters/{session_id}", response_model=List[ClusterSummary])
+async def get_clusters(
+    session_id: str,
+    http_request: Request,
+    num_clusters: Optional[int] = None,
+    distance_threshold: Optional[float] = None,
+    projection_dim: Optional[int] = Query(None, ge=0, description=PROJECTION_DIM_DESCRIPTION),
+    options: EncodingOptions = Depends()
+):
+    projection_dim = projection_service.dimension(projection_dim)
+    
+    async def compute():
+        embeddings = await _session_embeddings(session_id)
+        projection = await projection_service.reduce(session_id, embeddings, projection_dim)
+        linkage_matrix, embeddings = await clustering_service.perform_agglomerative_clustering(
+            embeddings,
+            vectors=projection.vectors if projection else None
+        )
+        summaries = await clustering_service.compute_cluster_summaries(
+            embeddings,
+            linkage_matrix,
+            num_clusters=num_clusters,
+            distance_threshold=distance_threshold
+        )
+        return vector_response(summaries, options)
+    
+    return await cached_response(
+        http_request,
+        session_id,
+        compute,
+        body_key=f"projection_dim={projection_dim}"
+    )
+
+@router.get("/projection/{session_id}", response_model=ProjectionReport)
+async def get_projection_report(
+    session_id: str,
+    http_request: Request,
+    max_dimension: int = Query(256, ge=1, le=1024, description="Components to report"),
+    options: EncodingOptions = Depends()
+):
+    """
+    Variance kept by each projection dimension, for choosing projection_dim
+    
+    Linkage cost grows with the dimension while the share of variance kept
+    saturates, so the knee of cumulative_variance_ratio is a good setting.
+    """
+    async def compute():
+        embeddings = await _session_embeddings(session_id)
+        dimension = min(max_dimension, len(embeddings), len(embeddings[0]['vector']))
+        projection = await projection_service.project_session(session_id, embeddings, dimension)
+        explained = projection.explained_variance_ratio
+        return vector_response(
+            ProjectionReport(
+                session_id=session_id,
+                total_items=len(embeddings),
+                original_dimension=len(embeddings[0]['vector']),
+                explained_variance_ratio=explained.tolist(),
+                cumulative_variance_ratio=np.cumsum(explained).tolist()
+            ),
+            options
+        )
+    
+    return await cached_response(http_request, session_id, compute)
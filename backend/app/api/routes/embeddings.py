@@ -0,0 +1,45 @@
+from fastapi import APIRouter, Depends, Header
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
+from ...db.database import get_db
+from ...schemas.embedding import SessionEmbeddingSummary
+from ...services.file_service import file_service
+from ...services.progress_service import progress_broker
+
+router = APIRouter(prefix="/api/embeddings", tags=["embeddings"])
+
+@router.get("/session/{session_id}/summary", response_model=SessionEmbeddingSummary)
+async def get_session_embedding_summary(session_id: str, db: AsyncSession = Depends(get_db)):
+    counts = await file_service.count_by_status(db, session_id)
+    return SessionEmbeddingSummary(
+        session_id=session_id,
+        total=sum(counts.values()),
+        **{status.value: count for status, count in counts.items()}
+    )
+
+@router.get("/session/{session_id}/events")
+async def stream_session_progress(
+    session_id: str,
+    cursor: Optional[str] = None,
+    last_event_id: Optional[str] = Header(None)
+):
+    """
+    Server-Sent Events stream of SessionEmbeddingSummary snapshots
+    
+    Browsers resend the last event id in the Last-Event-ID header when they
+    reconnect; clients that manage their own reconnects can pass it as cursor.
+    """
+    async def events():
+        yield "retry: 3000\n\n"
+        async for event_id, summary in progress_broker.subscribe(session_id, last_event_id or cursor):
+            if summary is None:
+                yield ": keepalive\n\n"
+            else:
+                yield f"id: {event_id}\nevent: progress\ndata: {summary.model_dump_json()}\n\n"
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -0,0 +1,163 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, UploadFile
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+import asyncio
+import tarfile
+import uuid
+from ...db.database import get_db
+from ...models.file import File, EmbeddingStatus
+from ...schemas.file import ArchiveIngestResponse, FileResponse, FileListResponse, FileUploadResponse
+from ...services.archive_stream import ArchiveError
+from ...services.file_service import file_service, InvalidCursorError
+from ...services.ingestion_service import ingestion_service
+from ...services.job_queue import job_queue
+from ...services.s3_service import s3_service
+from ...services.thumbnail_service import thumbnail_service
+
+router = APIRouter(prefix="/api/files", tags=["files"])
+
+async def _with_urls(files: List[File]) -> List[FileResponse]:
+    """Attach presigned original and thumbnail URLs, signed as one batch"""
+    keys = []
+    for f in files:
+        keys.append(f.s3_key)
+        if f.has_thumbnails:
+            keys.extend(thumbnail_service.thumbnail_key(f.s3_key, size) for size in thumbnail_service.sizes)
+    
+    # Repeat views of the same listing are served from the URL cache
+    urls = await s3_service.get_file_urls(keys)
+    
+    responses = []
+    for f in files:
+        response = FileResponse.model_validate(f)
+        response.url = urls[f.s3_key]
+        if f.has_thumbnails:
+            response.thumbnails = {
+                size: urls[thumbnail_service.thumbnail_key(f.s3_key, size)]
+                for size in sorted(thumbnail_service.sizes)
+            }
+        responses.append(response)
+    return responses
+
+@router.post("/upload", response_model=List[FileUploadResponse])
+async def upload_files(
+    session_id: str,
+    files: List[UploadFile],
+    db: AsyncSession = Depends(get_db)
+):
+    uploads = []
+    for upload in files:
+        file_type = ingestion_service.classify_file(upload.filename, upload.content_type)
+        if file_type is None:
+            raise HTTPException(status_code=400, detail=f"Unsupported file type: {upload.filename}")
+        
+        file_id = str(uuid.uuid4())
+        data = await upload.read()
+        record = File(
+            id=file_id,
+            session_id=session_id,
+            filename=upload.filename,
+            file_type=file_type,
+            mime_type=ingestion_service.guess_mime_type(upload.filename, upload.content_type),
+            file_size=len(data),
+            s3_bucket=s3_service.bucket_name,
+            s3_key=ingestion_service.object_key(session_id, file_id, upload.filename),
+            embedding_status=EmbeddingStatus.PENDING
+        )
+        uploads.append((record, data))
+    
+    # Every upload is let finish, so the stored objects are known for the cleanup below
+    stored, error = [], None
+    async for object_key, result in s3_service.upload_many(
+        ((record.s3_key, data, record.mime_type) for record, data in uploads),
+        return_exceptions=True
+    ):
+        if isinstance(result, BaseException):
+            error = error or result
+        else:
+            stored.append(object_key)
+    
+    try:
+        if error is not None:
+            raise error
+        # Rows and their embedding jobs commit together, so no upload is left without work queued
+        records = [record for record, _ in uploads]
+        db.add_all(records)
+        await db.flush()
+        await job_queue.enqueue(db, session_id, [record.id for record in records])
+        await db.commit()
+    except Exception:
+        # No row points at the stored objects; don't leave them behind
+        await db.rollback()
+        await asyncio.gather(*(s3_service.delete_file(object_key) for object_key in stored))
+        raise
+    
+    return [
+        FileUploadResponse(
+            file_id=record.id,
+            filename=record.filename,
+            file_type=record.file_type,
+            file_size=record.file_size,
+            s3_path=f"{record.s3_bucket}/{record.s3_key}",
+            embedding_status=record.embedding_status,
+            message="File uploaded successfully, embedding generation in progress"
+        )
+        for record, _ in uploads
+    ]
+
+@router.post("/ingest", response_model=ArchiveIngestResponse)
+async def ingest_archive(session_id: str, request: Request, db: AsyncSession = Depends(get_db)):
+    """
+    Bulk-ingest a zip or tar(.gz/.bz2/.xz) archive sent as the raw request body
+    
+    The body is not multipart: it is unpacked as it streams in, so send the
+    archive bytes directly (e.g. curl --data-binary @inventory.zip).
+    """
+    try:
+        stats = await ingestion_service.ingest_archive(db, session_id, request.stream())
+    except (ArchiveError, tarfile.TarError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid archive: {e}")
+    return ArchiveIngestResponse(session_id=session_id, **stats)
+
+@router.get("/session/{session_id}", response_model=FileListResponse)
+async def list_session_files(
+    session_id: str,
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    status: Optional[EmbeddingStatus] = None,
+    include_total: Optional[bool] = Query(
+        None,
+        description="Count the session's matching files; defaults to the first page only"
+    ),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    One keyset page of a session's files
+    
+    Counting scans the whole session, so total is only filled on the first
+    page (no cursor) unless include_total says otherwise; later pages cost
+    the same as the first.
+    """
+    try:
+        files, next_cursor = await file_service.list_page(db, session_id, limit, cursor, status)
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    if include_total is None:
+        include_total = cursor is None
+    total = None
+    if include_total:
+        counts = await file_service.count_by_status(db, session_id)
+        total = counts[status] if status is not None else sum(counts.values())
+    
+    responses = await _with_urls(files)
+    return FileListResponse(files=responses, total=total, next_cursor=next_cursor)
+
+@router.get("/{file_id}", response_model=FileResponse)
+async def get_file(file_id: str, db: AsyncSession = Depends(get_db)):
+    file = await db.get(File, file_id)
+    if not file:
+        raise HTTPException(status_code=404, detail="File not found")
+    
+    responses = await _with_urls([file])
+    return responses[0]
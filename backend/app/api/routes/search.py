@@ -0,0 +1,40 @@
+from fastapi import APIRouter, HTTPException
+from ...schemas.clustering import SimilarityResult, SimilaritySearchRequest, SimilaritySearchResponse
+from ...services.embedding_service import embedding_service
+from ...services.qdrant_service import qdrant_service
+
+router = APIRouter(prefix="/api/search", tags=["search"])
+
+@router.post("/similar", response_model=SimilaritySearchResponse)
+async def search_similar(request: SimilaritySearchRequest):
+    if request.file_id:
+        embedding = await qdrant_service.get_embedding(request.file_id)
+        if embedding is None:
+            raise HTTPException(status_code=404, detail="Embedding not found for file")
+        query_vector = embedding["vector"]
+        query_info = {"type": "file", "file_id": request.file_id}
+    elif request.query_text:
+        query_vector = await embedding_service.embed_text(request.query_text)
+        query_info = {"type": "text", "query_text": request.query_text}
+    else:
+        raise HTTPException(status_code=400, detail="Provide file_id or query_text")
+    
+    # Ask for one extra hit so the query file itself can be dropped
+    hits = await qdrant_service.search_similar(
+        query_vector,
+        session_id=request.session_id,
+        top_k=request.top_k + 1 if request.file_id else request.top_k
+    )
+    results = [
+        SimilarityResult(
+            file_id=str(hit["id"]),
+            filename=hit["payload"].get("filename", "unknown"),
+            file_type=hit["payload"].get("file_type", "unknown"),
+            similarity_score=hit["score"],
+            distance=1.0 - hit["score"]
+        )
+        for hit in hits
+        if str(hit["id"]) != request.file_id
+    ][:request.top_k]
+    
+    return SimilaritySearchResponse(query_info=query_info, results=results, total_results=len(results))
@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings
-from typing import List
+from typing import List, Optional
 
 class Settings(BaseSettings):
     PROJECT_NAME: str = "Platinum Sequence"
@@ -17,9 +17,27 @@ class Settings(BaseSettings):
     POSTGRES_USER: str = "postgres"
     POSTGRES_PASSWORD: str = "postgres"
     POSTGRES_DB: str = "platinumsequence"
+    DATABASE_URL: Optional[str] = None  # Overrides the POSTGRES_* settings, e.g. sqlite+aiosqlite:///./local.db
+    
+    # Async engine connection pool
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_TIMEOUT: float = 30.0  # Seconds to wait for a pooled connection
+    DB_POOL_RECYCLE: int = 1800  # Seconds before a connection is replaced
+    DB_POOL_PRE_PING: bool = True
+    DB_STATEMENT_TIMEOUT_MS: int = 30000
+    
+    # Session activity tracking
+    SESSION_TOUCH_FLUSH_INTERVAL: float = 30.0  # Max seconds last_active may lag in Postgres
+    SESSION_CACHE_SIZE: int = 100000
+    
+    # Startup
+    DB_CREATE_SCHEMA: bool = True  # Create tables/indexes at API startup; disable when run as a job
+    STARTUP_CHECK_TIMEOUT: float = 5.0  # Seconds allowed for each dependency check
     
     QDRANT_HOST: str = "qdrant"
     QDRANT_PORT: int = 6333
+    QDRANT_LOCATION: Optional[str] = None  # ":memory:" or a local path runs Qdrant in-process instead
     
     # MinIO S3 Configuration
     MINIO_ENDPOINT: str = "minio:9000"
@@ -28,14 +46,95 @@ class Settings(BaseSettings):
     MINIO_BUCKET_NAME: str = "inventory-files"
     MINIO_SECURE: bool = False
     
+    # S3 client pooling and batch concurrency
+    S3_MAX_POOL_CONNECTIONS: int = 32
+    S3_MAX_CONCURRENCY: int = 16  # In-flight limit for download_many / upload_many
+    S3_MULTIPART_CHUNKSIZE: int = 8 * 1024 * 1024  # Part size (and buffer) for streamed uploads
+    
+    # Presigned URL cache
+    S3_PRESIGN_EXPIRATION: int = 3600
+    S3_PRESIGN_CACHE_SIZE: int = 50000
+    S3_PRESIGN_REFRESH_MARGIN: int = 300  # Re-sign URLs this many seconds before expiry
+    S3_PRESIGN_EXPIRATION_BUCKET: int = 300  # Expirations are rounded up to a multiple of this to share URLs
+    
     # ML Model Configuration
     TEXT_EMBEDDING_MODEL: str = "BAAI/bge-base-en-v1.5"
     IMAGE_EMBEDDING_MODEL: str = "facebook/dinov2-base"
     EMBEDDING_DIMENSION: int = 768
     DEVICE: str = "cpu"  # Set to "cuda" if GPU available
+    EMBEDDING_BACKEND: str = "transformers"  # "stub" hashes content into vectors without loading models
+    
+    # Shared inference server (python -m app.inference_server), one model copy per pod
+    INFERENCE_SOCKET: Optional[str] = None  # Unix socket path; unset loads the models in every process
+    INFERENCE_MAX_BATCH: int = 32  # Inputs coalesced from all clients into one forward pass
+    INFERENCE_BATCH_WINDOW_MS: float = 5.0  # How long a batch waits for more requests to join
+    INFERENCE_TIMEOUT: float = 120.0
+    INFERENCE_IMAGE_SHORTEST_EDGE: int = 256  # Images are sent downscaled to this (the image processor's resize); 0 sends them as decoded
+    INFERENCE_METRICS_PORT: int = 9200  # 0 disables
+    
+    # Image thumbnail derivatives
+    THUMBNAIL_SIZES: List[int] = [128, 512]  # Longest edge in pixels
+    THUMBNAIL_FORMAT: str = "WEBP"  # "WEBP" or "JPEG"
+    THUMBNAIL_QUALITY: int = 80
+    
+    # Embedding job queue and workers
+    EMBEDDING_BATCH_SIZE: int = 16  # Files claimed and run through the models per batch
+    EMBEDDING_JOB_MAX_ATTEMPTS: int = 5
+    EMBEDDING_JOB_VISIBILITY_TIMEOUT: int = 300  # Seconds before a claimed job may be reclaimed
+    EMBEDDING_JOB_RETRY_BACKOFF: float = 10.0  # Base delay in seconds, doubled per attempt
+    EMBEDDING_WORKER_POLL_INTERVAL: float = 2.0
+    EMBEDDING_WORKER_PROCESSES: int = 1
+    EMBEDDING_WORKER_EMBEDDED: bool = False  # Run a worker inside the API process (local dev)
+    WORKER_METRICS_PORT: int = 9100  # Prometheus port serving every worker process's metrics; 0 disables
+    
+    # Embedding progress streaming
+    PROGRESS_SNAPSHOT_INTERVAL: float = 1.0  # Min seconds between snapshots sent to a client
+    PROGRESS_HEARTBEAT_INTERVAL: float = 15.0
+    PROGRESS_RECONCILE_INTERVAL: float = 60.0  # Seconds between recounts that correct drift
+    PROGRESS_RETAIN_SECONDS: float = 300.0  # Keep counts this long after the last client leaves
+    
+    # Analysis response cache (keyed by ETag)
+    RESPONSE_CACHE_MAX_BYTES: int = 256 * 1024 * 1024
+    RESPONSE_CACHE_DIR: Optional[str] = None  # Enables the gzip-compressed on-disk tier
+    RESPONSE_CACHE_DISK_MAX_BYTES: int = 2 * 1024 * 1024 * 1024
+    
+    # Near-duplicate detection
+    DUPLICATE_BLOCK_SIZE: int = 1024  # Rows per similarity tile; a tile is this squared in float32
+    DUPLICATE_MAX_PAIRS: int = 100000  # Upper bound on the max_pairs query parameter
+    
+    # Nearest-neighbour anomaly scoring (method=knn or lof)
+    ANOMALY_KNN_K: int = 10
+    ANOMALY_NEIGHBOR_SOURCE: str = "local"  # "local" (exact, blockwise) or "qdrant" (HNSW searches)
+    ANOMALY_BLOCK_SIZE: int = 1024  # Rows per distance tile of the local kNN
+    ANOMALY_SEARCH_BATCH: int = 256  # Queries per Qdrant batch search request
+    
+    # Reduced clustering space (per-session PCA by randomized SVD)
+    CLUSTERING_PROJECTION_DIM: int = 0  # Default projection_dim; 0 clusters the raw vectors
+    PROJECTION_OVERSAMPLES: int = 10  # Extra random directions in the range finder
+    PROJECTION_POWER_ITERATIONS: int = 2
+    PROJECTION_CACHE_MAX_BYTES: int = 256 * 1024 * 1024
+    
+    # Request profiling (X-Profile: 1 header or ?profile=1)
+    PROFILING_ENABLED: bool = False  # Installs the profiling middleware and admin routes
+    PROFILING_DIR: str = "/tmp/profiles"
+    PROFILING_MAX_FILES: int = 200
+    PROFILING_MAX_PER_MINUTE: int = 6
+    ADMIN_TOKEN: Optional[str] = None  # Required in X-Admin-Token for profiling and /api/admin; must be set with PROFILING_ENABLED
+    
+    # Archive ingest
+    INGEST_DB_BATCH_SIZE: int = 500  # File rows inserted and jobs enqueued per transaction
+    INGEST_QUEUE_CHUNKS: int = 16  # Request body chunks buffered ahead of the extractor
     
     # Qdrant Collection Configuration
-    QDRANT_COLLECTION_NAME: str = "inventory_embeddings"
+    QDRANT_COLLECTION_NAME: str = "inventory_embeddings"  # Base name of versioned collections (and of a pre-alias deployment's collection)
+    QDRANT_ALIAS_NAME: str = "inventory_embeddings_live"  # Alias all reads and writes go through; migrations switch it
+    QDRANT_INDEXING_THRESHOLD: int = 20000  # Restored on a collection after a bulk load
+    
+    # Re-embedding migrations (python -m app.migrate_embeddings)
+    MIGRATION_BATCH_SIZE: int = 64  # Files per inference batch and checkpoint
+    MIGRATION_DOWNLOAD_CONCURRENCY: int = 16
+    MIGRATION_MAX_FILES_PER_SECOND: float = 0.0  # 0 disables the rate limit
+    MIGRATION_MAX_QUEUE_DEPTH: int = 1000  # Pause while more live embedding jobs than this are queued
     
     class Config:
         env_file = ".env"
@@ -0,0 +1,154 @@
+"""
+Prometheus metrics shared by the API and the embedding workers
+
+Service methods are timed with the `timed` decorator / context manager, which
+records into one histogram labelled by service and operation. Everything here
+is a process-local counter update, cheap enough to leave on in production.
+"""
+import functools
+import inspect
+import time
+from typing import Any, Callable, Dict, TypeVar
+from prometheus_client import Counter, Histogram
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+# Seconds; spans sub-millisecond cache work up to multi-minute clustering runs
+LATENCY_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+    1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0
+)
+
+SERVICE_LATENCY = Histogram(
+    "service_operation_duration_seconds",
+    "Time spent in service operations",
+    ["service", "operation"],
+    buckets=LATENCY_BUCKETS
+)
+SERVICE_ERRORS = Counter(
+    "service_operation_errors_total",
+    "Service operations that raised",
+    ["service", "operation"]
+)
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route template",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS
+)
+EMBEDDING_BATCH_SIZE = Histogram(
+    "embedding_batch_size",
+    "Inputs per embedding model forward pass",
+    ["kind"],
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128)
+)
+QDRANT_SCROLL_PAGES = Counter("qdrant_scroll_pages_total", "Qdrant scroll pages fetched")
+QDRANT_POINTS = Counter("qdrant_points_total", "Points read from or written to Qdrant", ["operation"])
+S3_BYTES = Counter("s3_bytes_total", "Object bytes transferred to and from S3", ["direction"])
+CACHE_REQUESTS = Counter("cache_requests_total", "Cache lookups by outcome", ["cache", "result"])
+EMBEDDING_JOBS = Counter("embedding_jobs_total", "Embedding job outcomes", ["outcome"])
+
+class timed:
+    """
+    Record the duration of a block or function in SERVICE_LATENCY
+    
+    Usable as a decorator on sync or async functions:
+        
+        @timed("qdrant", "search")
+        async def search_similar(...): ...
+    
+    or as a context manager around part of a method:
+        
+        with timed("clustering", "linkage"):
+            ...
+    
+    Exceptions are counted in SERVICE_ERRORS and re-raised.
+    """
+    
+    def __init__(self, service: str, operation: str):
+        self._latency = SERVICE_LATENCY.labels(service, operation)
+        self._errors = SERVICE_ERRORS.labels(service, operation)
+        self._start = 0.0
+    
+    def __enter__(self) -> "timed":
+        self._start = time.perf_counter()
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self._latency.observe(time.perf_counter() - self._start)
+        if exc_type is not None:
+            self._errors.inc()
+    
+    def __call__(self, func: F) -> F:
+        latency, errors = self._latency, self._errors
+        
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                except BaseException:
+                    errors.inc()
+                    raise
+                finally:
+                    latency.observe(time.perf_counter() - start)
+            return async_wrapper  # type: ignore[return-value]
+        
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            except BaseException:
+                errors.inc()
+                raise
+            finally:
+                latency.observe(time.perf_counter() - start)
+        return wrapper  # type: ignore[return-value]
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording request latency per route template
+    
+    Routes are labelled by their path template (/api/files/{file_id}), never
+    the raw path, so label cardinality stays bounded.
+    """
+    
+    def __init__(self, app):
+        self.app = app
+        self._templates: Dict[Any, str] = {}
+    
+    def _route_template(self, scope) -> str:
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return "unmatched"
+        template = self._templates.get(endpoint)
+        if template is None:
+            for route in scope["app"].routes:
+                if getattr(route, "endpoint", None) is endpoint:
+                    template = route.path
+                    break
+            template = self._templates[endpoint] = template or "unmatched"
+        return template
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        status = 500
+        start = time.perf_counter()
+        
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+        
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            HTTP_REQUEST_DURATION.labels(
+                scope["method"], self._route_template(scope), str(status)
+            ).observe(time.perf_counter() - start)
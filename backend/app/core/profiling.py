@@ -0,0 +1,157 @@
+"""
+Opt-in per-request profiling
+
+When PROFILING_ENABLED is set, a request carrying an `X-Profile: 1` header (or
+`?profile=1`) and a matching X-Admin-Token runs under cProfile and the stats
+are saved as `<profile id>.pstats` in PROFILING_DIR, downloadable from
+/api/admin/profiles with the same token. The app refuses to start with
+PROFILING_ENABLED but no ADMIN_TOKEN.
+The id is returned in the X-Profile-Id response header. The files load into
+pstats, snakeviz or flameprof.
+
+cProfile follows the event loop thread only: work handed to thread pools (S3
+transfers, thumbnail rendering) shows up as time spent awaiting it, and other
+requests interleaved on the loop are included, so profile on a quiet replica
+where possible. One request is profiled at a time and at most
+PROFILING_MAX_PER_MINUTE are accepted; the rest run normally with an
+X-Profile-Status header saying why.
+
+When the setting is off neither the middleware nor the routes are installed.
+"""
+import asyncio
+import cProfile
+import json
+import os
+import secrets
+import time
+import uuid
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+from urllib.parse import parse_qs
+from .config import settings
+
+class ProfileStore:
+    """Profiles on local disk, pruned to the newest PROFILING_MAX_FILES"""
+    
+    def __init__(self, directory: str, max_files: int):
+        self.directory = directory
+        self.max_files = max_files
+    
+    def path(self, profile_id: str) -> Optional[str]:
+        # Ids are generated here as hex; refuse anything else so a crafted id can't escape the directory
+        if not profile_id or not all(c in "0123456789abcdef" for c in profile_id):
+            return None
+        path = os.path.join(self.directory, f"{profile_id}.pstats")
+        return path if os.path.exists(path) else None
+    
+    def save(self, profiler: cProfile.Profile, profile_id: str, metadata: Dict[str, Any]):
+        os.makedirs(self.directory, exist_ok=True)
+        profiler.dump_stats(os.path.join(self.directory, f"{profile_id}.pstats"))
+        with open(os.path.join(self.directory, f"{profile_id}.json"), "w") as f:
+            json.dump(metadata, f)
+        self._prune()
+    
+    def list(self) -> List[Dict[str, Any]]:
+        profiles = []
+        if not os.path.isdir(self.directory):
+            return profiles
+        for name in os.listdir(self.directory):
+            if name.endswith(".json"):
+                try:
+                    with open(os.path.join(self.directory, name)) as f:
+                        profiles.append(json.load(f))
+                except (OSError, ValueError):
+                    continue
+        return sorted(profiles, key=lambda p: p.get("created_at", 0), reverse=True)
+    
+    def _prune(self):
+        stats = sorted(
+            (entry for entry in os.scandir(self.directory) if entry.name.endswith(".pstats")),
+            key=lambda entry: entry.stat().st_mtime,
+            reverse=True
+        )
+        for entry in stats[self.max_files:]:
+            for suffix in (".pstats", ".json"):
+                try:
+                    os.remove(entry.path[:-len(".pstats")] + suffix)
+                except FileNotFoundError:
+                    pass
+
+profile_store = ProfileStore(settings.PROFILING_DIR, settings.PROFILING_MAX_FILES)
+
+class ProfilingMiddleware:
+    """ASGI middleware that profiles requests which ask for it"""
+    
+    def __init__(self, app):
+        self.app = app
+        self._active = False
+        self._recent: Deque[float] = deque()
+    
+    @staticmethod
+    def _requested(scope) -> bool:
+        headers = dict(scope.get("headers", []))
+        if not settings.ADMIN_TOKEN or not secrets.compare_digest(
+            headers.get(b"x-admin-token", b""), settings.ADMIN_TOKEN.encode()
+        ):
+            return False
+        if headers.get(b"x-profile") in (b"1", b"true"):
+            return True
+        if b"profile=" in scope.get("query_string", b""):
+            values = parse_qs(scope["query_string"].decode("latin-1")).get("profile", [])
+            return any(v in ("1", "true") for v in values)
+        return False
+    
+    def _admit(self) -> Optional[str]:
+        """Reserve the profiler, or return why the request can't be profiled"""
+        if self._active:
+            return "busy"
+        now = time.monotonic()
+        while self._recent and now - self._recent[0] > 60:
+            self._recent.popleft()
+        if len(self._recent) >= settings.PROFILING_MAX_PER_MINUTE:
+            return "rate-limited"
+        self._recent.append(now)
+        self._active = True
+        return None
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self._requested(scope):
+            await self.app(scope, receive, send)
+            return
+        
+        refused = self._admit()
+        profile_id = uuid.uuid4().hex
+        status = 500
+        
+        async def send_with_headers(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                header = (b"x-profile-status", refused.encode()) if refused else (b"x-profile-id", profile_id.encode())
+                message = {**message, "headers": [*message.get("headers", []), header]}
+            await send(message)
+        
+        if refused:
+            await self.app(scope, receive, send_with_headers)
+            return
+        
+        profiler = cProfile.Profile()
+        start = time.perf_counter()
+        try:
+            profiler.enable()
+            try:
+                await self.app(scope, receive, send_with_headers)
+            finally:
+                profiler.disable()
+            metadata = {
+                "profile_id": profile_id,
+                "method": scope["method"],
+                "path": scope["path"],
+                "query": scope.get("query_string", b"").decode("latin-1"),
+                "status": status,
+                "duration_ms": round((time.perf_counter() - start) * 1000, 1),
+                "created_at": time.time()
+            }
+            await asyncio.to_thread(profile_store.save, profiler, profile_id, metadata)
+        finally:
+            self._active = False
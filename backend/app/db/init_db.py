@@ -0,0 +1,40 @@
+"""
+Schema creation, kept out of the API import path
+
+Runs from the API lifespan when DB_CREATE_SCHEMA is set, or standalone
+(e.g. as a deploy job) with:
+
+    python -m app.db.init_db
+"""
+import asyncio
+import logging
+from sqlalchemy import inspect
+from sqlalchemy.schema import CreateColumn
+from .database import engine, Base
+from ..models import file, job, migration, session  # noqa: F401  (register tables with Base.metadata)
+
+logger = logging.getLogger(__name__)
+
+def _create_schema(sync_conn):
+    Base.metadata.create_all(sync_conn)
+    # create_all skips tables that already exist, so add any newer columns and indexes too
+    inspector = inspect(sync_conn)
+    preparer = sync_conn.dialect.identifier_preparer
+    for table in Base.metadata.sorted_tables:
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing:
+                definition = CreateColumn(column).compile(dialect=sync_conn.dialect)
+                sync_conn.exec_driver_sql(f"ALTER TABLE {preparer.format_table(table)} ADD COLUMN {definition}")
+                logger.info(f"Added column {table.name}.{column.name}")
+        for index in table.indexes:
+            index.create(sync_conn, checkfirst=True)
+
+async def init_db():
+    async with engine.begin() as conn:
+        await conn.run_sync(_create_schema)
+    logger.info("Database schema is up to date")
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(init_db())
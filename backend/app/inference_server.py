@@ -0,0 +1,199 @@
+"""
+Shared inference server
+
+Owns the single copy of the embedding models in a pod and serves every API
+and worker process on it over a Unix socket, so memory stays flat as
+processes are added. Inputs arriving from all connections within
+INFERENCE_BATCH_WINDOW_MS are coalesced into one forward pass of up to
+INFERENCE_MAX_BATCH inputs. Clients opt in by setting INFERENCE_SOCKET:
+
+    INFERENCE_SOCKET=/run/inference/embedding.sock python -m app.inference_server
+
+The socket is only created once the models are loaded, so clients can treat a
+successful connection as readiness.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import signal
+from typing import Any, Callable, Dict, List, Tuple
+import numpy as np
+from PIL import Image
+from prometheus_client import start_http_server
+from .core.config import settings
+from .services.embedding_service import EmbeddingService
+from .services.inference_client import read_frame, write_frame
+
+logger = logging.getLogger(__name__)
+
+# Inputs of one request and the future its vectors are delivered to
+PendingRequest = Tuple[List[Any], asyncio.Future]
+
+class InferenceServer:
+    def __init__(self, path: str, max_batch: int, batch_window: float):
+        self.path = path
+        self.max_batch = max_batch
+        self.batch_window = batch_window
+        # A local service: this process is where the models actually live
+        self.service = EmbeddingService()
+        self._queues: Dict[str, "asyncio.Queue[PendingRequest]"] = {}
+        self._compute_lock = asyncio.Lock()
+        self._connections: Dict[asyncio.StreamWriter, asyncio.Task] = {}
+    
+    def _decode_request(self, header: Dict[str, Any], payload: bytes) -> List[Any]:
+        if header["op"] == "text":
+            return header["texts"]
+        
+        images = []
+        offset = 0
+        for width, height in header["sizes"]:
+            size = width * height * 3
+            images.append(Image.frombytes("RGB", (width, height), payload[offset:offset + size]))
+            offset += size
+        if offset != len(payload):
+            raise ValueError("Image payload does not match the declared sizes")
+        return images
+    
+    async def _respond(
+        self,
+        writer: asyncio.StreamWriter,
+        write_lock: asyncio.Lock,
+        request_id: int,
+        future: asyncio.Future
+    ):
+        try:
+            vectors = await future
+            header = {"id": request_id, "dimension": int(vectors.shape[1]) if len(vectors) else 0}
+            payload = vectors.astype("<f4").tobytes()
+        except Exception as e:
+            header, payload = {"id": request_id, "error": str(e)}, b""
+        async with write_lock:
+            if writer.is_closing():
+                return
+            write_frame(writer, header, payload)
+            await writer.drain()
+    
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        loop = asyncio.get_running_loop()
+        write_lock = asyncio.Lock()
+        replies = set()
+        self._connections[writer] = asyncio.current_task()
+        try:
+            while True:
+                header, payload = await read_frame(reader)
+                future = loop.create_future()
+                if header["op"] == "ping":
+                    future.set_result(np.empty((0, 0), dtype=np.float32))
+                else:
+                    try:
+                        inputs = self._decode_request(header, payload)
+                        self._queues[header["op"]].put_nowait((inputs, future))
+                    except (KeyError, ValueError) as e:
+                        future.set_exception(ValueError(f"Bad request: {e}"))
+                reply = asyncio.create_task(self._respond(writer, write_lock, header.get("id"), future))
+                replies.add(reply)
+                reply.add_done_callback(replies.discard)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            # Vectors for a departed client are still computed but go nowhere
+            for reply in replies:
+                reply.cancel()
+            writer.close()
+            self._connections.pop(writer, None)
+    
+    async def _batch_loop(self, kind: str, encode: Callable[[List[Any]], List[List[float]]]):
+        queue = self._queues[kind]
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await queue.get()]
+            count = len(batch[0][0])
+            deadline = loop.time() + self.batch_window
+            while count < self.max_batch:
+                try:
+                    request = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        break
+                    try:
+                        request = await asyncio.wait_for(queue.get(), timeout=remaining)
+                    except asyncio.TimeoutError:
+                        break
+                batch.append(request)
+                count += len(request[0])
+            
+            inputs = [item for request_inputs, _ in batch for item in request_inputs]
+            try:
+                # One forward pass at a time; the models already use every core
+                async with self._compute_lock:
+                    vectors = np.asarray(await asyncio.to_thread(encode, inputs), dtype=np.float32)
+            except Exception as e:
+                logger.error(f"Inference batch of {len(inputs)} {kind} inputs failed: {e}")
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            
+            offset = 0
+            for request_inputs, future in batch:
+                if not future.done():
+                    future.set_result(vectors[offset:offset + len(request_inputs)])
+                offset += len(request_inputs)
+    
+    async def serve(self, stop: asyncio.Event):
+        """Load the models, then serve until stop is set"""
+        await asyncio.to_thread(self.service.load_models)
+        
+        encoders = {"text": self.service.encode_texts, "image": self.service.encode_images}
+        self._queues = {kind: asyncio.Queue() for kind in encoders}
+        batchers = [asyncio.create_task(self._batch_loop(kind, encode)) for kind, encode in encoders.items()]
+        
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        server = await asyncio.start_unix_server(self._handle, path=self.path)
+        logger.info(f"Inference server listening on {self.path} (max batch {self.max_batch})")
+        
+        await stop.wait()
+        server.close()
+        # Closing the transports ends each handler's read loop
+        handlers = list(self._connections.values())
+        for writer in list(self._connections):
+            writer.close()
+        await asyncio.gather(*handlers, return_exceptions=True)
+        await server.wait_closed()
+        for batcher in batchers:
+            batcher.cancel()
+        await asyncio.gather(*batchers, return_exceptions=True)
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        logger.info("Inference server stopped")
+
+async def _serve(path: str):
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    server = InferenceServer(path, settings.INFERENCE_MAX_BATCH, settings.INFERENCE_BATCH_WINDOW_MS / 1000)
+    await server.serve(stop)
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the embedding models over a Unix socket")
+    parser.add_argument(
+        "--socket",
+        default=settings.INFERENCE_SOCKET,
+        help="Socket path (defaults to INFERENCE_SOCKET)"
+    )
+    args = parser.parse_args()
+    if not args.socket:
+        parser.error("set INFERENCE_SOCKET or pass --socket")
+    
+    logging.basicConfig(level=logging.INFO)
+    if settings.INFERENCE_METRICS_PORT:
+        start_http_server(settings.INFERENCE_METRICS_PORT)
+    asyncio.run(_serve(args.socket))
+
+if __name__ == "__main__":
+    main()
@@ -1,19 +1,88 @@
 from fastapi import FastAPI, Depends, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response
+from contextlib import asynccontextmanager
 from datetime import datetime
-from sqlalchemy.orm import Session
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+import asyncio
+import logging
 from .core.config import settings
-from .db.database import engine, get_db, Base
-from .models.session import Session as SessionModel
+from .core.metrics import MetricsMiddleware
+from .db.database import engine, get_db
+from .db.init_db import init_db
 from .schemas.session import SessionCreate, SessionResponse
+from .services.embedding_service import embedding_service
+from .services.progress_service import progress_broker
+from .services.qdrant_service import qdrant_service
+from .services.s3_service import s3_service
+from .services.session_service import session_service
+from .api.routes import analysis, clustering, embeddings, files, search
 
-Base.metadata.create_all(bind=engine)
+logger = logging.getLogger(__name__)
+
+async def _check_database():
+    if settings.DB_CREATE_SCHEMA:
+        await init_db()
+    else:
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+
+# Dependency checks run concurrently at startup and are retried by /ready until they pass
+DEPENDENCY_CHECKS = {
+    "database": _check_database,
+    "s3": s3_service.ensure_bucket,
+    "qdrant": qdrant_service.ensure_collection,
+}
+if embedding_service.inference is not None:
+    DEPENDENCY_CHECKS["inference"] = embedding_service.inference.ping
+
+async def _run_checks(app: FastAPI, names):
+    async def check(name):
+        try:
+            await asyncio.wait_for(DEPENDENCY_CHECKS[name](), timeout=settings.STARTUP_CHECK_TIMEOUT)
+            app.state.dependencies[name] = "ok"
+        except Exception as e:
+            reason = "timed out" if isinstance(e, asyncio.TimeoutError) else str(e)
+            logger.error(f"Dependency check '{name}' failed: {reason}")
+            app.state.dependencies[name] = f"unavailable: {reason}"
+    
+    await asyncio.gather(*(check(name) for name in names))
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    app.state.dependencies = {name: "pending" for name in DEPENDENCY_CHECKS}
+    await _run_checks(app, DEPENDENCY_CHECKS)
+    session_service.start()
+    progress_broker.start()
+    
+    worker_stop = asyncio.Event()
+    worker_task = None
+    if settings.EMBEDDING_WORKER_EMBEDDED:
+        from .worker import EmbeddingWorker
+        worker_task = asyncio.create_task(EmbeddingWorker().run(worker_stop))
+    
+    yield
+    
+    if worker_task is not None:
+        worker_stop.set()
+        await worker_task
+    await progress_broker.stop()
+    try:
+        await session_service.stop()
+    except Exception:
+        pass
+    s3_service.close()
+    qdrant_service.close()
+    await engine.dispose()
 
 app = FastAPI(
     title="Platinum Sequence API",
     version="1.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    lifespan=lifespan
 )
 
 app.add_middleware(
@@ -24,6 +93,24 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+app.add_middleware(MetricsMiddleware)
+
+if settings.PROFILING_ENABLED:
+    # Profiles expose internals and cost CPU, so they are never open to anyone
+    if not settings.ADMIN_TOKEN:
+        raise RuntimeError("PROFILING_ENABLED requires ADMIN_TOKEN to be set")
+    from .core.profiling import ProfilingMiddleware
+    from .api.routes import admin
+    
+    app.add_middleware(ProfilingMiddleware)
+    app.include_router(admin.router)
+
+app.include_router(files.router)
+app.include_router(embeddings.router)
+app.include_router(clustering.router)
+app.include_router(analysis.router)
+app.include_router(search.router)
+
 @app.get("/health")
 async def health_check():
     return {
@@ -32,26 +119,34 @@ async def health_check():
         "service": "platinum-sequence-api"
     }
 
-@app.post("/api/session", response_model=SessionResponse)
-async def create_session(session_data: SessionCreate, db: Session = Depends(get_db)):
-    existing_session = db.query(SessionModel).filter(SessionModel.session_id == session_data.session_id).first()
-    
-    if existing_session:
-        existing_session.last_active = datetime.utcnow()
-        db.commit()
-        db.refresh(existing_session)
-        return existing_session
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+@app.get("/ready")
+async def readiness_check():
+    failing = [name for name, state in app.state.dependencies.items() if state != "ok"]
+    if failing:
+        await _run_checks(app, failing)
     
-    new_session = SessionModel(session_id=session_data.session_id)
-    db.add(new_session)
-    db.commit()
-    db.refresh(new_session)
-    return new_session
+    dependencies = dict(app.state.dependencies)
+    ready = all(state == "ok" for state in dependencies.values())
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={
+            "status": "ready" if ready else "degraded",
+            "timestamp": datetime.utcnow().isoformat(),
+            "dependencies": dependencies
+        }
+    )
+
+@app.post("/api/session", response_model=SessionResponse)
+async def create_session(session_data: SessionCreate):
+    return await session_service.touch(session_data.session_id)
 
 @app.get("/api/session/{session_id}", response_model=SessionResponse)
-async def get_session(session_id: str, db: Session = Depends(get_db)):
-    session = db.query(SessionModel).filter(SessionModel.session_id == session_id).first()
+async def get_session(session_id: str, db: AsyncSession = Depends(get_db)):
+    session = await session_service.get(db, session_id)
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
     return session
-
@@ -0,0 +1,440 @@
+"""
+Re-embed every file into a new collection after a model upgrade
+
+Changing TEXT_EMBEDDING_MODEL or IMAGE_EMBEDDING_MODEL leaves the vectors
+behind QDRANT_ALIAS_NAME stale. Run this with the new model settings,
+typically as a one-off job alongside the live deployment:
+
+    python -m app.migrate_embeddings                          # start, or resume the unfinished migration
+    python -m app.migrate_embeddings --max-rate 50            # throttle to 50 files/s
+    python -m app.migrate_embeddings --repair                 # after the workers run the new models
+    python -m app.migrate_embeddings --switch-to inventory_embeddings_v1   # roll back
+
+Files are streamed in (created_at, id) order and downloaded concurrently.
+They are embedded in batches, through the shared inference server when
+INFERENCE_SOCKET is set, and bulk-upserted into a new versioned collection
+with indexing deferred. The position is checkpointed in embedding_migrations
+after every batch, so an interrupted run resumes where it stopped. While
+live embedding jobs queue up past --max-queue-depth the migration pauses.
+
+Files uploaded meanwhile are picked up by repeated passes; once a pass finds
+none, the index is built and the passes run again for files stored in the
+meantime. Files that could not be downloaded or embedded are recorded in
+embedding_migration_failures and retried; the alias is not switched while
+any still fail. Otherwise it is switched atomically, a last pass picks up
+files stored just before the switch, and every session's content version is
+bumped so cached analysis responses are recomputed. The previous collection
+is never deleted. Upgrade the embedding workers right after the switch:
+--repair then re-embeds anything they stored with the old model in between,
+found by the embedding_model payload field.
+"""
+import argparse
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import delete, func, select, tuple_, update
+from .core.config import settings
+from .db.database import SessionLocal, engine, insert
+from .models.file import File, EmbeddingStatus
+from .models.migration import EmbeddingMigration, MigrationFailure, MigrationStatus
+from .services.embedding_service import embedding_service
+from .services.ingestion_service import ingestion_service
+from .services.job_queue import job_queue
+from .services.qdrant_service import qdrant_service
+from .services.s3_service import s3_service
+from .services.session_service import session_service
+
+logger = logging.getLogger(__name__)
+
+# Seconds between checks while paused for live traffic, and between progress logs
+PAUSE_INTERVAL = 10.0
+PROGRESS_LOG_INTERVAL = 30.0
+
+# (files, downloads, errors) for one batch, handed from the fetcher to the embedder
+FetchedBatch = Tuple[List[File], List[Tuple[File, bytes]], Dict[str, str]]
+
+class EmbeddingMigrator:
+    def __init__(
+        self,
+        batch_size: Optional[int] = None,
+        concurrency: Optional[int] = None,
+        max_rate: Optional[float] = None,
+        max_queue_depth: Optional[int] = None
+    ):
+        self.batch_size = batch_size or settings.MIGRATION_BATCH_SIZE
+        self.concurrency = concurrency or settings.MIGRATION_DOWNLOAD_CONCURRENCY
+        self.max_rate = settings.MIGRATION_MAX_FILES_PER_SECOND if max_rate is None else max_rate
+        self.max_queue_depth = settings.MIGRATION_MAX_QUEUE_DEPTH if max_queue_depth is None else max_queue_depth
+        self.models = (settings.TEXT_EMBEDDING_MODEL, settings.IMAGE_EMBEDDING_MODEL)
+        self._started = 0.0
+        self._count = 0
+        self._last_log = 0.0
+    
+    async def _start(self, target: Optional[str]) -> EmbeddingMigration:
+        """Load the checkpoint for target (or the unfinished migration), or begin a new one"""
+        async with SessionLocal() as db:
+            if target:
+                migration = await db.get(EmbeddingMigration, target)
+            else:
+                migration = await db.scalar(
+                    select(EmbeddingMigration)
+                    .where(EmbeddingMigration.status == MigrationStatus.RUNNING)
+                    .order_by(EmbeddingMigration.started_at.desc())
+                    .limit(1)
+                )
+            
+            if migration is None:
+                target = target or f"{settings.QDRANT_COLLECTION_NAME}_{datetime.utcnow():%Y%m%d%H%M%S}"
+                live = (settings.QDRANT_COLLECTION_NAME, settings.QDRANT_ALIAS_NAME, await qdrant_service.current_collection())
+                if target in live:
+                    raise ValueError(f"{target} is the live collection; choose a new --target")
+                migration = EmbeddingMigration(
+                    target_collection=target,
+                    text_model=self.models[0],
+                    image_model=self.models[1],
+                    status=MigrationStatus.RUNNING,
+                    files_embedded=0,
+                    files_failed=0
+                )
+                db.add(migration)
+                await db.commit()
+                logger.info(f"Starting migration into {target}")
+            elif (migration.text_model, migration.image_model) != self.models:
+                raise ValueError(
+                    f"Migration into {migration.target_collection} was started with "
+                    f"{migration.text_model} / {migration.image_model}; resume it with the same "
+                    f"models or pass a new --target"
+                )
+            else:
+                logger.info(
+                    f"Resuming migration into {migration.target_collection} after "
+                    f"{migration.files_embedded} files"
+                )
+        
+        if not await qdrant_service.collection_exists(migration.target_collection):
+            await qdrant_service.create_versioned_collection(migration.target_collection)
+        return migration
+    
+    async def _pages(self, created_at: Optional[datetime], file_id: Optional[str]) -> AsyncIterator[List[File]]:
+        """Files after the keyset position, one batch at a time"""
+        while True:
+            query = select(File).where(File.embedding_status != EmbeddingStatus.FAILED)
+            if created_at is not None:
+                query = query.where(tuple_(File.created_at, File.id) > tuple_(created_at, file_id))
+            async with SessionLocal() as db:
+                result = await db.execute(query.order_by(File.created_at, File.id).limit(self.batch_size))
+                files = list(result.scalars().all())
+            if not files:
+                return
+            yield files
+            created_at, file_id = files[-1].created_at, files[-1].id
+    
+    async def _download(self, files: List[File]) -> Tuple[List[Tuple[File, bytes]], Dict[str, str]]:
+        by_key = {f.s3_key: f for f in files}
+        downloads: List[Tuple[File, bytes]] = []
+        errors: Dict[str, str] = {}
+        async for object_key, result in s3_service.download_many(
+            by_key, max_concurrency=self.concurrency, return_exceptions=True
+        ):
+            if isinstance(result, BaseException):
+                errors[by_key[object_key].id] = f"Download failed: {result}"
+            else:
+                downloads.append((by_key[object_key], result))
+        return downloads, errors
+    
+    async def _yield_to_live_traffic(self):
+        if not self.max_queue_depth:
+            return
+        while (backlog := await job_queue.backlog()) > self.max_queue_depth:
+            logger.info(f"Paused: {backlog} live embedding jobs queued (limit {self.max_queue_depth})")
+            await asyncio.sleep(PAUSE_INTERVAL)
+    
+    async def _throttle(self, count: int):
+        loop = asyncio.get_running_loop()
+        self._count += count
+        elapsed = loop.time() - self._started
+        if self.max_rate:
+            await asyncio.sleep(max(0.0, self._count / self.max_rate - elapsed))
+        if loop.time() - self._last_log >= PROGRESS_LOG_INTERVAL:
+            self._last_log = loop.time()
+            logger.info(f"Processed {self._count} files ({self._count / max(elapsed, 1e-9):.1f}/s)")
+    
+    async def _fetch(self, migration: EmbeddingMigration, batches: "asyncio.Queue[Optional[FetchedBatch]]"):
+        # Downloads for the next batches overlap with inference on the current one
+        try:
+            async for files in self._pages(migration.cursor_created_at, migration.cursor_file_id):
+                await self._yield_to_live_traffic()
+                downloads, errors = await self._download(files)
+                await batches.put((files, downloads, errors))
+        finally:
+            await batches.put(None)
+    
+    async def _checkpoint(
+        self,
+        migration: EmbeddingMigration,
+        last: Optional[File],
+        embedded: int,
+        errors: Dict[str, str],
+        resolved: Iterable[str] = ()
+    ):
+        """
+        Record a batch's outcome, and advance the keyset position past last
+        
+        Args:
+            migration: Migration being run
+            last: Last file of a pass's batch, None for retried files
+            embedded: Files stored in the target collection
+            errors: Error per file that failed, kept for a retry
+            resolved: Previously failed files that no longer need one
+        """
+        target = migration.target_collection
+        now = datetime.utcnow()
+        async with SessionLocal() as db:
+            resolved = list(resolved)
+            if resolved:
+                await db.execute(
+                    delete(MigrationFailure)
+                    .where(MigrationFailure.target_collection == target, MigrationFailure.file_id.in_(resolved))
+                )
+            if errors:
+                stmt = insert(MigrationFailure).values([
+                    {"target_collection": target, "file_id": file_id, "error": error, "updated_at": now}
+                    for file_id, error in errors.items()
+                ])
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=[MigrationFailure.target_collection, MigrationFailure.file_id],
+                    set_={"error": stmt.excluded.error, "updated_at": stmt.excluded.updated_at}
+                )
+                await db.execute(stmt)
+            
+            values = {
+                "files_embedded": EmbeddingMigration.files_embedded + embedded,
+                # Files still failing, not every failure so far
+                "files_failed": (
+                    select(func.count())
+                    .select_from(MigrationFailure)
+                    .where(MigrationFailure.target_collection == target)
+                    .scalar_subquery()
+                ),
+                "updated_at": now
+            }
+            if last is not None:
+                values.update(cursor_created_at=last.created_at, cursor_file_id=last.id)
+            await db.execute(
+                update(EmbeddingMigration)
+                .where(EmbeddingMigration.target_collection == target)
+                .values(**values)
+            )
+            await db.commit()
+        if last is not None:
+            migration.cursor_created_at, migration.cursor_file_id = last.created_at, last.id
+    
+    async def _run_pass(self, migration: EmbeddingMigration, collection_name: str) -> int:
+        """
+        Embed every file after the checkpoint into collection_name
+        
+        Returns:
+            Number of files processed
+        """
+        batches: "asyncio.Queue[Optional[FetchedBatch]]" = asyncio.Queue(maxsize=2)
+        fetcher = asyncio.create_task(self._fetch(migration, batches))
+        processed = 0
+        try:
+            while (batch := await batches.get()) is not None:
+                files, downloads, errors = batch
+                embedded, _, failed = await ingestion_service.embed_downloads(downloads)
+                errors.update(failed)
+                await qdrant_service.store_embeddings(
+                    [(file.id, vector, ingestion_service.point_payload(file)) for file, vector in embedded],
+                    collection_name=collection_name
+                )
+                # Only after the upsert, so a resumed run never skips a file
+                await self._checkpoint(migration, files[-1], len(embedded), errors)
+                for file_id, error in errors.items():
+                    logger.warning(f"Skipped file {file_id}: {error}")
+                processed += len(files)
+                await self._throttle(len(files))
+            await fetcher
+        finally:
+            fetcher.cancel()
+        return processed
+    
+    async def _catch_up(self, migration: EmbeddingMigration):
+        # Files keep arriving while the migration runs; repeat until a pass finds none
+        while await self._run_pass(migration, migration.target_collection):
+            pass
+    
+    async def _retry_failures(self, migration: EmbeddingMigration) -> int:
+        """
+        Embed the files earlier passes could not into the target collection
+        
+        Returns:
+            Number of files still failing
+        """
+        target = migration.target_collection
+        async with SessionLocal() as db:
+            failed_ids = list((await db.execute(
+                select(MigrationFailure.file_id).where(MigrationFailure.target_collection == target)
+            )).scalars().all())
+        
+        for start in range(0, len(failed_ids), self.batch_size):
+            batch_ids = failed_ids[start:start + self.batch_size]
+            async with SessionLocal() as db:
+                # Like the passes, skip files that were deleted or failed for the live workers too
+                files = list((await db.execute(
+                    select(File).where(File.id.in_(batch_ids), File.embedding_status != EmbeddingStatus.FAILED)
+                )).scalars().all())
+            downloads, errors = await self._download(files)
+            embedded, _, failed = await ingestion_service.embed_downloads(downloads)
+            errors.update(failed)
+            await qdrant_service.store_embeddings(
+                [(file.id, vector, ingestion_service.point_payload(file)) for file, vector in embedded],
+                collection_name=target
+            )
+            resolved = [file_id for file_id in batch_ids if file_id not in errors]
+            await self._checkpoint(migration, None, len(embedded), errors, resolved)
+            for file_id, error in errors.items():
+                logger.warning(f"Retry of file {file_id} failed: {error}")
+            await self._throttle(len(files))
+        
+        async with SessionLocal() as db:
+            return await db.scalar(
+                select(EmbeddingMigration.files_failed).where(EmbeddingMigration.target_collection == target)
+            )
+    
+    async def migrate(self, target: Optional[str] = None, switch: bool = True):
+        """
+        Build (or resume) a collection with the current models and switch reads to it
+        
+        Args:
+            target: Collection to build; defaults to the unfinished migration
+                or a new timestamped name
+            switch: Point the alias at the new collection when done
+        
+        Raises:
+            RuntimeError: Files still fail after a retry, so the alias is not switched
+        """
+        await asyncio.to_thread(embedding_service.load_models)
+        migration = await self._start(target)
+        self._started = self._last_log = asyncio.get_running_loop().time()
+        
+        await self._catch_up(migration)
+        
+        if migration.status == MigrationStatus.SWITCHED:
+            remaining = await self._retry_failures(migration)
+            logger.info(f"{migration.target_collection} is live and caught up ({remaining} files still failing)")
+            return
+        
+        await qdrant_service.finish_bulk_load(migration.target_collection)
+        logger.info(f"Waiting for {migration.target_collection} to finish indexing")
+        await qdrant_service.wait_until_indexed(migration.target_collection)
+        # Files stored while the index was built only went to the live collection
+        await self._catch_up(migration)
+        remaining = await self._retry_failures(migration)
+        
+        if not switch:
+            logger.info(
+                f"{migration.target_collection} is ready with {remaining} files still failing; "
+                f"switch with --switch-to {migration.target_collection}"
+            )
+            return
+        if remaining:
+            raise RuntimeError(
+                f"{remaining} files could not be embedded into {migration.target_collection} "
+                f"(see embedding_migration_failures); rerun to retry them before switching"
+            )
+        await self.switch(migration.target_collection)
+        
+        # Files stored between the last pass and the switch went to the previous collection
+        await self._catch_up(migration)
+        remaining = await self._retry_failures(migration)
+        if remaining:
+            logger.warning(f"{remaining} files are missing from {migration.target_collection}; rerun to retry them")
+    
+    async def switch(self, target: str):
+        """
+        Point the live alias at target and invalidate cached analysis responses
+        
+        Args:
+            target: Existing collection to serve reads and writes from
+        """
+        if not await qdrant_service.collection_exists(target):
+            raise ValueError(f"Collection {target} does not exist")
+        async with SessionLocal() as db:
+            migration = await db.get(EmbeddingMigration, target)
+        if migration is not None and migration.files_failed:
+            raise ValueError(f"{migration.files_failed} files of {target} are still failing; rerun the migration to retry them")
+        
+        previous = await qdrant_service.switch_alias(target)
+        async with SessionLocal() as db:
+            await session_service.bump_all_content_versions(db)
+            await db.execute(
+                update(EmbeddingMigration)
+                .where(EmbeddingMigration.target_collection == target)
+                .values(status=MigrationStatus.SWITCHED, switched_at=datetime.utcnow(), previous_collection=previous)
+            )
+            await db.commit()
+        logger.info(f"Switched {settings.QDRANT_ALIAS_NAME} to {target}; previous collection {previous} is kept for rollback")
+    
+    async def repair(self):
+        """Re-embed live points whose embedding_model is not one of the current models"""
+        await asyncio.to_thread(embedding_service.load_models)
+        self._started = self._last_log = asyncio.get_running_loop().time()
+        offset = None
+        while True:
+            await self._yield_to_live_traffic()
+            file_ids, offset = await qdrant_service.scroll_stale_points(list(self.models), self.batch_size, offset)
+            if file_ids:
+                async with SessionLocal() as db:
+                    files = list((await db.execute(select(File).where(File.id.in_(file_ids)))).scalars().all())
+                downloads, errors = await self._download(files)
+                embedded, _, failed = await ingestion_service.embed_downloads(downloads)
+                errors.update(failed)
+                await qdrant_service.store_embeddings(
+                    [(file.id, vector, ingestion_service.point_payload(file)) for file, vector in embedded]
+                )
+                async with SessionLocal() as db:
+                    await session_service.bump_content_version(db, [file.session_id for file, _ in embedded])
+                    await db.commit()
+                for file_id, error in errors.items():
+                    logger.warning(f"Could not repair file {file_id}: {error}")
+                await self._throttle(len(file_ids))
+            if offset is None:
+                break
+        logger.info(f"Repair finished after {self._count} stale points")
+
+async def _main(args: argparse.Namespace):
+    migrator = EmbeddingMigrator(args.batch_size, args.concurrency, args.max_rate, args.max_queue_depth)
+    try:
+        if args.switch_to:
+            await migrator.switch(args.switch_to)
+        elif args.repair:
+            await migrator.repair()
+        else:
+            await migrator.migrate(args.target, switch=not args.no_switch)
+    finally:
+        s3_service.close()
+        qdrant_service.close()
+        await engine.dispose()
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-embed all files into a new collection and switch to it")
+    parser.add_argument("--target", help="Collection to build or resume (default: the unfinished migration, else a new one)")
+    parser.add_argument("--batch-size", type=int, help="Files per inference batch and checkpoint")
+    parser.add_argument("--concurrency", type=int, help="Concurrent S3 downloads")
+    parser.add_argument("--max-rate", type=float, help="Files per second, 0 for unlimited")
+    parser.add_argument("--max-queue-depth", type=int, help="Pause while more live jobs than this are queued, 0 to never pause")
+    parser.add_argument("--no-switch", action="store_true", help="Build the collection but leave the alias alone")
+    parser.add_argument("--repair", action="store_true", help="Re-embed live points stored by a previous model")
+    parser.add_argument("--switch-to", metavar="COLLECTION", help="Only point the alias at COLLECTION (e.g. to roll back)")
+    args = parser.parse_args()
+    
+    logging.basicConfig(level=logging.INFO)
+    started = time.monotonic()
+    asyncio.run(_main(args))
+    logger.info(f"Done in {time.monotonic() - started:.0f}s")
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, BigInteger, DateTime, Enum as SQLEnum
+from sqlalchemy import Column, String, BigInteger, Boolean, DateTime, Index, Enum as SQLEnum, false
 from datetime import datetime
 import uuid
 import enum
@@ -16,9 +16,17 @@ class EmbeddingStatus(str, enum.Enum):
 
 class File(Base):
     __tablename__ = "files"
+    __table_args__ = (
+        # Per-status counts and status-filtered listings within a session
+        Index("ix_files_session_id_embedding_status", "session_id", "embedding_status"),
+        # Keyset pagination of a session ordered by (created_at, id)
+        Index("ix_files_session_id_created_at_id", "session_id", "created_at", "id"),
+        # Whole-table scans in (created_at, id) order, e.g. re-embedding migrations
+        Index("ix_files_created_at_id", "created_at", "id"),
+    )
     
     id = Column(String, primary_key=True, index=True, default=lambda: str(uuid.uuid4()))
-    session_id = Column(String, index=True, nullable=False)
+    session_id = Column(String, nullable=False)
     filename = Column(String, nullable=False)
     file_type = Column(SQLEnum(FileType), nullable=False)
     mime_type = Column(String, nullable=False)
@@ -26,6 +34,7 @@ class File(Base):
     s3_bucket = Column(String, nullable=False)
     s3_key = Column(String, nullable=False)
     embedding_status = Column(SQLEnum(EmbeddingStatus), default=EmbeddingStatus.PENDING)
+    has_thumbnails = Column(Boolean, default=False, server_default=false(), nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
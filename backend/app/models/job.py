@@ -0,0 +1,29 @@
+from sqlalchemy import Column, String, Integer, DateTime, Text, Index, Enum as SQLEnum
+from datetime import datetime
+import enum
+from ..db.database import Base
+
+class JobStatus(str, enum.Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    FAILED = "failed"
+
+class EmbeddingJob(Base):
+    __tablename__ = "embedding_jobs"
+    __table_args__ = (
+        # Claim scans: queued jobs that are due, and running jobs whose lease expired
+        Index("ix_embedding_jobs_status_run_after", "status", "run_after"),
+        Index("ix_embedding_jobs_status_locked_until", "status", "locked_until"),
+    )
+    
+    # One job per file; completed jobs are deleted
+    file_id = Column(String, primary_key=True)
+    session_id = Column(String, nullable=False)
+    status = Column(SQLEnum(JobStatus), nullable=False, default=JobStatus.QUEUED)
+    attempts = Column(Integer, nullable=False, default=0)
+    run_after = Column(DateTime, nullable=False, default=datetime.utcnow)
+    locked_by = Column(String, nullable=True)
+    locked_until = Column(DateTime, nullable=True)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
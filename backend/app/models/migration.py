@@ -0,0 +1,35 @@
+from sqlalchemy import Column, String, Integer, DateTime, Enum as SQLEnum
+from datetime import datetime
+import enum
+from ..db.database import Base
+
+class MigrationStatus(str, enum.Enum):
+    RUNNING = "running"
+    SWITCHED = "switched"
+
+class EmbeddingMigration(Base):
+    __tablename__ = "embedding_migrations"
+    
+    # One row per target collection; doubles as the resume checkpoint
+    target_collection = Column(String, primary_key=True)
+    text_model = Column(String, nullable=False)
+    image_model = Column(String, nullable=False)
+    status = Column(SQLEnum(MigrationStatus), nullable=False, default=MigrationStatus.RUNNING)
+    # Keyset position of the last file whose vector is stored, in (created_at, id) order
+    cursor_created_at = Column(DateTime, nullable=True)
+    cursor_file_id = Column(String, nullable=True)
+    files_embedded = Column(Integer, nullable=False, default=0)
+    files_failed = Column(Integer, nullable=False, default=0)
+    previous_collection = Column(String, nullable=True)
+    started_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    switched_at = Column(DateTime, nullable=True)
+
+class MigrationFailure(Base):
+    __tablename__ = "embedding_migration_failures"
+    
+    # Files a migration passed over; retried before its collection can go live
+    target_collection = Column(String, primary_key=True)
+    file_id = Column(String, primary_key=True)
+    error = Column(String, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, DateTime
+from sqlalchemy import Column, String, DateTime, Integer
 from datetime import datetime
 from ..db.database import Base
 
@@ -8,4 +8,6 @@ class Session(Base):
     session_id = Column(String, primary_key=True, index=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     last_active = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Bumped whenever the session's embeddings change; keys cached analysis responses
+    content_version = Column(Integer, default=0, server_default="0", nullable=False)
 
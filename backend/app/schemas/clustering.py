@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import List, Optional, Dict, Any
 
 class ClusterItem(BaseModel):
@@ -22,17 +22,31 @@ class DendrogramNode(BaseModel):
     item_count: int
     items: List[str]  # file_ids
 
+class ProjectionInfo(BaseModel):
+    dimension: int
+    original_dimension: int
+    explained_variance_ratio: float  # Share of the session's variance the projection keeps
+
+class ProjectionReport(BaseModel):
+    session_id: str
+    total_items: int
+    original_dimension: int
+    explained_variance_ratio: List[float]  # Per component, largest first
+    cumulative_variance_ratio: List[float]  # Kept by projecting to 1, 2, ... dimensions
+
 class DendrogramResponse(BaseModel):
     session_id: str
     linkage_matrix: List[List[float]]
     nodes: List[DendrogramNode]
     cluster_summaries: List[ClusterSummary]
     total_items: int
+    projection: Optional[ProjectionInfo] = None  # Set when linkage ran in a reduced space
 
 class ClusterRequest(BaseModel):
     session_id: str
     num_clusters: Optional[int] = None
     distance_threshold: Optional[float] = None
+    projection_dim: Optional[int] = Field(None, ge=0)  # 0 clusters raw vectors; None uses CLUSTERING_PROJECTION_DIM
 
 class SimilaritySearchRequest(BaseModel):
     session_id: str
@@ -66,4 +80,28 @@ class AnomalyDetectionResponse(BaseModel):
     threshold: float
     total_files: int
     anomaly_count: int
+    projection: Optional[ProjectionInfo] = None  # Set when neighbours were found in a reduced space
+
+class DuplicateItem(BaseModel):
+    file_id: str
+    filename: str
+    file_type: str
+    best_similarity: float  # Highest similarity to any other item in the session
+
+class DuplicateGroup(BaseModel):
+    group_id: int
+    item_count: int
+    items: List[DuplicateItem]
+
+class DuplicatePair(BaseModel):
+    file_id_a: str
+    file_id_b: str
+    similarity: float
 
+class DuplicateDetectionResponse(BaseModel):
+    session_id: str
+    threshold: float
+    total_files: int
+    groups: List[DuplicateGroup]
+    pair_count: int  # All pairs at or above the threshold
+    pairs: List[DuplicatePair] = []  # At most max_pairs of them, when requested
@@ -0,0 +1,9 @@
+from pydantic import BaseModel
+
+class SessionEmbeddingSummary(BaseModel):
+    session_id: str
+    total: int
+    pending: int
+    processing: int
+    completed: int
+    failed: int
@@ -1,6 +1,6 @@
 from pydantic import BaseModel
 from datetime import datetime
-from typing import Optional
+from typing import Dict, Optional
 from ..models.file import FileType, EmbeddingStatus
 
 class FileBase(BaseModel):
@@ -22,6 +22,9 @@ class FileResponse(FileBase):
     embedding_status: EmbeddingStatus
     created_at: datetime
     updated_at: datetime
+    has_thumbnails: bool = False
+    url: Optional[str] = None
+    thumbnails: Optional[Dict[int, str]] = None  # Longest edge -> presigned URL
     
     class Config:
         from_attributes = True
@@ -37,5 +40,12 @@ class FileUploadResponse(BaseModel):
 
 class FileListResponse(BaseModel):
     files: list[FileResponse]
-    total: int
+    total: Optional[int] = None  # Only counted on the first page unless include_total is set
+    next_cursor: Optional[str] = None  # Pass as ?cursor= to fetch the next page
 
+
+class ArchiveIngestResponse(BaseModel):
+    session_id: str
+    files_ingested: int
+    files_skipped: int
+    bytes_ingested: int
@@ -0,0 +1,261 @@
+import asyncio
+import logging
+from enum import Enum
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from ..core.config import settings
+from ..core.metrics import timed
+from .qdrant_service import qdrant_service
+
+logger = logging.getLogger(__name__)
+
+class AnomalyMethod(str, Enum):
+    CENTROID = "centroid"  # Distance to the nearest cluster centroid (needs a full clustering)
+    KNN = "knn"  # Distance to the k-th nearest neighbour
+    LOF = "lof"  # Local outlier factor over the k nearest neighbours
+
+class NeighborSource(str, Enum):
+    LOCAL = "local"  # Exact, blockwise over the session's vectors
+    QDRANT = "qdrant"  # Approximate, batched searches against the HNSW index
+
+class AnomalyService:
+    """
+    Outlier scoring from each item's k nearest neighbours
+    
+    Unlike centroid distances this needs no linkage or cluster summaries:
+    the scores only depend on an (n, k) table of neighbour distances, which
+    comes either from batched Qdrant searches against the collection's
+    index or from a blockwise pass over the session's vectors.
+    """
+    
+    @staticmethod
+    def _normalized(vectors: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+    
+    @staticmethod
+    def _merge(
+        best_distances: np.ndarray,
+        best_indices: np.ndarray,
+        rows: slice,
+        distances: np.ndarray,
+        col_start: int
+    ):
+        # Keep the k smallest of the current best and this tile's candidates
+        k = best_distances.shape[1]
+        candidates = np.concatenate([best_distances[rows], distances], axis=1)
+        candidate_indices = np.concatenate([
+            best_indices[rows],
+            np.broadcast_to(np.arange(col_start, col_start + distances.shape[1]), distances.shape)
+        ], axis=1)
+        keep = np.argpartition(candidates, k - 1, axis=1)[:, :k]
+        best_distances[rows] = np.take_along_axis(candidates, keep, axis=1)
+        best_indices[rows] = np.take_along_axis(candidate_indices, keep, axis=1)
+    
+    @timed("anomalies", "knn_blocks")
+    def nearest_neighbors(
+        self,
+        vectors: np.ndarray,
+        k: int,
+        block_size: Optional[int] = None,
+        normalize: bool = True
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Exact k nearest neighbours of every item, excluding itself
+        
+        Distances are computed one block x block tile at a time over the
+        upper triangle; each tile updates the running top k of both its row
+        and its column items, so memory stays at a few tiles plus the (n, k)
+        result however large the session.
+        
+        Args:
+            vectors: (n, d) embedding matrix, n > k
+            k: Neighbours per item
+            block_size: Rows per tile (defaults to ANOMALY_BLOCK_SIZE)
+            normalize: L2-normalize the vectors first; off for vectors that
+                are already in the space to measure, such as a projection
+        
+        Returns:
+            Tuple of (n, k) euclidean distances between the (normalized)
+            vectors, nearest first, and the matching neighbour indices
+        """
+        block_size = block_size or settings.ANOMALY_BLOCK_SIZE
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        if normalize:
+            vectors = self._normalized(vectors)
+        n = len(vectors)
+        squared_norms = np.einsum("ij,ij->i", vectors, vectors)
+        
+        best_distances = np.full((n, k), np.inf, dtype=np.float32)
+        best_indices = np.full((n, k), -1, dtype=np.int64)
+        
+        for row_start in range(0, n, block_size):
+            rows = slice(row_start, min(row_start + block_size, n))
+            for col_start in range(row_start, n, block_size):
+                cols = slice(col_start, min(col_start + block_size, n))
+                distances = vectors[rows] @ vectors[cols].T
+                distances *= -2
+                distances += squared_norms[rows, None]
+                distances += squared_norms[None, cols]
+                if col_start == row_start:
+                    # Diagonal tile: an item is not its own neighbour
+                    np.fill_diagonal(distances, np.inf)
+                self._merge(best_distances, best_indices, rows, distances, col_start)
+                if col_start != row_start:
+                    self._merge(best_distances, best_indices, cols, distances.T, row_start)
+        
+        order = np.argsort(best_distances, axis=1)
+        best_distances = np.take_along_axis(best_distances, order, axis=1)
+        best_indices = np.take_along_axis(best_indices, order, axis=1)
+        # Squared distances can come out a hair below zero
+        return np.sqrt(np.maximum(best_distances, 0)), best_indices
+    
+    async def search_neighbors(
+        self,
+        embeddings: List[Dict[str, Any]],
+        session_id: str,
+        k: int
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Approximate k nearest neighbours from the collection's HNSW index
+        
+        Args:
+            embeddings: Session embeddings, all stored in Qdrant
+            session_id: Session the embeddings belong to
+            k: Neighbours per item
+        
+        Returns:
+            Same (distances, indices) layout as nearest_neighbors; an item
+            with fewer than k hits is padded with its farthest hit
+        
+        Raises:
+            LookupError: An item found no other session item in the index
+        """
+        positions = {str(emb['id']): i for i, emb in enumerate(embeddings)}
+        distances = np.empty((len(embeddings), k), dtype=np.float32)
+        indices = np.empty((len(embeddings), k), dtype=np.int64)
+        batch_size = settings.ANOMALY_SEARCH_BATCH
+        
+        for start in range(0, len(embeddings), batch_size):
+            batch = embeddings[start:start + batch_size]
+            # One extra hit, since each item finds itself
+            results = await qdrant_service.search_neighbors(
+                [emb['vector'] for emb in batch], session_id, k + 1
+            )
+            for offset, (emb, hits) in enumerate(zip(batch, results)):
+                # Points stored after the session was read are not in positions
+                hits = [
+                    (positions[str(hit_id)], score)
+                    for hit_id, score in hits
+                    if str(hit_id) != str(emb['id']) and str(hit_id) in positions
+                ]
+                if not hits:
+                    raise LookupError(f"No neighbours found in Qdrant for {emb['id']}")
+                hits = (hits + hits[-1:] * k)[:k]
+                indices[start + offset] = [index for index, _ in hits]
+                distances[start + offset] = [score for _, score in hits]
+        
+        # Cosine similarity to euclidean distance between unit vectors
+        return np.sqrt(np.maximum(2 - 2 * distances, 0)), indices
+    
+    @staticmethod
+    def local_outlier_factor(distances: np.ndarray, indices: np.ndarray) -> np.ndarray:
+        """
+        Local outlier factor from a k-nearest-neighbour table
+        
+        Around 1 for items as densely surrounded as their neighbours; well
+        above 1 for items in sparser regions than their neighbours.
+        
+        Args:
+            distances: (n, k) neighbour distances, nearest first
+            indices: (n, k) neighbour indices
+        
+        Returns:
+            LOF score per item
+        """
+        k_distance = distances[:, -1]
+        reachability = np.maximum(distances, k_distance[indices])
+        # Exact duplicates give zero reachability; keep their density finite
+        density = 1.0 / np.maximum(reachability.mean(axis=1), 1e-12)
+        return density[indices].mean(axis=1) / density
+    
+    @timed("anomalies", "detect_anomalies")
+    async def detect_anomalies(
+        self,
+        embeddings: List[Dict[str, Any]],
+        session_id: str,
+        method: AnomalyMethod = AnomalyMethod.KNN,
+        k: Optional[int] = None,
+        threshold_percentile: float = 95.0,
+        neighbor_source: Optional[NeighborSource] = None,
+        vectors: Optional[np.ndarray] = None
+    ) -> Tuple[List[Dict[str, Any]], float]:
+        """
+        Detect anomalies from nearest-neighbour distances
+        
+        Args:
+            embeddings: List of embedding dictionaries with 'id', 'vector', 'payload'
+            session_id: Session the embeddings belong to
+            method: KNN or LOF
+            k: Neighbours per item (defaults to ANOMALY_KNN_K)
+            threshold_percentile: Percentile for anomaly threshold
+            neighbor_source: Where neighbours come from (defaults to ANOMALY_NEIGHBOR_SOURCE)
+            vectors: Projected vectors for the local source to search instead
+                of the normalized embeddings, one row per embedding
+        
+        Returns:
+            Tuple of (anomaly_list, threshold_value), in the same shape as
+            ClusteringService.detect_anomalies with 'distance' holding the
+            k-th neighbour distance and no cluster
+        """
+        if method == AnomalyMethod.CENTROID:
+            raise ValueError("Centroid anomalies come from ClusteringService.detect_anomalies")
+        if len(embeddings) < 2:
+            return [], 0.0
+        
+        k = min(k or settings.ANOMALY_KNN_K, len(embeddings) - 1)
+        neighbor_source = NeighborSource(neighbor_source or settings.ANOMALY_NEIGHBOR_SOURCE)
+        try:
+            if neighbor_source == NeighborSource.QDRANT:
+                try:
+                    distances, indices = await self.search_neighbors(embeddings, session_id, k)
+                except LookupError as e:
+                    # The index can lag the session's points; the exact local search cannot
+                    logger.warning(f"{e}; falling back to local neighbours")
+                    neighbor_source = NeighborSource.LOCAL
+            if neighbor_source == NeighborSource.LOCAL:
+                # Projected vectors are searched as they are; raw embeddings are normalized
+                normalize = vectors is None
+                if normalize:
+                    vectors = np.array([emb['vector'] for emb in embeddings], dtype=np.float32)
+                # Tiles are BLAS matrix products, which release the GIL
+                distances, indices = await asyncio.to_thread(self.nearest_neighbors, vectors, k, None, normalize)
+            
+            k_distance = distances[:, -1]
+            scores = self.local_outlier_factor(distances, indices) if method == AnomalyMethod.LOF else k_distance
+            threshold = float(np.percentile(scores, threshold_percentile))
+            
+            anomalies = [
+                {
+                    'file_id': embeddings[i]['id'],
+                    'filename': embeddings[i]['payload'].get('filename', 'unknown'),
+                    'file_type': embeddings[i]['payload'].get('file_type', 'unknown'),
+                    'score': float(scores[i]),
+                    'distance': float(k_distance[i]),
+                    'cluster_id': None
+                }
+                for i in np.flatnonzero(scores > threshold)
+            ]
+            
+            logger.info(
+                f"Detected {len(anomalies)} anomalies by {method.value} (k={k}, {neighbor_source.value} neighbours) "
+                f"with threshold {threshold}"
+            )
+            return anomalies, threshold
+        except Exception as e:
+            logger.error(f"Failed to detect anomalies: {e}")
+            raise
+
+# Singleton instance
+anomaly_service = AnomalyService()
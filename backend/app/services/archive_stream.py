@@ -0,0 +1,290 @@
+"""
+Forward-only readers for zip and tar archives
+
+zipfile needs a seekable file because it starts from the central directory at
+the end of the archive. These readers walk the local headers instead, so an
+archive can be unpacked while it is still being uploaded, holding no more than
+one read buffer in memory.
+"""
+import asyncio
+import io
+import struct
+import tarfile
+import zlib
+from typing import AsyncIterator, Awaitable, BinaryIO, Callable, Iterator, Optional, Tuple
+
+ZIP_LOCAL_HEADER = 0x04034B50
+ZIP_DATA_DESCRIPTOR = 0x08074B50
+ZIP_CENTRAL_HEADERS = {0x02014B50, 0x06054B50, 0x06064B50, 0x05054B50}
+ZIP64_EXTRA_ID = 0x0001
+READ_SIZE = 64 * 1024
+
+class ArchiveError(ValueError):
+    pass
+
+class PushbackReader:
+    """Wraps a forward-only stream so bytes read too far can be returned to it"""
+    
+    def __init__(self, raw: BinaryIO):
+        self.raw = raw
+        self._buffer = b""
+    
+    def read(self, size: int = -1) -> bytes:
+        if size is None or size < 0:
+            data, self._buffer = self._buffer + self.raw.read(), b""
+            return data
+        if self._buffer:
+            data, self._buffer = self._buffer[:size], self._buffer[size:]
+            return data
+        return self.raw.read(size)
+    
+    def read_exact(self, size: int) -> bytes:
+        parts = []
+        remaining = size
+        while remaining:
+            chunk = self.read(remaining)
+            if not chunk:
+                raise ArchiveError("Unexpected end of archive")
+            parts.append(chunk)
+            remaining -= len(chunk)
+        return b"".join(parts)
+    
+    def peek(self, size: int) -> bytes:
+        while len(self._buffer) < size:
+            chunk = self.raw.read(size - len(self._buffer))
+            if not chunk:
+                break
+            self._buffer += chunk
+        return self._buffer[:size]
+    
+    def unread(self, data: bytes):
+        self._buffer = data + self._buffer
+
+class _ZipEntryStream(io.RawIOBase):
+    """Decompressed contents of one zip entry, read straight off the archive"""
+    
+    def __init__(
+        self,
+        source: PushbackReader,
+        method: int,
+        compressed_size: Optional[int],
+        expected_crc: Optional[int]
+    ):
+        self._source = source
+        self._remaining = compressed_size
+        self._inflater = zlib.decompressobj(-15) if method == 8 else None
+        self._expected_crc = expected_crc
+        self._crc = 0
+        self._pending = b""
+        self._finished = False
+        self.crc = None
+    
+    def readable(self) -> bool:
+        return True
+    
+    def _next_compressed(self) -> bytes:
+        size = READ_SIZE if self._remaining is None else min(READ_SIZE, self._remaining)
+        if size == 0:
+            return b""
+        chunk = self._source.read(size)
+        if not chunk:
+            raise ArchiveError("Unexpected end of archive inside an entry")
+        if self._remaining is not None:
+            self._remaining -= len(chunk)
+        return chunk
+    
+    def _fill(self) -> bytes:
+        while not self._finished:
+            if self._inflater is None:
+                data = self._next_compressed()
+                if not data:
+                    self._finish()
+                    return b""
+            else:
+                if self._inflater.eof:
+                    self._finish()
+                    return b""
+                compressed = self._inflater.unconsumed_tail or self._next_compressed()
+                if not compressed:
+                    raise ArchiveError("Truncated deflate stream")
+                data = self._inflater.decompress(compressed, READ_SIZE)
+                if self._inflater.eof and self._inflater.unused_data:
+                    # Bytes past the end of the deflate stream belong to the next record
+                    self._source.unread(self._inflater.unused_data)
+            if data:
+                self._crc = zlib.crc32(data, self._crc)
+                return data
+        return b""
+    
+    def _finish(self):
+        self._finished = True
+        self.crc = self._crc
+        if self._expected_crc is not None and self._crc != self._expected_crc:
+            raise ArchiveError("CRC mismatch in zip entry")
+    
+    def readinto(self, buffer) -> int:
+        if not self._pending:
+            self._pending = self._fill()
+        size = min(len(buffer), len(self._pending))
+        buffer[:size] = self._pending[:size]
+        self._pending = self._pending[size:]
+        return size
+    
+    def drain(self):
+        while self._fill():
+            pass
+        self._pending = b""
+
+def _zip64_sizes(extra: bytes) -> Tuple[Optional[int], Optional[int]]:
+    offset = 0
+    while offset + 4 <= len(extra):
+        header_id, size = struct.unpack_from("<HH", extra, offset)
+        if header_id == ZIP64_EXTRA_ID and size >= 16:
+            return struct.unpack_from("<QQ", extra, offset + 4)
+        offset += 4 + size
+    return None, None
+
+def iter_zip(raw: BinaryIO) -> Iterator[Tuple[str, BinaryIO]]:
+    """
+    Yield (name, stream) for each file in a zip archive, in archive order
+    
+    Each stream must be read (or abandoned) before advancing; unread data is
+    skipped automatically. Stored entries written with a trailing data
+    descriptor carry no length and cannot be streamed.
+    """
+    source = raw if isinstance(raw, PushbackReader) else PushbackReader(raw)
+    while True:
+        signature_bytes = source.read_exact(4)
+        (signature,) = struct.unpack("<I", signature_bytes)
+        if signature in ZIP_CENTRAL_HEADERS:
+            return
+        if signature != ZIP_LOCAL_HEADER:
+            raise ArchiveError("Not a zip archive or corrupt local header")
+        
+        (_, flags, method, _, _, crc, compressed_size, _, name_length, extra_length) = struct.unpack(
+            "<HHHHHIIIHH", source.read_exact(26)
+        )
+        name = source.read_exact(name_length).decode("utf-8" if flags & 0x800 else "cp437")
+        extra = source.read_exact(extra_length)
+        
+        if flags & 0x1:
+            raise ArchiveError(f"Encrypted zip entries are not supported: {name}")
+        if method not in (0, 8):
+            raise ArchiveError(f"Unsupported zip compression method {method}: {name}")
+        
+        zip64 = False
+        if compressed_size == 0xFFFFFFFF:
+            zip64 = True
+            _, compressed_size = _zip64_sizes(extra)
+        has_descriptor = bool(flags & 0x8)
+        if has_descriptor:
+            if method == 0:
+                raise ArchiveError(f"Stored entry with data descriptor cannot be streamed: {name}")
+            zip64 = zip64 or _zip64_sizes(extra)[0] is not None
+            compressed_size, crc = None, None
+        
+        stream = _ZipEntryStream(source, method, compressed_size, crc)
+        if not name.endswith("/"):
+            yield name, stream
+        stream.drain()
+        
+        if has_descriptor:
+            head = source.read_exact(4)
+            if struct.unpack("<I", head)[0] != ZIP_DATA_DESCRIPTOR:
+                source.unread(head)
+            descriptor = source.read_exact(20 if zip64 else 12)
+            if struct.unpack_from("<I", descriptor)[0] != stream.crc:
+                raise ArchiveError(f"CRC mismatch in zip entry: {name}")
+
+def iter_tar(raw: BinaryIO) -> Iterator[Tuple[str, BinaryIO]]:
+    """Yield (name, stream) for each regular file in a (optionally compressed) tar stream"""
+    with tarfile.open(fileobj=raw, mode="r|*") as archive:
+        for member in archive:
+            if member.isfile():
+                yield member.name, archive.extractfile(member)
+
+def iter_archive(raw: BinaryIO) -> Iterator[Tuple[str, BinaryIO]]:
+    """Detect zip or tar from the leading bytes and yield its files"""
+    source = PushbackReader(raw)
+    if source.peek(4) == b"PK\x03\x04":
+        return iter_zip(source)
+    # tarfile sniffs the compression from a single read of the first block,
+    # so that read must not come back short
+    source.peek(tarfile.BLOCKSIZE)
+    return iter_tar(source)
+
+class _ChunkBridge(io.RawIOBase):
+    """Blocking file-like view of an asyncio queue of byte chunks, read off-loop"""
+    
+    def __init__(self, queue: asyncio.Queue, loop: asyncio.AbstractEventLoop):
+        self._queue = queue
+        self._loop = loop
+        self._buffer = b""
+        self._eof = False
+    
+    def readable(self) -> bool:
+        return True
+    
+    def readinto(self, buffer) -> int:
+        while not self._buffer and not self._eof:
+            chunk = asyncio.run_coroutine_threadsafe(self._queue.get(), self._loop).result()
+            if chunk is None:
+                self._eof = True
+            else:
+                self._buffer = chunk
+        size = min(len(buffer), len(self._buffer))
+        buffer[:size] = self._buffer[:size]
+        self._buffer = self._buffer[size:]
+        return size
+
+async def unpack_stream(
+    chunks: AsyncIterator[bytes],
+    handle_entry: Callable[[str, BinaryIO], Awaitable[None]],
+    queue_chunks: int
+):
+    """
+    Unpack an archive that arrives as async chunks, without buffering it
+    
+    A worker thread parses the archive from a queue of at most queue_chunks
+    chunks and hands each file to handle_entry on the event loop. The
+    archive can end (at a zip central directory) or fail before the body
+    does; the rest of the body is then left unread.
+    
+    Args:
+        chunks: Archive bytes as they arrive
+        handle_entry: Coroutine function called with each file's name and
+            stream; the stream blocks on the body, so read it off the loop
+        queue_chunks: Chunks buffered between the body and the parser
+    """
+    loop = asyncio.get_running_loop()
+    body: asyncio.Queue = asyncio.Queue(maxsize=queue_chunks)
+    
+    async def pump():
+        try:
+            async for chunk in chunks:
+                if chunk:
+                    await body.put(chunk)
+        except asyncio.CancelledError:
+            # Only cancelled once the parser has stopped reading: no end marker needed
+            raise
+        except Exception:
+            # The body broke off; end the stream so the parser reports a truncated archive
+            await body.put(None)
+            raise
+        await body.put(None)
+    
+    def extract():
+        for name, stream in iter_archive(_ChunkBridge(body, loop)):
+            asyncio.run_coroutine_threadsafe(handle_entry(name, stream), loop).result()
+    
+    pump_task = asyncio.create_task(pump())
+    try:
+        await asyncio.to_thread(extract)
+    finally:
+        pump_task.cancel()
+        await asyncio.gather(pump_task, return_exceptions=True)
+        # If this task was cancelled the parser may still be waiting for data:
+        # drop what is queued and end the stream so its thread can exit
+        while not body.empty():
+            body.get_nowait()
+        body.put_nowait(None)
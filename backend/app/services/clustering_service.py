@@ -1,8 +1,10 @@
 from scipy.cluster.hierarchy import linkage, fcluster, dendrogram as scipy_dendrogram
 from scipy.spatial.distance import pdist, cdist
 import numpy as np
+import asyncio
 import logging
 from typing import List, Dict, Any, Optional, Tuple
+from ..core.metrics import timed
 from ..schemas.clustering import ClusterSummary, ClusterItem, DendrogramNode
 
 logger = logging.getLogger(__name__)
@@ -13,7 +15,8 @@ class ClusteringService:
         self,
         embeddings: List[Dict[str, Any]],
         method: str = 'ward',
-        metric: str = 'euclidean'
+        metric: str = 'euclidean',
+        vectors: Optional[np.ndarray] = None
     ) -> Tuple[np.ndarray, List[Dict[str, Any]]]:
         """
         Perform hierarchical agglomerative clustering
@@ -22,6 +25,8 @@ class ClusteringService:
             embeddings: List of embedding dictionaries with 'id', 'vector', 'payload'
             method: Linkage method ('ward', 'complete', 'average', 'single')
             metric: Distance metric
+            vectors: Vectors to cluster in place of the embeddings' own, one
+                row per embedding (e.g. a reduced projection)
             
         Returns:
             Tuple of (linkage_matrix, embeddings_list)
@@ -31,10 +36,12 @@ class ClusteringService:
         
         try:
             # Extract vectors
-            vectors = np.array([emb['vector'] for emb in embeddings])
+            if vectors is None:
+                vectors = await asyncio.to_thread(np.array, [emb['vector'] for emb in embeddings])
             
-            # Perform hierarchical clustering
-            linkage_matrix = linkage(vectors, method=method, metric=metric)
+            # Perform hierarchical clustering off the event loop; it can take seconds
+            with timed("clustering", "linkage"):
+                linkage_matrix = await asyncio.to_thread(linkage, vectors, method=method, metric=metric)
             
             logger.info(f"Performed clustering on {len(embeddings)} items")
             return linkage_matrix, embeddings
@@ -45,7 +52,20 @@ class ClusteringService:
     async def generate_dendrogram_structure(
         self,
         linkage_matrix: np.ndarray,
-        embeddings: List[Dict[str, Any]]
+        embeddings: List[Dict[str, Any]],
+        include_items: bool = True
+    ) -> List[DendrogramNode]:
+        """Build the node list on a worker thread (see _generate_dendrogram_structure)"""
+        return await asyncio.to_thread(
+            self._generate_dendrogram_structure, linkage_matrix, embeddings, include_items
+        )
+    
+    @timed("clustering", "dendrogram_structure")
+    def _generate_dendrogram_structure(
+        self,
+        linkage_matrix: np.ndarray,
+        embeddings: List[Dict[str, Any]],
+        include_items: bool = True
     ) -> List[DendrogramNode]:
         """
         Generate dendrogram node structure from linkage matrix
@@ -53,6 +73,9 @@ class ClusteringService:
         Args:
             linkage_matrix: Scipy linkage matrix
             embeddings: List of embedding dictionaries
+            include_items: List every file id under each internal node. The
+                lists grow quadratically with session size and can be rebuilt
+                from the children, so large clients may turn them off
             
         Returns:
             List of dendrogram nodes
@@ -80,8 +103,11 @@ class ClusteringService:
             count = int(row[3])
             
             # Collect items from children
-            left_items = nodes[left_idx].items if left_idx < len(nodes) else []
-            right_items = nodes[right_idx].items if right_idx < len(nodes) else []
+            items = []
+            if include_items:
+                left_items = nodes[left_idx].items if left_idx < len(nodes) else []
+                right_items = nodes[right_idx].items if right_idx < len(nodes) else []
+                items = left_items + right_items
             
             node = DendrogramNode(
                 node_id=n + i,
@@ -89,7 +115,7 @@ class ClusteringService:
                 right_child=right_idx,
                 distance=distance,
                 item_count=count,
-                items=left_items + right_items
+                items=items
             )
             nodes.append(node)
         
@@ -101,6 +127,19 @@ class ClusteringService:
         linkage_matrix: np.ndarray,
         num_clusters: Optional[int] = None,
         distance_threshold: Optional[float] = None
+    ) -> List[ClusterSummary]:
+        """Compute the summaries on a worker thread (see _compute_cluster_summaries)"""
+        return await asyncio.to_thread(
+            self._compute_cluster_summaries, embeddings, linkage_matrix, num_clusters, distance_threshold
+        )
+    
+    @timed("clustering", "cluster_summaries")
+    def _compute_cluster_summaries(
+        self,
+        embeddings: List[Dict[str, Any]],
+        linkage_matrix: np.ndarray,
+        num_clusters: Optional[int] = None,
+        distance_threshold: Optional[float] = None
     ) -> List[ClusterSummary]:
         """
         Compute cluster summaries with centroids and representative items
@@ -196,6 +235,18 @@ class ClusteringService:
         embeddings: List[Dict[str, Any]],
         cluster_summaries: List[ClusterSummary],
         threshold_percentile: float = 95.0
+    ) -> Tuple[List[Dict[str, Any]], float]:
+        """Score every item on a worker thread (see _detect_anomalies)"""
+        return await asyncio.to_thread(
+            self._detect_anomalies, embeddings, cluster_summaries, threshold_percentile
+        )
+    
+    @timed("clustering", "detect_anomalies")
+    def _detect_anomalies(
+        self,
+        embeddings: List[Dict[str, Any]],
+        cluster_summaries: List[ClusterSummary],
+        threshold_percentile: float = 95.0
     ) -> Tuple[List[Dict[str, Any]], float]:
         """
         Detect anomalies based on distance to cluster centroids
@@ -0,0 +1,168 @@
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from ..core.config import settings
+from ..core.metrics import timed
+
+logger = logging.getLogger(__name__)
+
+class DisjointSet:
+    """
+    Union-find over item indices, with unions applied a whole batch at a time
+    
+    Each round hooks the larger root of every still-separated pair under the
+    smaller one. Roots only ever point at smaller indices, so the forest stays
+    acyclic even when several writes land on the same root; the pairs that
+    lost such a race are simply retried next round.
+    """
+    
+    def __init__(self, size: int):
+        self.parent = np.arange(size, dtype=np.int64)
+    
+    def _compress(self):
+        # Pointer jumping until every item points straight at its root
+        while True:
+            grandparent = self.parent[self.parent]
+            if np.array_equal(grandparent, self.parent):
+                return
+            self.parent = grandparent
+    
+    def union_many(self, a: np.ndarray, b: np.ndarray):
+        while len(a):
+            self._compress()
+            root_a, root_b = self.parent[a], self.parent[b]
+            separate = root_a != root_b
+            a, b = a[separate], b[separate]
+            root_a, root_b = root_a[separate], root_b[separate]
+            if not len(a):
+                return
+            self.parent[np.maximum(root_a, root_b)] = np.minimum(root_a, root_b)
+    
+    def roots(self) -> np.ndarray:
+        self._compress()
+        return self.parent
+
+class DuplicateService:
+
+    @staticmethod
+    def _normalized(vectors: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+    
+    @timed("duplicates", "similarity_blocks")
+    def find_duplicates(
+        self,
+        vectors: np.ndarray,
+        threshold: float,
+        max_pairs: int = 0,
+        block_size: Optional[int] = None
+    ) -> Tuple[np.ndarray, np.ndarray, Tuple[np.ndarray, np.ndarray, np.ndarray], int]:
+        """
+        All pairs with cosine similarity >= threshold, without the n x n matrix
+        
+        The similarity matrix is computed one float32 block x block tile at a
+        time over its upper triangle, so memory stays at a few tiles however
+        large the session. Pairs from each tile are folded into a union-find
+        as they are found, and only the first max_pairs are kept.
+        
+        Args:
+            vectors: (n, d) embedding matrix
+            threshold: Minimum cosine similarity
+            max_pairs: Pairs to keep for the caller (0 keeps none)
+            block_size: Rows per tile (defaults to DUPLICATE_BLOCK_SIZE)
+        
+        Returns:
+            Tuple of (root of each item's group, each item's best similarity
+            to another item or -inf, kept pairs as (rows, cols, similarities),
+            total number of pairs found)
+        """
+        block_size = block_size or settings.DUPLICATE_BLOCK_SIZE
+        vectors = self._normalized(np.ascontiguousarray(vectors, dtype=np.float32))
+        n = len(vectors)
+        
+        groups = DisjointSet(n)
+        best = np.full(n, -np.inf, dtype=np.float32)
+        kept: List[Tuple[np.ndarray, np.ndarray, np.ndarray]] = []
+        kept_count = 0
+        pair_count = 0
+        
+        for row_start in range(0, n, block_size):
+            row_block = vectors[row_start:row_start + block_size]
+            for col_start in range(row_start, n, block_size):
+                similarities = row_block @ vectors[col_start:col_start + block_size].T
+                if col_start == row_start:
+                    # Diagonal tile: only pairs above the diagonal, never an item with itself
+                    similarities[np.tril_indices(len(similarities))] = -np.inf
+                rows, cols = np.nonzero(similarities >= threshold)
+                if not len(rows):
+                    continue
+                
+                # Rounding can put identical vectors a hair above 1
+                scores = np.minimum(similarities[rows, cols], 1.0)
+                rows += row_start
+                cols += col_start
+                pair_count += len(rows)
+                np.maximum.at(best, rows, scores)
+                np.maximum.at(best, cols, scores)
+                groups.union_many(rows, cols)
+                
+                if kept_count < max_pairs:
+                    take = min(len(rows), max_pairs - kept_count)
+                    kept.append((rows[:take], cols[:take], scores[:take]))
+                    kept_count += take
+        
+        if kept:
+            pairs = tuple(np.concatenate(parts) for parts in zip(*kept))
+        else:
+            pairs = (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32))
+        return groups.roots(), best, pairs, pair_count
+    
+    async def find_session_duplicates(
+        self,
+        embeddings: List[Dict[str, Any]],
+        threshold: float,
+        max_pairs: int = 0
+    ) -> Dict[str, Any]:
+        """
+        Group a session's near-duplicate items
+        
+        Args:
+            embeddings: List of embedding dictionaries with 'id', 'vector', 'payload'
+            threshold: Minimum cosine similarity for two items to count as duplicates
+            max_pairs: Duplicate pairs to return alongside the groups
+        
+        Returns:
+            Dictionary with 'groups' (lists of item indices with their best
+            similarity, largest group first), 'pairs' (index pairs with
+            similarity) and 'pair_count' (all pairs found)
+        """
+        if len(embeddings) < 2:
+            return {"groups": [], "pairs": [], "pair_count": 0}
+        
+        vectors = np.array([emb['vector'] for emb in embeddings], dtype=np.float32)
+        # Tiles are BLAS matrix products, which release the GIL
+        roots, best, (rows, cols, scores), pair_count = await asyncio.to_thread(
+            self.find_duplicates, vectors, threshold, max_pairs
+        )
+        
+        duplicated = np.flatnonzero(np.isfinite(best))
+        order = duplicated[np.argsort(roots[duplicated], kind="stable")]
+        _, starts = np.unique(roots[order], return_index=True)
+        groups = [
+            [(int(i), float(best[i])) for i in members]
+            for members in np.split(order, starts[1:])
+            if len(members)
+        ]
+        groups.sort(key=len, reverse=True)
+        
+        logger.info(f"Found {pair_count} duplicate pairs in {len(groups)} groups among {len(embeddings)} items")
+        return {
+            "groups": groups,
+            "pairs": list(zip(rows.tolist(), cols.tolist(), scores.tolist())),
+            "pair_count": pair_count
+        }
+
+# Singleton instance
+duplicate_service = DuplicateService()
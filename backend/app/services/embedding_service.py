@@ -1,45 +1,111 @@
-from sentence_transformers import SentenceTransformer
-from transformers import AutoImageProcessor, AutoModel
 from PIL import Image
-import torch
 import numpy as np
+import asyncio
+import hashlib
 import logging
-from typing import Union, List
+import threading
+from typing import List, Optional, Union
 import io
 from ..core.config import settings
+from ..core.metrics import EMBEDDING_BATCH_SIZE, timed
+from .inference_client import InferenceClient
 
 logger = logging.getLogger(__name__)
 
 class EmbeddingService:
-    def __init__(self):
+    def __init__(self, inference_socket: Optional[str] = None):
+        """
+        Args:
+            inference_socket: Unix socket of a shared inference server; when
+                given, embedding requests are forwarded there and no models
+                are loaded in this process
+        """
         self.device = settings.DEVICE
-        logger.info(f"Initializing embedding models on device: {self.device}")
-        
-        # Initialize text embedding model (BGE)
-        try:
-            self.text_model = SentenceTransformer(
-                settings.TEXT_EMBEDDING_MODEL,
-                device=self.device
-            )
-            logger.info(f"Loaded text model: {settings.TEXT_EMBEDDING_MODEL}")
-        except Exception as e:
-            logger.error(f"Failed to load text model: {e}")
-            self.text_model = None
+        self.backend = settings.EMBEDDING_BACKEND
+        self.text_model = None
+        self.image_processor = None
+        self.image_model = None
+        self._models_loaded = False
+        self._load_lock = threading.Lock()
+        self.inference = InferenceClient(inference_socket) if inference_socket else None
+    
+    def load_models(self):
+        """
+        Load the text and image models (idempotent, thread-safe)
         
-        # Initialize image embedding model (DINO)
-        try:
-            self.image_processor = AutoImageProcessor.from_pretrained(
-                settings.IMAGE_EMBEDDING_MODEL
+        Loading is deferred from construction so importing the service stays
+        cheap; callers that need the models up front (workers) call this at
+        startup, everyone else loads them on first use.
+        """
+        with self._load_lock:
+            if self._models_loaded:
+                return
+            if self.inference is not None:
+                logger.info(f"Embedding via the inference server at {self.inference.path}")
+                self._models_loaded = True
+                return
+            if self.backend == "stub":
+                logger.warning("Using stub embeddings (content hashes, not model output)")
+                self._models_loaded = True
+                return
+            
+            # Imported here so processes that never embed don't pay for torch
+            from sentence_transformers import SentenceTransformer
+            from transformers import AutoImageProcessor, AutoModel
+            logger.info(f"Initializing embedding models on device: {self.device}")
+            
+            # Initialize text embedding model (BGE)
+            try:
+                self.text_model = SentenceTransformer(
+                    settings.TEXT_EMBEDDING_MODEL,
+                    device=self.device
+                )
+                logger.info(f"Loaded text model: {settings.TEXT_EMBEDDING_MODEL}")
+            except Exception as e:
+                logger.error(f"Failed to load text model: {e}")
+                self.text_model = None
+            
+            # Initialize image embedding model (DINO)
+            try:
+                self.image_processor = AutoImageProcessor.from_pretrained(
+                    settings.IMAGE_EMBEDDING_MODEL
+                )
+                self.image_model = AutoModel.from_pretrained(
+                    settings.IMAGE_EMBEDDING_MODEL
+                ).to(self.device)
+                self.image_model.eval()
+                logger.info(f"Loaded image model: {settings.IMAGE_EMBEDDING_MODEL}")
+            except Exception as e:
+                logger.error(f"Failed to load image model: {e}")
+                self.image_processor = None
+                self.image_model = None
+            
+            self._models_loaded = True
+    
+    async def _ensure_models(self):
+        if not self._models_loaded:
+            await asyncio.to_thread(self.load_models)
+    
+    def _stub_embeddings(self, contents: List[bytes]) -> List[List[float]]:
+        """Deterministic unit vectors seeded by content hash, for load tests without models"""
+        vectors = []
+        for content in contents:
+            seed = int.from_bytes(hashlib.sha256(content).digest()[:8], "little")
+            vector = np.random.default_rng(seed).standard_normal(settings.EMBEDDING_DIMENSION)
+            vectors.append((vector / np.linalg.norm(vector)).tolist())
+        return vectors
+    
+    def _fit_dimension(self, embedding_list: List[float], kind: str) -> List[float]:
+        """Pad or truncate an embedding to EMBEDDING_DIMENSION"""
+        if len(embedding_list) != settings.EMBEDDING_DIMENSION:
+            logger.warning(
+                f"{kind} embedding dimension mismatch: {len(embedding_list)} vs {settings.EMBEDDING_DIMENSION}"
             )
-            self.image_model = AutoModel.from_pretrained(
-                settings.IMAGE_EMBEDDING_MODEL
-            ).to(self.device)
-            self.image_model.eval()
-            logger.info(f"Loaded image model: {settings.IMAGE_EMBEDDING_MODEL}")
-        except Exception as e:
-            logger.error(f"Failed to load image model: {e}")
-            self.image_processor = None
-            self.image_model = None
+            if len(embedding_list) < settings.EMBEDDING_DIMENSION:
+                embedding_list.extend([0.0] * (settings.EMBEDDING_DIMENSION - len(embedding_list)))
+            else:
+                embedding_list = embedding_list[:settings.EMBEDDING_DIMENSION]
+        return embedding_list
     
     async def embed_text(self, text: str) -> List[float]:
         """
@@ -51,31 +117,43 @@ class EmbeddingService:
         Returns:
             Embedding vector as list of floats
         """
+        return (await self.embed_texts([text]))[0]
+    
+    async def embed_texts(self, texts: List[str]) -> List[List[float]]:
+        """
+        Generate embeddings for a batch of texts in one BGE forward pass
+        
+        Args:
+            texts: Input text strings
+        
+        Returns:
+            Embedding vectors in input order
+        """
+        if self.inference is not None:
+            return await self.inference.embed_texts(texts)
+        await self._ensure_models()
+        # The forward pass would otherwise stall every request on the event loop
+        return await asyncio.to_thread(self.encode_texts, texts)
+    
+    def encode_texts(self, texts: List[str]) -> List[List[float]]:
+        """Blocking BGE forward pass behind embed_texts; the models must be loaded"""
+        if self.backend == "stub":
+            return self._stub_embeddings([text.encode("utf-8", "replace") for text in texts])
         if self.text_model is None:
             raise RuntimeError("Text embedding model not initialized")
+        if not texts:
+            return []
         
         try:
-            # Generate embedding
-            embedding = self.text_model.encode(
-                text,
-                normalize_embeddings=True,
-                convert_to_numpy=True
-            )
-            
-            # Convert to list and ensure correct dimension
-            embedding_list = embedding.tolist()
-            
-            # Pad or truncate to match expected dimension if needed
-            if len(embedding_list) != settings.EMBEDDING_DIMENSION:
-                logger.warning(
-                    f"Text embedding dimension mismatch: {len(embedding_list)} vs {settings.EMBEDDING_DIMENSION}"
+            EMBEDDING_BATCH_SIZE.labels("text").observe(len(texts))
+            with timed("embedding", "text_forward"):
+                embeddings = self.text_model.encode(
+                    texts,
+                    batch_size=len(texts),
+                    normalize_embeddings=True,
+                    convert_to_numpy=True
                 )
-                if len(embedding_list) < settings.EMBEDDING_DIMENSION:
-                    embedding_list.extend([0.0] * (settings.EMBEDDING_DIMENSION - len(embedding_list)))
-                else:
-                    embedding_list = embedding_list[:settings.EMBEDDING_DIMENSION]
-            
-            return embedding_list
+            return [self._fit_dimension(embedding.tolist(), "Text") for embedding in embeddings]
         except Exception as e:
             logger.error(f"Failed to generate text embedding: {e}")
             raise
@@ -90,40 +168,100 @@ class EmbeddingService:
         Returns:
             Embedding vector as list of floats
         """
+        return await self.embed_decoded_image(self.decode_image(image_data))
+    
+    @staticmethod
+    @timed("embedding", "decode_image")
+    def decode_image(image_data: bytes) -> Image.Image:
+        """
+        Decode image bytes into an RGB PIL image
+        
+        Callers that need the pixels for more than embedding (e.g. thumbnails)
+        decode once here and pass the result to embed_decoded_image.
+        
+        Args:
+            image_data: Image binary data
+        
+        Returns:
+            Decoded RGB image
+        """
+        return Image.open(io.BytesIO(image_data)).convert('RGB')
+    
+    @staticmethod
+    def decode_text(file_data: bytes) -> str:
+        """
+        Decode text file bytes, falling back from UTF-8 to Latin-1
+        
+        Args:
+            file_data: File binary data
+        
+        Returns:
+            Decoded text
+        """
+        try:
+            return file_data.decode('utf-8')
+        except UnicodeDecodeError:
+            # Try other encodings
+            try:
+                return file_data.decode('latin-1')
+            except:
+                raise ValueError("Unable to decode text file")
+    
+    async def embed_decoded_image(self, image: Image.Image) -> List[float]:
+        """
+        Generate embedding for an already decoded image using DINO
+        
+        Args:
+            image: RGB PIL image
+        
+        Returns:
+            Embedding vector as list of floats
+        """
+        return (await self.embed_decoded_images([image]))[0]
+    
+    async def embed_decoded_images(self, images: List[Image.Image]) -> List[List[float]]:
+        """
+        Generate embeddings for a batch of decoded images in one DINO forward pass
+        
+        Args:
+            images: RGB PIL images
+        
+        Returns:
+            Embedding vectors in input order
+        """
+        if self.inference is not None:
+            return await self.inference.embed_images(images)
+        await self._ensure_models()
+        return await asyncio.to_thread(self.encode_images, images)
+    
+    def encode_images(self, images: List[Image.Image]) -> List[List[float]]:
+        """Blocking DINO forward pass behind embed_decoded_images; the models must be loaded"""
+        if self.backend == "stub":
+            return self._stub_embeddings([image.tobytes() for image in images])
         if self.image_processor is None or self.image_model is None:
             raise RuntimeError("Image embedding model not initialized")
+        if not images:
+            return []
+        
+        import torch
         
         try:
-            # Load image from bytes
-            image = Image.open(io.BytesIO(image_data)).convert('RGB')
+            EMBEDDING_BATCH_SIZE.labels("image").observe(len(images))
+            # Process images
+            with timed("embedding", "image_preprocess"):
+                inputs = self.image_processor(images=images, return_tensors="pt")
+                inputs = {k: v.to(self.device) for k, v in inputs.items()}
             
-            # Process image
-            inputs = self.image_processor(images=image, return_tensors="pt")
-            inputs = {k: v.to(self.device) for k, v in inputs.items()}
-            
-            # Generate embedding
-            with torch.no_grad():
+            # Generate embeddings
+            with timed("embedding", "image_forward"), torch.no_grad():
                 outputs = self.image_model(**inputs)
                 # Use CLS token embedding (first token)
-                embedding = outputs.last_hidden_state[:, 0, :].cpu().numpy()[0]
-            
-            # Normalize embedding
-            embedding = embedding / np.linalg.norm(embedding)
+                embeddings = outputs.last_hidden_state[:, 0, :].cpu().numpy()
             
-            # Convert to list and ensure correct dimension
-            embedding_list = embedding.tolist()
-            
-            # Pad or truncate to match expected dimension if needed
-            if len(embedding_list) != settings.EMBEDDING_DIMENSION:
-                logger.warning(
-                    f"Image embedding dimension mismatch: {len(embedding_list)} vs {settings.EMBEDDING_DIMENSION}"
-                )
-                if len(embedding_list) < settings.EMBEDDING_DIMENSION:
-                    embedding_list.extend([0.0] * (settings.EMBEDDING_DIMENSION - len(embedding_list)))
-                else:
-                    embedding_list = embedding_list[:settings.EMBEDDING_DIMENSION]
+            # Normalize embeddings
+            embeddings = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
             
-            return embedding_list
+            return [self._fit_dimension(embedding.tolist(), "Image") for embedding in embeddings]
         except Exception as e:
             logger.error(f"Failed to generate image embedding: {e}")
             raise
@@ -144,17 +282,7 @@ class EmbeddingService:
             if file_type == "image":
                 return await self.embed_image(file_data)
             elif file_type == "text":
-                # Decode text content
-                try:
-                    text = file_data.decode('utf-8')
-                except UnicodeDecodeError:
-                    # Try other encodings
-                    try:
-                        text = file_data.decode('latin-1')
-                    except:
-                        raise ValueError("Unable to decode text file")
-                
-                return await self.embed_text(text)
+                return await self.embed_text(self.decode_text(file_data))
             else:
                 raise ValueError(f"Unsupported file type: {file_type}")
         except Exception as e:
@@ -168,6 +296,11 @@ class EmbeddingService:
         Returns:
             Dictionary with model information
         """
+        if self.inference is not None:
+            return {
+                "inference_socket": self.inference.path,
+                "embedding_dimension": settings.EMBEDDING_DIMENSION
+            }
         return {
             "text_model": settings.TEXT_EMBEDDING_MODEL if self.text_model else None,
             "image_model": settings.IMAGE_EMBEDDING_MODEL if self.image_model else None,
@@ -178,5 +311,5 @@ class EmbeddingService:
         }
 
 # Singleton instance
-embedding_service = EmbeddingService()
+embedding_service = EmbeddingService(settings.INFERENCE_SOCKET)
 
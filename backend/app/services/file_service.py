@@ -0,0 +1,93 @@
+from sqlalchemy import func, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+import base64
+import binascii
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from ..models.file import File, EmbeddingStatus
+
+class InvalidCursorError(ValueError):
+    pass
+
+class FileService:
+    
+    @staticmethod
+    def encode_cursor(file: File) -> str:
+        raw = f"{file.created_at.isoformat()}|{file.id}"
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+    
+    @staticmethod
+    def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+        try:
+            raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+            created_at, file_id = raw.split("|", 1)
+            return datetime.fromisoformat(created_at), file_id
+        except (binascii.Error, UnicodeDecodeError, ValueError):
+            raise InvalidCursorError(f"Invalid cursor: {cursor}")
+    
+    async def list_page(
+        self,
+        db: AsyncSession,
+        session_id: str,
+        limit: int,
+        cursor: Optional[str] = None,
+        status: Optional[EmbeddingStatus] = None
+    ) -> Tuple[List[File], Optional[str]]:
+        """
+        Fetch one page of a session's files ordered by (created_at, id)
+        
+        Pages are addressed by keyset cursor rather than OFFSET, so every page
+        is a bounded range scan on ix_files_session_id_created_at_id no matter
+        how deep into the session it is.
+        
+        Args:
+            db: Database session
+            session_id: Session identifier
+            limit: Maximum number of files to return
+            cursor: Cursor returned with the previous page
+            status: Optional embedding status filter
+            
+        Returns:
+            Tuple of (files, next_cursor); next_cursor is None on the last page
+        """
+        query = select(File).where(File.session_id == session_id)
+        if status is not None:
+            query = query.where(File.embedding_status == status)
+        if cursor:
+            created_at, file_id = self.decode_cursor(cursor)
+            query = query.where(tuple_(File.created_at, File.id) > tuple_(created_at, file_id))
+        
+        # Fetch one extra row to learn whether another page exists
+        result = await db.execute(query.order_by(File.created_at, File.id).limit(limit + 1))
+        files = list(result.scalars().all())
+        
+        next_cursor = None
+        if len(files) > limit:
+            files = files[:limit]
+            next_cursor = self.encode_cursor(files[-1])
+        return files, next_cursor
+    
+    async def count_by_status(self, db: AsyncSession, session_id: str) -> Dict[EmbeddingStatus, int]:
+        """
+        Count a session's files per embedding status in a single GROUP BY
+        
+        Args:
+            db: Database session
+            session_id: Session identifier
+            
+        Returns:
+            Mapping of every EmbeddingStatus to its file count
+        """
+        result = await db.execute(
+            select(File.embedding_status, func.count())
+            .where(File.session_id == session_id)
+            .group_by(File.embedding_status)
+        )
+        counts = {status: 0 for status in EmbeddingStatus}
+        for status, count in result.all():
+            if status is not None:
+                counts[status] = count
+        return counts
+
+# Singleton instance
+file_service = FileService()
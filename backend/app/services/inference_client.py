@@ -0,0 +1,168 @@
+import asyncio
+import itertools
+import json
+import logging
+import struct
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from PIL import Image
+from ..core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Frame: header length and payload length (big-endian u32), JSON header, raw payload
+FRAME_PREFIX = struct.Struct("!II")
+
+async def read_frame(reader: asyncio.StreamReader) -> Tuple[Dict[str, Any], bytes]:
+    header_length, payload_length = FRAME_PREFIX.unpack(await reader.readexactly(FRAME_PREFIX.size))
+    header = json.loads(await reader.readexactly(header_length))
+    payload = await reader.readexactly(payload_length) if payload_length else b""
+    return header, payload
+
+def write_frame(writer: asyncio.StreamWriter, header: Dict[str, Any], payload: bytes = b""):
+    encoded = json.dumps(header).encode()
+    writer.write(FRAME_PREFIX.pack(len(encoded), len(payload)) + encoded)
+    if payload:
+        writer.write(payload)
+
+class InferenceClient:
+    """
+    Client for the shared inference server over a Unix socket
+    
+    One connection per process is multiplexed by request id, so concurrent
+    callers share it and the server is free to batch their inputs together.
+    Images travel as raw RGB pixels, downscaled first to about the size the
+    image processor resizes them to, and vectors come back as float32. The
+    connection is opened lazily and reopened after the server restarts; a
+    request interrupted by a lost connection is retried once.
+    """
+    
+    def __init__(self, path: str):
+        self.path = path
+        self.timeout = settings.INFERENCE_TIMEOUT
+        self._ids = itertools.count()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._connect_lock: Optional[asyncio.Lock] = None
+        self._reader_task: Optional[asyncio.Task] = None
+    
+    async def _connection(self) -> asyncio.StreamWriter:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # Streams belong to one event loop; a new loop starts from scratch
+            self._loop = loop
+            self._writer = None
+            self._pending = {}
+            self._connect_lock = asyncio.Lock()
+        
+        async with self._connect_lock:
+            if self._writer is None or self._writer.is_closing():
+                try:
+                    reader, self._writer = await asyncio.open_unix_connection(self.path)
+                except OSError as e:
+                    raise ConnectionError(f"Inference server unavailable at {self.path}: {e}") from e
+                self._reader_task = asyncio.create_task(self._read_responses(reader, self._writer))
+        return self._writer
+    
+    async def _read_responses(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                header, payload = await read_frame(reader)
+                future = self._pending.pop(header["id"], None)
+                if future is None or future.done():
+                    continue
+                if "error" in header:
+                    future.set_exception(RuntimeError(f"Inference server error: {header['error']}"))
+                else:
+                    future.set_result((header, payload))
+        except (asyncio.IncompleteReadError, OSError) as e:
+            logger.warning(f"Lost connection to inference server: {e}")
+        finally:
+            writer.close()
+            if self._writer is writer:
+                self._writer = None
+            pending, self._pending = self._pending, {}
+            for future in pending.values():
+                if not future.done():
+                    future.set_exception(ConnectionError("Inference server connection closed"))
+    
+    async def _call(self, header: Dict[str, Any], payload: bytes = b"") -> Tuple[Dict[str, Any], bytes]:
+        writer = await self._connection()
+        request_id = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        try:
+            write_frame(writer, {**header, "id": request_id}, payload)
+            await writer.drain()
+            return await asyncio.wait_for(future, timeout=self.timeout)
+        finally:
+            self._pending.pop(request_id, None)
+    
+    async def request(self, header: Dict[str, Any], payload: bytes = b"") -> Tuple[Dict[str, Any], bytes]:
+        """
+        Send one request and wait for its response
+        
+        Args:
+            header: JSON request header ("op" plus operation arguments)
+            payload: Raw request payload
+        
+        Returns:
+            Response header and payload
+        """
+        try:
+            return await self._call(header, payload)
+        except ConnectionError:
+            # Embedding is idempotent, so a request cut off by a server restart is safe to resend
+            logger.info("Retrying inference request on a new connection")
+            return await self._call(header, payload)
+    
+    async def _embed(self, header: Dict[str, Any], payload: bytes, count: int) -> List[List[float]]:
+        if count == 0:
+            return []
+        response, vectors = await self.request(header, payload)
+        return np.frombuffer(vectors, dtype="<f4").reshape(count, response["dimension"]).tolist()
+    
+    async def embed_texts(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embed texts on the inference server
+        
+        Args:
+            texts: Input text strings
+        
+        Returns:
+            Embedding vectors in input order
+        """
+        return await self._embed({"op": "text", "texts": texts}, b"", len(texts))
+    
+    async def embed_images(self, images: List[Image.Image]) -> List[List[float]]:
+        """
+        Embed decoded images on the inference server
+        
+        Args:
+            images: RGB PIL images
+        
+        Returns:
+            Embedding vectors in input order
+        """
+        # Resizing a full-resolution photo is tens of milliseconds; keep it off the loop
+        images = await asyncio.to_thread(lambda: [self._downscale(image) for image in images])
+        header = {"op": "image", "sizes": [list(image.size) for image in images]}
+        payload = b"".join(image.tobytes() for image in images)
+        return await self._embed(header, payload, len(images))
+    
+    @staticmethod
+    def _downscale(image: Image.Image) -> Image.Image:
+        """Shrink an image to INFERENCE_IMAGE_SHORTEST_EDGE, keeping its aspect ratio"""
+        shortest_edge = settings.INFERENCE_IMAGE_SHORTEST_EDGE
+        width, height = image.size
+        if not shortest_edge or min(width, height) <= shortest_edge:
+            return image
+        scale = shortest_edge / min(width, height)
+        size = (max(1, round(width * scale)), max(1, round(height * scale)))
+        # The processor would resize with the same filter on the server
+        return image.resize(size, Image.BICUBIC)
+    
+    async def ping(self):
+        """Round-trip to the server; raises if it is unreachable"""
+        await self.request({"op": "ping"})
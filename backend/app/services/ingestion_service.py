@@ -0,0 +1,271 @@
+from PIL import Image
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+import asyncio
+import io
+import logging
+import mimetypes
+import posixpath
+import uuid
+from datetime import datetime
+from typing import Any, AsyncIterator, BinaryIO, Dict, List, Optional, Tuple
+from ..core.config import settings
+from ..core.metrics import S3_BYTES, timed
+from ..models.file import File, FileType, EmbeddingStatus
+from .archive_stream import unpack_stream
+from .embedding_service import embedding_service
+from .job_queue import job_queue
+from .qdrant_service import qdrant_service
+from .s3_service import s3_service
+from .thumbnail_service import thumbnail_service
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".gif", ".webp"}
+# Content types PIL decodes, for uploads whose name has no known extension
+IMAGE_MIME_TYPES = {"image/jpeg", "image/pjpeg", "image/png", "image/gif", "image/webp"}
+TEXT_EXTENSIONS = {".txt", ".csv", ".json", ".md"}
+
+class _CountingReader(io.RawIOBase):
+    def __init__(self, stream: BinaryIO):
+        self._stream = stream
+        self.count = 0
+    
+    def readable(self) -> bool:
+        return True
+    
+    def read(self, size: int = -1) -> bytes:
+        data = self._stream.read(size)
+        self.count += len(data)
+        return data
+    
+    def readinto(self, buffer) -> int:
+        data = self.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+class IngestionService:
+
+    def classify_file(self, filename: str, content_type: Optional[str] = None) -> Optional[FileType]:
+        """
+        Determine the FileType of an uploaded file
+        
+        Args:
+            filename: Original filename
+            content_type: MIME type reported by the client, if any
+        
+        Returns:
+            FileType, or None if the file is not supported
+        """
+        extension = posixpath.splitext(filename.lower())[1]
+        if extension in IMAGE_EXTENSIONS:
+            return FileType.IMAGE
+        if extension in TEXT_EXTENSIONS:
+            return FileType.TEXT
+        if content_type in IMAGE_MIME_TYPES:
+            return FileType.IMAGE
+        if content_type and content_type.startswith("text/"):
+            return FileType.TEXT
+        return None
+    
+    def guess_mime_type(self, filename: str, content_type: Optional[str] = None) -> str:
+        if content_type and content_type != "application/octet-stream":
+            return content_type
+        return mimetypes.guess_type(filename)[0] or "application/octet-stream"
+    
+    def object_key(self, session_id: str, file_id: str, filename: str) -> str:
+        return f"{session_id}/{file_id}/{posixpath.basename(filename)}"
+    
+    @staticmethod
+    def point_payload(file: File) -> Dict[str, Any]:
+        """Qdrant payload stored with a file's vector"""
+        return {
+            "session_id": file.session_id,
+            "filename": file.filename,
+            "file_type": file.file_type.value,
+            "mime_type": file.mime_type,
+            "s3_key": file.s3_key,
+            # Lets a model upgrade find vectors written by the previous model
+            "embedding_model": (
+                settings.IMAGE_EMBEDDING_MODEL if file.file_type == FileType.IMAGE else settings.TEXT_EMBEDDING_MODEL
+            )
+        }
+    
+    async def embed_downloads(
+        self,
+        downloads: List[Tuple[File, bytes]]
+    ) -> Tuple[List[Tuple[File, List[float]]], List[Tuple[File, Image.Image]], Dict[str, str]]:
+        """
+        Decode and embed a batch of downloaded files
+        
+        Images and texts each go through their model in one batched forward
+        pass.
+        
+        Args:
+            downloads: Tuples of (File row, file binary data)
+        
+        Returns:
+            Tuple of (embedded, images, failed): (file, vector) pairs, the
+            decoded images for reuse, and file_id -> error message
+        """
+        failed: Dict[str, str] = {}
+        images: List[Tuple[File, Image.Image]] = []
+        texts: List[Tuple[File, str]] = []
+        
+        for file, file_data in downloads:
+            try:
+                if file.file_type == FileType.IMAGE:
+                    images.append((file, embedding_service.decode_image(file_data)))
+                else:
+                    texts.append((file, embedding_service.decode_text(file_data)))
+            except Exception as e:
+                logger.error(f"Failed to decode file {file.id}: {e}")
+                failed[file.id] = f"Decode failed: {e}"
+        
+        embedded: List[Tuple[File, List[float]]] = []
+        for batch, embed in (
+            (images, embedding_service.embed_decoded_images),
+            (texts, embedding_service.embed_texts)
+        ):
+            if not batch:
+                continue
+            try:
+                vectors = await embed([content for _, content in batch])
+                embedded.extend((file, vector) for (file, _), vector in zip(batch, vectors))
+            except Exception as e:
+                for file, _ in batch:
+                    failed[file.id] = f"Embedding failed: {e}"
+        
+        return embedded, images, failed
+    
+    @timed("ingestion", "process_batch")
+    async def process_batch(
+        self,
+        downloads: List[Tuple[File, bytes]]
+    ) -> Tuple[Dict[str, bool], Dict[str, str]]:
+        """
+        Embed a batch of ingested files and build their derivatives
+        
+        Images are decoded exactly once; the same decoded image feeds both
+        the embedding model and the thumbnail renderer.
+        
+        Args:
+            downloads: Tuples of (File row, file binary data)
+        
+        Returns:
+            Tuple of (succeeded, failed): file_id -> whether thumbnails were
+            stored, and file_id -> error message
+        """
+        embedded, images, failed = await self.embed_downloads(downloads)
+        
+        # Thumbnails are an optimisation; the grid falls back to the original
+        ready_images = [(file, image) for file, image in images if file.id not in failed]
+        thumbnail_results = await asyncio.gather(
+            *(thumbnail_service.store_thumbnails(file.s3_key, image) for file, image in ready_images),
+            return_exceptions=True
+        )
+        thumbnail_ids = {
+            file.id
+            for (file, _), stored in zip(ready_images, thumbnail_results)
+            if not isinstance(stored, BaseException)
+        }
+        
+        try:
+            await qdrant_service.store_embeddings([
+                (file.id, vector, self.point_payload(file))
+                for file, vector in embedded
+            ])
+        except Exception as e:
+            for file, _ in embedded:
+                failed[file.id] = f"Vector store failed: {e}"
+            return {}, failed
+        
+        succeeded = {file.id: file.id in thumbnail_ids for file, _ in embedded}
+        logger.info(f"Processed {len(succeeded)} files, {len(failed)} failed")
+        return succeeded, failed
+    
+    async def ingest_archive(
+        self,
+        db: AsyncSession,
+        session_id: str,
+        chunks: AsyncIterator[bytes]
+    ) -> Dict[str, int]:
+        """
+        Ingest a zip or tar archive while its upload is still streaming in
+        
+        A worker thread unpacks entries from a bounded queue fed by the request
+        body; each supported entry is streamed into S3 as it is extracted.
+        File rows are bulk-inserted and their embedding jobs enqueued every
+        INGEST_DB_BATCH_SIZE entries, so memory stays flat however large the
+        archive is. Unsupported and hidden entries are skipped.
+        
+        Args:
+            db: Database session
+            session_id: Session the files belong to
+            chunks: Archive bytes as they arrive
+        
+        Returns:
+            Counts of files ingested, files skipped and bytes ingested
+        """
+        stats = {"files_ingested": 0, "files_skipped": 0, "bytes_ingested": 0}
+        rows: List[Dict] = []
+        
+        async def flush():
+            if not rows:
+                return
+            batch = list(rows)
+            rows.clear()
+            await db.execute(insert(File), batch)
+            await job_queue.enqueue(db, session_id, [row["id"] for row in batch])
+            await db.commit()
+        
+        async def handle_entry(name: str, stream: BinaryIO):
+            filename = posixpath.basename(name)
+            file_type = None
+            if filename and not filename.startswith(".") and "__MACOSX/" not in name:
+                file_type = self.classify_file(filename)
+            if file_type is None:
+                stats["files_skipped"] += 1
+                return
+            
+            file_id = str(uuid.uuid4())
+            s3_key = self.object_key(session_id, file_id, filename)
+            mime_type = self.guess_mime_type(filename)
+            counter = _CountingReader(stream)
+            await s3_service.upload_stream(counter, s3_key, mime_type)
+            S3_BYTES.labels("upload").inc(counter.count)
+            
+            now = datetime.utcnow()
+            rows.append({
+                "id": file_id,
+                "session_id": session_id,
+                "filename": filename,
+                "file_type": file_type,
+                "mime_type": mime_type,
+                "file_size": counter.count,
+                "s3_bucket": s3_service.bucket_name,
+                "s3_key": s3_key,
+                "embedding_status": EmbeddingStatus.PENDING,
+                "has_thumbnails": False,
+                "created_at": now,
+                "updated_at": now
+            })
+            stats["files_ingested"] += 1
+            stats["bytes_ingested"] += counter.count
+            if len(rows) >= settings.INGEST_DB_BATCH_SIZE:
+                await flush()
+        
+        try:
+            await unpack_stream(chunks, handle_entry, settings.INGEST_QUEUE_CHUNKS)
+        finally:
+            # Keep everything already stored, even if the archive turned out to be corrupt
+            await flush()
+        
+        logger.info(
+            f"Ingested {stats['files_ingested']} files ({stats['bytes_ingested']} bytes) "
+            f"into session {session_id}, skipped {stats['files_skipped']}"
+        )
+        return stats
+
+# Singleton instance
+ingestion_service = IngestionService()
@@ -0,0 +1,300 @@
+from sqlalchemy import and_, delete, func, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import datetime, timedelta
+import logging
+from typing import Dict, Iterable, List
+from ..core.config import settings
+from ..core.metrics import EMBEDDING_JOBS, timed
+from ..db.database import SessionLocal, insert
+from ..models.file import File, EmbeddingStatus
+from ..models.job import EmbeddingJob, JobStatus
+from .progress_service import StatusDeltas, progress_broker, record_transition
+from .session_service import session_service
+
+logger = logging.getLogger(__name__)
+
+# A job's status always mirrors its file's embedding status
+FILE_STATUS = {
+    JobStatus.QUEUED: EmbeddingStatus.PENDING,
+    JobStatus.RUNNING: EmbeddingStatus.PROCESSING,
+    JobStatus.FAILED: EmbeddingStatus.FAILED,
+}
+
+class EmbeddingJobQueue:
+    """
+    Durable embedding work queue stored in the embedding_jobs table
+    
+    Jobs are claimed with SELECT ... FOR UPDATE SKIP LOCKED, so any number of
+    worker processes can pull batches concurrently without blocking on, or
+    double-claiming, each other's rows.
+    """
+    
+    def __init__(self):
+        self.max_attempts = settings.EMBEDDING_JOB_MAX_ATTEMPTS
+        self.visibility_timeout = timedelta(seconds=settings.EMBEDDING_JOB_VISIBILITY_TIMEOUT)
+        self.retry_backoff = settings.EMBEDDING_JOB_RETRY_BACKOFF
+    
+    async def enqueue(self, db: AsyncSession, session_id: str, file_ids: Iterable[str]):
+        """
+        Add embedding jobs for files in the caller's transaction
+        
+        Enqueuing alongside the File insert means an upload is either fully
+        registered with pending work or not registered at all. The files are
+        counted as new pending files for progress reporting. Re-enqueuing a
+        file resets its job.
+        
+        Args:
+            db: Database session (committed by the caller)
+            session_id: Session owning the files
+            file_ids: Files to embed
+        """
+        now = datetime.utcnow()
+        rows = [
+            {
+                "file_id": file_id,
+                "session_id": session_id,
+                "status": JobStatus.QUEUED,
+                "attempts": 0,
+                "run_after": now,
+                "created_at": now,
+                "updated_at": now
+            }
+            for file_id in file_ids
+        ]
+        if not rows:
+            return
+        
+        stmt = insert(EmbeddingJob).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[EmbeddingJob.file_id],
+            set_={
+                "status": JobStatus.QUEUED,
+                "attempts": 0,
+                "run_after": now,
+                "locked_by": None,
+                "locked_until": None,
+                "last_error": None,
+                "updated_at": now
+            }
+        )
+        await db.execute(stmt)
+        
+        deltas: StatusDeltas = {}
+        record_transition(deltas, session_id, None, EmbeddingStatus.PENDING, len(rows))
+        await progress_broker.emit(db, deltas)
+    
+    async def backlog(self) -> int:
+        """
+        Number of queued jobs, for background work that should yield to live uploads
+        
+        Returns:
+            Count of jobs waiting to be claimed
+        """
+        async with SessionLocal() as db:
+            return await db.scalar(
+                select(func.count()).select_from(EmbeddingJob).where(EmbeddingJob.status == JobStatus.QUEUED)
+            )
+    
+    @timed("job_queue", "claim")
+    async def claim(self, worker_id: str, batch_size: int) -> List[File]:
+        """
+        Claim up to batch_size due jobs and mark their files as processing
+        
+        Running jobs whose lease has expired (the worker died or hung) are
+        claimable again; ones that have used every attempt are failed instead.
+        
+        Args:
+            worker_id: Identifier recorded on the claimed jobs
+            batch_size: Maximum number of jobs to claim
+        
+        Returns:
+            Files for the claimed jobs
+        """
+        now = datetime.utcnow()
+        deltas: StatusDeltas = {}
+        async with SessionLocal() as db:
+            await self._fail_exhausted_leases(db, now, deltas)
+            
+            claimable = or_(
+                and_(EmbeddingJob.status == JobStatus.QUEUED, EmbeddingJob.run_after <= now),
+                and_(EmbeddingJob.status == JobStatus.RUNNING, EmbeddingJob.locked_until < now)
+            )
+            result = await db.execute(
+                select(EmbeddingJob.file_id, EmbeddingJob.session_id, EmbeddingJob.status)
+                .where(claimable)
+                .order_by(EmbeddingJob.run_after)
+                .limit(batch_size)
+                .with_for_update(skip_locked=True)
+            )
+            jobs = result.all()
+            if not jobs:
+                await progress_broker.emit(db, deltas)
+                await db.commit()
+                return []
+            
+            file_ids = [job.file_id for job in jobs]
+            for job in jobs:
+                record_transition(deltas, job.session_id, FILE_STATUS[job.status], EmbeddingStatus.PROCESSING)
+            
+            await db.execute(
+                update(EmbeddingJob)
+                .where(EmbeddingJob.file_id.in_(file_ids))
+                .values(
+                    status=JobStatus.RUNNING,
+                    attempts=EmbeddingJob.attempts + 1,
+                    locked_by=worker_id,
+                    locked_until=now + self.visibility_timeout,
+                    updated_at=now
+                )
+            )
+            await self._set_file_status(db, file_ids, EmbeddingStatus.PROCESSING, now)
+            files = (await db.execute(select(File).where(File.id.in_(file_ids)))).scalars().all()
+            await progress_broker.emit(db, deltas)
+            await db.commit()
+        
+        EMBEDDING_JOBS.labels("claimed").inc(len(files))
+        logger.info(f"Worker {worker_id} claimed {len(files)} embedding jobs")
+        return list(files)
+    
+    async def _fail_exhausted_leases(self, db: AsyncSession, now: datetime, deltas: StatusDeltas):
+        result = await db.execute(
+            select(EmbeddingJob.file_id, EmbeddingJob.session_id)
+            .where(
+                EmbeddingJob.status == JobStatus.RUNNING,
+                EmbeddingJob.locked_until < now,
+                EmbeddingJob.attempts >= self.max_attempts
+            )
+            .with_for_update(skip_locked=True)
+        )
+        jobs = result.all()
+        if not jobs:
+            return
+        
+        file_ids = [job.file_id for job in jobs]
+        for job in jobs:
+            record_transition(deltas, job.session_id, EmbeddingStatus.PROCESSING, EmbeddingStatus.FAILED)
+        await db.execute(
+            update(EmbeddingJob)
+            .where(EmbeddingJob.file_id.in_(file_ids))
+            .values(
+                status=JobStatus.FAILED,
+                locked_by=None,
+                locked_until=None,
+                last_error="Visibility timeout exceeded on final attempt",
+                updated_at=now
+            )
+        )
+        await self._set_file_status(db, file_ids, EmbeddingStatus.FAILED, now)
+        EMBEDDING_JOBS.labels("lease_exhausted").inc(len(file_ids))
+        logger.warning(f"Failed {len(file_ids)} embedding jobs that exhausted their leases")
+    
+    async def _set_file_status(
+        self,
+        db: AsyncSession,
+        file_ids: List[str],
+        status: EmbeddingStatus,
+        now: datetime,
+        **values
+    ):
+        if file_ids:
+            await db.execute(
+                update(File)
+                .where(File.id.in_(file_ids))
+                .values(embedding_status=status, updated_at=now, **values)
+            )
+    
+    @timed("job_queue", "complete")
+    async def complete(self, worker_id: str, results: Dict[str, bool]):
+        """
+        Mark a batch of jobs as done in bulk
+        
+        Only jobs still leased to worker_id are completed: a job whose lease
+        expired may have been reclaimed by another worker, which owns it now.
+        
+        Args:
+            worker_id: Worker that claimed the jobs
+            results: Mapping of file_id to whether thumbnails were stored
+        """
+        if not results:
+            return
+        
+        now = datetime.utcnow()
+        deltas: StatusDeltas = {}
+        async with SessionLocal() as db:
+            deleted = await db.execute(
+                delete(EmbeddingJob)
+                .where(EmbeddingJob.file_id.in_(list(results)), EmbeddingJob.locked_by == worker_id)
+                .returning(EmbeddingJob.file_id, EmbeddingJob.session_id, EmbeddingJob.status)
+            )
+            completed = []
+            for job in deleted.all():
+                completed.append(job.file_id)
+                record_transition(deltas, job.session_id, FILE_STATUS[job.status], EmbeddingStatus.COMPLETED)
+            # New vectors invalidate cached analysis responses for these sessions
+            await session_service.bump_content_version(db, deltas)
+            with_thumbnails = [file_id for file_id in completed if results[file_id]]
+            without_thumbnails = [file_id for file_id in completed if not results[file_id]]
+            await self._set_file_status(db, with_thumbnails, EmbeddingStatus.COMPLETED, now, has_thumbnails=True)
+            await self._set_file_status(db, without_thumbnails, EmbeddingStatus.COMPLETED, now)
+            await progress_broker.emit(db, deltas)
+            await db.commit()
+        
+        EMBEDDING_JOBS.labels("completed").inc(len(completed))
+        if len(completed) < len(results):
+            EMBEDDING_JOBS.labels("lease_lost").inc(len(results) - len(completed))
+            logger.warning(f"Worker {worker_id} lost the lease on {len(results) - len(completed)} completed jobs")
+    
+    @timed("job_queue", "fail")
+    async def fail(self, worker_id: str, errors: Dict[str, str]):
+        """
+        Record failures for a batch of jobs in bulk
+        
+        Jobs with attempts left are requeued with exponential backoff and their
+        files go back to pending; the rest are failed permanently. Jobs no
+        longer leased to worker_id are left to the worker that reclaimed them.
+        
+        Args:
+            worker_id: Worker that claimed the jobs
+            errors: Mapping of file_id to error message
+        """
+        if not errors:
+            return
+        
+        now = datetime.utcnow()
+        deltas: StatusDeltas = {}
+        async with SessionLocal() as db:
+            result = await db.execute(
+                select(EmbeddingJob.file_id, EmbeddingJob.session_id, EmbeddingJob.status, EmbeddingJob.attempts)
+                .where(EmbeddingJob.file_id.in_(list(errors)), EmbeddingJob.locked_by == worker_id)
+                .with_for_update()
+            )
+            retry, exhausted = [], []
+            for file_id, session_id, status, attempts in result.all():
+                row = {
+                    "file_id": file_id,
+                    "locked_by": None,
+                    "locked_until": None,
+                    "last_error": errors[file_id][:2000],
+                    "updated_at": now
+                }
+                if attempts < self.max_attempts:
+                    delay = self.retry_backoff * (2 ** (attempts - 1))
+                    retry.append({**row, "status": JobStatus.QUEUED, "run_after": now + timedelta(seconds=delay)})
+                    record_transition(deltas, session_id, FILE_STATUS[status], EmbeddingStatus.PENDING)
+                else:
+                    exhausted.append({**row, "status": JobStatus.FAILED})
+                    record_transition(deltas, session_id, FILE_STATUS[status], EmbeddingStatus.FAILED)
+            
+            if retry or exhausted:
+                await db.execute(update(EmbeddingJob), retry + exhausted)
+            await self._set_file_status(db, [r["file_id"] for r in retry], EmbeddingStatus.PENDING, now)
+            await self._set_file_status(db, [r["file_id"] for r in exhausted], EmbeddingStatus.FAILED, now)
+            await progress_broker.emit(db, deltas)
+            await db.commit()
+        
+        EMBEDDING_JOBS.labels("retried").inc(len(retry))
+        EMBEDDING_JOBS.labels("failed").inc(len(exhausted))
+        logger.warning(f"Embedding jobs failed: {len(retry)} requeued, {len(exhausted)} exhausted")
+
+# Singleton instance
+job_queue = EmbeddingJobQueue()
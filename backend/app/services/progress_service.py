@@ -0,0 +1,265 @@
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+import asyncio
+import itertools
+import json
+import logging
+import uuid
+from typing import AsyncIterator, Dict, Optional, Tuple
+from ..core.config import settings
+from ..db.database import SessionLocal, engine
+from ..models.file import EmbeddingStatus
+from ..schemas.embedding import SessionEmbeddingSummary
+from .file_service import file_service
+
+logger = logging.getLogger(__name__)
+
+PROGRESS_CHANNEL = "embedding_progress"
+
+# session_id -> status -> change in file count
+StatusDeltas = Dict[str, Dict[EmbeddingStatus, int]]
+
+def record_transition(
+    deltas: StatusDeltas,
+    session_id: str,
+    old: Optional[EmbeddingStatus],
+    new: EmbeddingStatus,
+    count: int = 1
+):
+    """Add count files moving from old (None for new files) to new to deltas"""
+    if old == new:
+        return
+    session = deltas.setdefault(session_id, {})
+    if old is not None:
+        session[old] = session.get(old, 0) - count
+    session[new] = session.get(new, 0) + count
+
+class _SessionProgress:
+    def __init__(self):
+        self.counts: Optional[Dict[EmbeddingStatus, int]] = None
+        self.seq = 0
+        self.changed = asyncio.Event()
+        self.lock = asyncio.Lock()
+        self.subscribers = 0
+        self.released_at = 0.0
+        self.reconciled_at = float("-inf")
+    
+    def bump(self, seq: int):
+        self.seq = seq
+        self.changed.set()
+        self.changed = asyncio.Event()
+
+class ProgressBroker:
+    """
+    Per-session embedding progress kept current from status change events
+    
+    The job queue emits a delta for every batch of status transitions. With
+    Postgres these travel as NOTIFY payloads sent inside the transaction that
+    made the change, so they arrive (in every API process) only once it has
+    committed. Counts are loaded with one GROUP BY when a session is first
+    watched and afterwards only re-checked occasionally to correct drift, so
+    watching a large ingest costs the database almost nothing.
+    """
+    
+    def __init__(self):
+        self.snapshot_interval = settings.PROGRESS_SNAPSHOT_INTERVAL
+        self.heartbeat_interval = settings.PROGRESS_HEARTBEAT_INTERVAL
+        self.reconcile_interval = settings.PROGRESS_RECONCILE_INTERVAL
+        self.retain_seconds = settings.PROGRESS_RETAIN_SECONDS
+        # Event ids are only meaningful to the process that issued them
+        self.epoch = uuid.uuid4().hex[:12]
+        self._sessions: Dict[str, _SessionProgress] = {}
+        # Shared by all sessions so a recreated session never reuses an event id
+        self._seq = itertools.count(1)
+        self._listener: Optional[asyncio.Task] = None
+    
+    @property
+    def _notify(self) -> bool:
+        return engine.dialect.name == "postgresql"
+    
+    async def emit(self, db: AsyncSession, deltas: StatusDeltas):
+        """
+        Publish status deltas as part of the caller's transaction
+        
+        Args:
+            db: Database session making the status change (committed by the caller)
+            deltas: Per-session status count changes
+        """
+        for session_id, changes in deltas.items():
+            changes = {status: count for status, count in changes.items() if count}
+            if not changes:
+                continue
+            if self._notify:
+                payload = json.dumps({
+                    "session_id": session_id,
+                    "deltas": {status.value: count for status, count in changes.items()}
+                })
+                await db.execute(select(func.pg_notify(PROGRESS_CHANNEL, payload)))
+            else:
+                self.apply(session_id, changes)
+    
+    def apply(self, session_id: str, changes: Dict[EmbeddingStatus, int]):
+        """Apply a delta to a watched session; unwatched sessions are ignored"""
+        state = self._sessions.get(session_id)
+        if state is None or state.counts is None:
+            return
+        for status, count in changes.items():
+            state.counts[status] += count
+        
+        in_flight = state.counts[EmbeddingStatus.PENDING] + state.counts[EmbeddingStatus.PROCESSING]
+        if in_flight == 0 or any(count < 0 for count in state.counts.values()):
+            # Confirm the final (or an impossible) state against the database
+            state.reconciled_at = float("-inf")
+        state.bump(next(self._seq))
+    
+    def _on_notification(self, connection, pid, channel, payload):
+        try:
+            message = json.loads(payload)
+            changes = {EmbeddingStatus(status): count for status, count in message["deltas"].items()}
+        except (ValueError, KeyError) as e:
+            logger.warning(f"Ignoring malformed progress notification: {e}")
+            return
+        self.apply(message["session_id"], changes)
+    
+    def _reconcile_due(self, state: _SessionProgress) -> bool:
+        if state.counts is None:
+            return True
+        return asyncio.get_running_loop().time() - state.reconciled_at >= self.reconcile_interval
+    
+    async def _reconcile(self, session_id: str, state: _SessionProgress):
+        async with state.lock:
+            loop = asyncio.get_running_loop()
+            if not self._reconcile_due(state):
+                return
+            try:
+                async with SessionLocal() as db:
+                    counts = await file_service.count_by_status(db, session_id)
+            except Exception as e:
+                if state.counts is None:
+                    raise
+                # Keep streaming the event-driven counts and try again later
+                logger.error(f"Failed to reconcile progress for session {session_id}: {e}")
+                state.reconciled_at = loop.time()
+                return
+            state.reconciled_at = loop.time()
+            if counts != state.counts:
+                state.counts = counts
+                state.bump(next(self._seq))
+    
+    def _acquire(self, session_id: str) -> _SessionProgress:
+        now = asyncio.get_running_loop().time()
+        for stale in [
+            sid for sid, s in self._sessions.items()
+            if s.subscribers == 0 and now - s.released_at > self.retain_seconds
+        ]:
+            del self._sessions[stale]
+        
+        state = self._sessions.setdefault(session_id, _SessionProgress())
+        state.subscribers += 1
+        return state
+    
+    def _release(self, state: _SessionProgress):
+        state.subscribers -= 1
+        if state.subscribers == 0:
+            state.released_at = asyncio.get_running_loop().time()
+    
+    def _resume_seq(self, cursor: Optional[str]) -> Optional[int]:
+        if not cursor:
+            return None
+        epoch, _, seq = cursor.partition("-")
+        if epoch != self.epoch or not seq.isdigit():
+            return None
+        return int(seq)
+    
+    async def subscribe(
+        self,
+        session_id: str,
+        cursor: Optional[str] = None
+    ) -> AsyncIterator[Tuple[str, Optional[SessionEmbeddingSummary]]]:
+        """
+        Stream progress snapshots for a session
+        
+        A snapshot is yielded whenever the counts have changed, at most once per
+        PROGRESS_SNAPSHOT_INTERVAL however many events arrive in between. While
+        nothing changes a (cursor, None) heartbeat is yielded every
+        PROGRESS_HEARTBEAT_INTERVAL seconds.
+        
+        Args:
+            session_id: Session identifier
+            cursor: Id of the last event the client received; when this process
+                issued it and still tracks the session, streaming resumes from
+                the in-memory counts without a recount
+        
+        Yields:
+            Tuples of (event id, snapshot or None for a heartbeat)
+        """
+        state = self._acquire(session_id)
+        try:
+            last_seq = self._resume_seq(cursor)
+            while True:
+                if self._reconcile_due(state):
+                    await self._reconcile(session_id, state)
+                
+                if last_seq != state.seq:
+                    last_seq = state.seq
+                    yield f"{self.epoch}-{last_seq}", self._summary(session_id, state.counts)
+                    await asyncio.sleep(self.snapshot_interval)
+                    continue
+                
+                changed = state.changed
+                try:
+                    await asyncio.wait_for(changed.wait(), timeout=self.heartbeat_interval)
+                except asyncio.TimeoutError:
+                    yield f"{self.epoch}-{last_seq}", None
+        finally:
+            self._release(state)
+    
+    @staticmethod
+    def _summary(session_id: str, counts: Dict[EmbeddingStatus, int]) -> SessionEmbeddingSummary:
+        return SessionEmbeddingSummary(
+            session_id=session_id,
+            total=sum(counts.values()),
+            **{status.value: count for status, count in counts.items()}
+        )
+    
+    async def _listen(self):
+        import asyncpg
+        
+        dsn = engine.url.set(drivername="postgresql").render_as_string(hide_password=False)
+        while True:
+            connection = None
+            try:
+                connection = await asyncpg.connect(dsn)
+                closed = asyncio.Event()
+                connection.add_termination_listener(lambda _: closed.set())
+                await connection.add_listener(PROGRESS_CHANNEL, self._on_notification)
+                # Events may have been missed while not listening
+                for state in self._sessions.values():
+                    state.reconciled_at = float("-inf")
+                logger.info(f"Listening for progress events on '{PROGRESS_CHANNEL}'")
+                await closed.wait()
+                logger.warning("Progress listener connection closed; reconnecting")
+            except asyncio.CancelledError:
+                if connection is not None:
+                    await connection.close()
+                raise
+            except Exception as e:
+                logger.error(f"Progress listener failed: {e}")
+            await asyncio.sleep(self.heartbeat_interval)
+    
+    def start(self):
+        """Start listening for progress events from other processes"""
+        if self._notify and self._listener is None:
+            self._listener = asyncio.create_task(self._listen())
+    
+    async def stop(self):
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+
+# Singleton instance
+progress_broker = ProgressBroker()
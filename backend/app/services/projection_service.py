@@ -0,0 +1,168 @@
+from collections import OrderedDict
+import asyncio
+import logging
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+import numpy as np
+from ..core.config import settings
+from ..core.metrics import timed
+from ..db.database import SessionLocal
+from ..schemas.clustering import ProjectionInfo
+from .session_service import session_service
+
+logger = logging.getLogger(__name__)
+
+class Projection(NamedTuple):
+    ids: Tuple[str, ...]  # Item order the projected rows follow
+    vectors: np.ndarray  # (n, dimension) float32 coordinates
+    explained_variance_ratio: np.ndarray  # Share of the total variance per component
+
+class ProjectionService:
+    """
+    PCA of a session's embeddings into a smaller clustering space
+    
+    Components are found with a randomized SVD, which costs O(n * d * k)
+    rather than a full decomposition, and only the projected matrix is kept,
+    in an LRU bounded by PROJECTION_CACHE_MAX_BYTES. Entries are keyed by
+    the session's content version, so like the response cache they never
+    need invalidating. Embeddings are L2-normalized before fitting, so
+    euclidean distances between projected items approximate those between
+    the unit vectors, and linkage and neighbour searches can run on them
+    unchanged.
+    """
+    
+    def __init__(self):
+        self.max_bytes = settings.PROJECTION_CACHE_MAX_BYTES
+        self._entries: "OrderedDict[Tuple[str, int, int], Projection]" = OrderedDict()
+        self._size = 0
+    
+    @timed("projection", "randomized_svd")
+    def fit(self, vectors: np.ndarray, dimension: int, seed: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Project vectors onto their top principal components
+        
+        Args:
+            vectors: (n, d) embedding matrix
+            dimension: Number of components to keep
+            seed: Seed of the random range finder, fixed so results are repeatable
+        
+        Returns:
+            Tuple of ((n, dimension) projected vectors, explained variance
+            ratio of each component)
+        """
+        centered = np.asarray(vectors, dtype=np.float32)
+        centered = centered - centered.mean(axis=0)
+        dimension = min(dimension, *centered.shape)
+        total_variance = float(np.einsum("ij,ij->", centered, centered))
+        
+        # Range finder with a few power iterations, re-orthonormalized each
+        # time so the float32 products keep their small singular values
+        rng = np.random.default_rng(seed)
+        sketch_size = min(dimension + settings.PROJECTION_OVERSAMPLES, *centered.shape)
+        basis, _ = np.linalg.qr(centered @ rng.standard_normal((centered.shape[1], sketch_size), dtype=np.float32))
+        for _ in range(settings.PROJECTION_POWER_ITERATIONS):
+            basis, _ = np.linalg.qr(centered.T @ basis)
+            basis, _ = np.linalg.qr(centered @ basis)
+        
+        _, singular_values, components = np.linalg.svd(basis.T @ centered, full_matrices=False)
+        components = components[:dimension]
+        explained = singular_values[:dimension] ** 2 / total_variance if total_variance else np.zeros(dimension)
+        return centered @ components.T, explained.astype(np.float32)
+    
+    def _remember(self, key: Tuple[str, int, int], projection: Projection):
+        size = projection.vectors.nbytes
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._size -= self._entries.pop(key).vectors.nbytes
+        self._entries[key] = projection
+        self._size += size
+        while self._size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._size -= evicted.vectors.nbytes
+    
+    async def project_session(
+        self,
+        session_id: str,
+        embeddings: List[Dict[str, Any]],
+        dimension: int
+    ) -> Projection:
+        """
+        Projected vectors for a session, fitted once per content version
+        
+        Args:
+            session_id: Session the embeddings belong to
+            embeddings: List of embedding dictionaries with 'id', 'vector', 'payload'
+            dimension: Number of components to keep
+        
+        Returns:
+            Projection whose rows follow the embeddings' order
+        """
+        async with SessionLocal() as db:
+            version = await session_service.content_version(db, session_id)
+        key = (session_id, version, dimension)
+        ids = tuple(str(emb['id']) for emb in embeddings)
+        
+        projection = self._entries.get(key)
+        if projection is not None and projection.ids == ids:
+            self._entries.move_to_end(key)
+            return projection
+        
+        vectors = np.array([emb['vector'] for emb in embeddings], dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        vectors /= norms
+        projected, explained = await asyncio.to_thread(self.fit, vectors, dimension)
+        projection = Projection(ids, np.ascontiguousarray(projected), explained)
+        self._remember(key, projection)
+        
+        logger.info(
+            f"Projected {len(embeddings)} embeddings of session {session_id} to {projected.shape[1]} dimensions "
+            f"({float(explained.sum()):.1%} of variance)"
+        )
+        return projection
+    
+    @staticmethod
+    def dimension(requested: Optional[int]) -> int:
+        """
+        Projection dimension of a request, resolving the setting default
+        
+        Responses depend on the result, so routes put it in the cache key
+        rather than relying on the query string alone.
+        """
+        return settings.CLUSTERING_PROJECTION_DIM if requested is None else requested
+    
+    async def reduce(
+        self,
+        session_id: str,
+        embeddings: List[Dict[str, Any]],
+        requested: Optional[int]
+    ) -> Optional[Projection]:
+        """
+        Projection for an analysis request, if it asks for one
+        
+        Args:
+            session_id: Session the embeddings belong to
+            embeddings: Session embeddings
+            requested: Requested dimension, None for CLUSTERING_PROJECTION_DIM
+        
+        Returns:
+            Projection, or None when the raw vectors should be used because no
+            reduction was asked for or it would not reduce anything
+        """
+        dimension = self.dimension(requested)
+        if not dimension or not embeddings or dimension >= min(len(embeddings), len(embeddings[0]['vector'])):
+            return None
+        return await self.project_session(session_id, embeddings, dimension)
+    
+    @staticmethod
+    def describe(projection: Optional[Projection], embeddings: List[Dict[str, Any]]) -> Optional[ProjectionInfo]:
+        if projection is None:
+            return None
+        return ProjectionInfo(
+            dimension=projection.vectors.shape[1],
+            original_dimension=len(embeddings[0]['vector']),
+            explained_variance_ratio=float(projection.explained_variance_ratio.sum())
+        )
+
+# Singleton instance
+projection_service = ProjectionService()
@@ -1,43 +1,180 @@
 from qdrant_client import QdrantClient
 from qdrant_client.models import Distance, VectorParams, PointStruct, Filter, FieldCondition, MatchValue
 from qdrant_client.http import models
+import asyncio
 import logging
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 import uuid
 from ..core.config import settings
+from ..core.metrics import QDRANT_POINTS, QDRANT_SCROLL_PAGES, timed
 
 logger = logging.getLogger(__name__)
 
 class QdrantService:
     def __init__(self):
-        self.client = QdrantClient(
-            host=settings.QDRANT_HOST,
-            port=settings.QDRANT_PORT
-        )
-        self.collection_name = settings.QDRANT_COLLECTION_NAME
-        self._ensure_collection_exists()
+        if settings.QDRANT_LOCATION:
+            self.client = QdrantClient(location=settings.QDRANT_LOCATION)
+        else:
+            self.client = QdrantClient(
+                host=settings.QDRANT_HOST,
+                port=settings.QDRANT_PORT
+            )
+        # Reads and writes go through the alias, never a concrete collection
+        self.collection_name = settings.QDRANT_ALIAS_NAME
+    
+    async def ensure_collection(self):
+        """Create the collection if needed, off the event loop (called at startup)"""
+        await asyncio.to_thread(self._ensure_collection_exists)
+    
+    def close(self):
+        self.client.close()
     
     def _ensure_collection_exists(self):
-        """Create collection if it doesn't exist"""
+        """
+        Make sure the alias collection_name resolves to a collection
+        
+        New deployments get a versioned collection ({QDRANT_COLLECTION_NAME}_v1)
+        behind it. Deployments that predate the alias get it pointed at their
+        concrete QDRANT_COLLECTION_NAME collection, which stays in place, so
+        a later migration only ever switches the alias and can be rolled back.
+        """
         try:
-            collections = self.client.get_collections().collections
-            collection_names = [col.name for col in collections]
+            if self._resolve_alias() is not None:
+                logger.info(f"Collection alias {self.collection_name} already exists")
+                return
             
-            if self.collection_name not in collection_names:
-                self.client.create_collection(
-                    collection_name=self.collection_name,
-                    vectors_config=VectorParams(
-                        size=settings.EMBEDDING_DIMENSION,
-                        distance=Distance.COSINE
-                    )
+            collection_names = [col.name for col in self.client.get_collections().collections]
+            target = settings.QDRANT_COLLECTION_NAME
+            if target not in collection_names:
+                target = f"{settings.QDRANT_COLLECTION_NAME}_v1"
+                if target not in collection_names:
+                    self._create_collection(target)
+            self.client.update_collection_aliases(change_aliases_operations=[
+                models.CreateAliasOperation(
+                    create_alias=models.CreateAlias(collection_name=target, alias_name=self.collection_name)
                 )
-                logger.info(f"Created collection {self.collection_name}")
-            else:
-                logger.info(f"Collection {self.collection_name} already exists")
+            ])
+            logger.info(f"Created collection alias {self.collection_name} for {target}")
         except Exception as e:
             logger.error(f"Error ensuring collection exists: {e}")
             raise
     
+    def _create_collection(self, name: str, bulk_load: bool = False):
+        self.client.create_collection(
+            collection_name=name,
+            vectors_config=VectorParams(
+                size=settings.EMBEDDING_DIMENSION,
+                distance=Distance.COSINE
+            ),
+            # Building the HNSW graph once after a bulk load beats maintaining it per upsert
+            optimizers_config=models.OptimizersConfigDiff(indexing_threshold=0) if bulk_load else None
+        )
+    
+    def _resolve_alias(self) -> Optional[str]:
+        for alias in self.client.get_aliases().aliases:
+            if alias.alias_name == self.collection_name:
+                return alias.collection_name
+        return None
+    
+    async def current_collection(self) -> Optional[str]:
+        """
+        Name of the collection that reads and writes currently go to
+        
+        Returns:
+            The collection behind the alias, or None before ensure_collection
+            has created it
+        """
+        return self._resolve_alias()
+    
+    async def collection_exists(self, name: str) -> bool:
+        return name in {col.name for col in self.client.get_collections().collections}
+    
+    async def create_versioned_collection(self, name: str):
+        """
+        Create a collection for a re-embedding migration, tuned for bulk loading
+        
+        Indexing stays off until finish_bulk_load is called.
+        
+        Args:
+            name: Collection name
+        """
+        self._create_collection(name, bulk_load=True)
+        logger.info(f"Created collection {name} for bulk loading")
+    
+    async def finish_bulk_load(self, name: str):
+        """Re-enable indexing on a bulk-loaded collection so Qdrant builds its index"""
+        self.client.update_collection(
+            collection_name=name,
+            optimizers_config=models.OptimizersConfigDiff(indexing_threshold=settings.QDRANT_INDEXING_THRESHOLD)
+        )
+    
+    async def wait_until_indexed(self, name: str, poll_interval: float = 5.0):
+        """Wait for Qdrant's optimizers to finish building a collection's index"""
+        while self.client.get_collection(collection_name=name).status != models.CollectionStatus.GREEN:
+            await asyncio.sleep(poll_interval)
+    
+    async def count_points(self, collection_name: str) -> int:
+        return self.client.count(collection_name=collection_name, exact=True).count
+    
+    @timed("qdrant", "switch_alias")
+    async def switch_alias(self, target: str) -> Optional[str]:
+        """
+        Point collection_name at another collection
+        
+        Deleting and recreating the alias is a single atomic operation, so
+        readers never see a missing collection, and no collection is deleted.
+        
+        Args:
+            target: Collection to serve reads and writes from
+        
+        Returns:
+            The collection previously behind the alias, or None if there was
+            no alias yet
+        """
+        previous = self._resolve_alias()
+        operations = []
+        if previous is not None:
+            operations.append(models.DeleteAliasOperation(
+                delete_alias=models.DeleteAlias(alias_name=self.collection_name)
+            ))
+        operations.append(models.CreateAliasOperation(
+            create_alias=models.CreateAlias(collection_name=target, alias_name=self.collection_name)
+        ))
+        self.client.update_collection_aliases(change_aliases_operations=operations)
+        logger.info(f"Alias {self.collection_name} now points at {target} (was {previous})")
+        return previous
+    
+    @timed("qdrant", "scroll_stale")
+    async def scroll_stale_points(
+        self,
+        current_models: List[str],
+        limit: int,
+        offset: Optional[Any] = None
+    ) -> Tuple[List[str], Optional[Any]]:
+        """
+        Page through points not embedded by any of the current models
+        
+        Args:
+            current_models: Model names that count as up to date
+            limit: Page size
+            offset: Offset returned with the previous page
+        
+        Returns:
+            Tuple of (file ids, next offset or None on the last page)
+        """
+        points, next_offset = self.client.scroll(
+            collection_name=self.collection_name,
+            scroll_filter=Filter(must_not=[
+                FieldCondition(key="embedding_model", match=models.MatchAny(any=current_models))
+            ]),
+            limit=limit,
+            offset=offset,
+            with_payload=False
+        )
+        QDRANT_SCROLL_PAGES.inc()
+        return [str(point.id) for point in points], next_offset
+    
+    @timed("qdrant", "upsert")
     async def store_embedding(
         self,
         file_id: str,
@@ -66,12 +203,48 @@ class QdrantService:
                 collection_name=self.collection_name,
                 points=[point]
             )
+            QDRANT_POINTS.labels("upsert").inc()
             logger.info(f"Stored embedding for file {file_id}")
             return True
         except Exception as e:
             logger.error(f"Failed to store embedding: {e}")
             raise
     
+    @timed("qdrant", "upsert_batch")
+    async def store_embeddings(
+        self,
+        items: List[Tuple[str, List[float], Dict[str, Any]]],
+        collection_name: Optional[str] = None
+    ) -> bool:
+        """
+        Store a batch of embedding vectors in Qdrant with a single upsert
+        
+        Args:
+            items: Tuples of (file_id, embedding, metadata)
+            collection_name: Collection to write to instead of the live one
+        
+        Returns:
+            True if successful
+        """
+        if not items:
+            return True
+        
+        try:
+            self.client.upsert(
+                collection_name=collection_name or self.collection_name,
+                points=[
+                    PointStruct(id=file_id, vector=embedding, payload=metadata)
+                    for file_id, embedding, metadata in items
+                ]
+            )
+            QDRANT_POINTS.labels("upsert").inc(len(items))
+            logger.info(f"Stored {len(items)} embeddings")
+            return True
+        except Exception as e:
+            logger.error(f"Failed to store embeddings: {e}")
+            raise
+    
+    @timed("qdrant", "retrieve")
     async def get_embedding(self, file_id: str) -> Optional[Dict[str, Any]]:
         """
         Retrieve an embedding by file ID
@@ -85,7 +258,8 @@ class QdrantService:
         try:
             result = self.client.retrieve(
                 collection_name=self.collection_name,
-                ids=[file_id]
+                ids=[file_id],
+                with_vectors=True
             )
             
             if result:
@@ -100,6 +274,7 @@ class QdrantService:
             logger.error(f"Failed to retrieve embedding: {e}")
             return None
     
+    @timed("qdrant", "search")
     async def search_similar(
         self,
         query_vector: List[float],
@@ -151,6 +326,45 @@ class QdrantService:
             logger.error(f"Failed to search similar vectors: {e}")
             raise
     
+    @timed("qdrant", "search_batch")
+    async def search_neighbors(
+        self,
+        vectors: List[List[float]],
+        session_id: str,
+        limit: int
+    ) -> List[List[Tuple[Any, float]]]:
+        """
+        Nearest neighbours of many vectors within a session, in one round trip
+        
+        Args:
+            vectors: Query vectors
+            session_id: Session to search in
+            limit: Neighbours per query (a stored query vector finds itself)
+        
+        Returns:
+            (point id, similarity score) lists, best first, in query order
+        """
+        session_filter = Filter(
+            must=[
+                FieldCondition(
+                    key="session_id",
+                    match=MatchValue(value=session_id)
+                )
+            ]
+        )
+        # Synchronous client: keep the round trip off the event loop
+        results = await asyncio.to_thread(
+            self.client.search_batch,
+            collection_name=self.collection_name,
+            requests=[
+                models.SearchRequest(vector=vector, filter=session_filter, limit=limit, with_payload=False)
+                for vector in vectors
+            ]
+        )
+        QDRANT_POINTS.labels("search").inc(sum(len(hits) for hits in results))
+        return [[(hit.id, hit.score) for hit in hits] for hits in results]
+    
+    @timed("qdrant", "scroll_session")
     async def get_all_embeddings_for_session(
         self,
         session_id: str
@@ -179,15 +393,18 @@ class QdrantService:
             offset = None
             
             while True:
-                response = self.client.scroll(
-                    collection_name=self.collection_name,
-                    scroll_filter=scroll_filter,
-                    limit=100,
-                    offset=offset,
-                    with_vectors=True
-                )
+                with timed("qdrant", "scroll_page"):
+                    response = self.client.scroll(
+                        collection_name=self.collection_name,
+                        scroll_filter=scroll_filter,
+                        limit=100,
+                        offset=offset,
+                        with_vectors=True
+                    )
                 
                 points, next_offset = response
+                QDRANT_SCROLL_PAGES.inc()
+                QDRANT_POINTS.labels("scroll").inc(len(points))
                 
                 for point in points:
                     results.append({
@@ -206,6 +423,7 @@ class QdrantService:
             logger.error(f"Failed to retrieve embeddings for session: {e}")
             raise
     
+    @timed("qdrant", "delete")
     async def delete_embedding(self, file_id: str) -> bool:
         """
         Delete an embedding from Qdrant
@@ -229,6 +447,7 @@ class QdrantService:
             logger.error(f"Failed to delete embedding: {e}")
             return False
     
+    @timed("qdrant", "delete_session")
     async def delete_session_embeddings(self, session_id: str) -> bool:
         """
         Delete all embeddings for a session
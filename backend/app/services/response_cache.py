@@ -0,0 +1,133 @@
+from collections import OrderedDict
+import asyncio
+import gzip
+import hashlib
+import logging
+import os
+from typing import NamedTuple, Optional
+from ..core.config import settings
+from ..core.metrics import CACHE_REQUESTS
+
+logger = logging.getLogger(__name__)
+
+class CachedResponse(NamedTuple):
+    body: bytes
+    media_type: str
+
+class ResponseCache:
+    """
+    Two-tier cache of rendered analysis responses keyed by ETag
+    
+    The ETag already encodes the session's content version, so entries never
+    need invalidating; superseded versions simply age out of the LRU. The
+    optional disk tier keeps gzip-compressed bodies across restarts and
+    beyond the memory budget.
+    """
+    
+    def __init__(self):
+        self.max_bytes = settings.RESPONSE_CACHE_MAX_BYTES
+        self.disk_dir = settings.RESPONSE_CACHE_DIR
+        self.disk_max_bytes = settings.RESPONSE_CACHE_DISK_MAX_BYTES
+        self._entries: "OrderedDict[str, CachedResponse]" = OrderedDict()
+        self._size = 0
+    
+    @staticmethod
+    def make_etag(session_id: str, content_version: int, request_key: str) -> str:
+        digest = hashlib.sha256(f"{session_id}\0{content_version}\0{request_key}".encode()).hexdigest()
+        return f'"{digest[:32]}"'
+    
+    def _remember(self, etag: str, entry: CachedResponse):
+        if len(entry.body) > self.max_bytes:
+            return
+        if etag in self._entries:
+            self._size -= len(self._entries.pop(etag).body)
+        self._entries[etag] = entry
+        self._size += len(entry.body)
+        while self._size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._size -= len(evicted.body)
+    
+    async def get(self, etag: str) -> Optional[CachedResponse]:
+        """
+        Look up a response in memory, then on disk
+        
+        Args:
+            etag: ETag of the response
+        
+        Returns:
+            Cached response, or None on a miss
+        """
+        entry = self._entries.get(etag)
+        if entry is not None:
+            self._entries.move_to_end(etag)
+            CACHE_REQUESTS.labels("response", "memory_hit").inc()
+            return entry
+        
+        if self.disk_dir:
+            entry = await asyncio.to_thread(self._read_disk, etag)
+        if entry is not None:
+            self._remember(etag, entry)
+            CACHE_REQUESTS.labels("response", "disk_hit").inc()
+        else:
+            CACHE_REQUESTS.labels("response", "miss").inc()
+        return entry
+    
+    async def put(self, etag: str, entry: CachedResponse):
+        """
+        Store a rendered response in memory and, if enabled, on disk
+        
+        Args:
+            etag: ETag of the response
+            entry: Response body and media type
+        """
+        self._remember(etag, entry)
+        if self.disk_dir:
+            try:
+                await asyncio.to_thread(self._write_disk, etag, entry)
+            except OSError as e:
+                logger.warning(f"Failed to write response cache entry to disk: {e}")
+    
+    def _disk_path(self, etag: str) -> str:
+        return os.path.join(self.disk_dir, etag.strip('"') + ".gz")
+    
+    def _read_disk(self, etag: str) -> Optional[CachedResponse]:
+        path = self._disk_path(etag)
+        try:
+            with gzip.open(path, "rb") as f:
+                raw = f.read()
+            # Refresh the mtime so pruning drops the least recently used entries
+            os.utime(path)
+        except (OSError, EOFError):
+            return None
+        media_type, _, body = raw.partition(b"\n")
+        return CachedResponse(body, media_type.decode())
+    
+    def _write_disk(self, etag: str, entry: CachedResponse):
+        os.makedirs(self.disk_dir, exist_ok=True)
+        path = self._disk_path(etag)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with gzip.open(temp_path, "wb", compresslevel=6) as f:
+            f.write(entry.media_type.encode() + b"\n")
+            f.write(entry.body)
+        os.replace(temp_path, path)
+        self._prune_disk()
+    
+    def _prune_disk(self):
+        files = []
+        for item in os.scandir(self.disk_dir):
+            if item.name.endswith(".gz"):
+                stat = item.stat()
+                files.append((stat.st_mtime, stat.st_size, item.path))
+        
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.disk_max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+# Singleton instance
+response_cache = ResponseCache()
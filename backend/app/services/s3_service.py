@@ -1,24 +1,173 @@
+import asyncio
+import functools
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 import boto3
+from boto3.s3.transfer import TransferConfig
 from botocore.client import Config
 from botocore.exceptions import ClientError
 import logging
-from typing import BinaryIO, Optional
+from typing import Any, AsyncIterator, Awaitable, BinaryIO, Callable, Dict, Iterable, List, Optional, Set, Tuple, TypeVar, Union
 from ..core.config import settings
+from ..core.metrics import CACHE_REQUESTS, S3_BYTES, timed
 
 logger = logging.getLogger(__name__)
 
+T = TypeVar("T")
+UploadItem = Tuple[str, Union[bytes, BinaryIO], str]
+
+class PresignedUrlCache:
+    """
+    Bounded LRU cache of presigned GET URLs keyed by (object_key, expiry bucket)
+    
+    Requested expirations are rounded up to a multiple of expiration_bucket, so
+    callers asking for slightly different lifetimes share one signed URL.
+    Entries are served until refresh_margin seconds before the URL expires, so
+    clients never receive a URL that is about to stop working. A per-object
+    index of buckets makes invalidation a direct lookup.
+    """
+    
+    def __init__(self, max_entries: int, refresh_margin: int, expiration_bucket: int):
+        self.max_entries = max_entries
+        self.refresh_margin = refresh_margin
+        self.expiration_bucket = max(1, expiration_bucket)
+        self._entries: "OrderedDict[Tuple[str, int], Tuple[str, float]]" = OrderedDict()
+        self._buckets: Dict[str, Set[int]] = {}
+    
+    def bucket(self, expiration: int) -> int:
+        """Expiration a request for `expiration` seconds is signed and cached with"""
+        return -(-expiration // self.expiration_bucket) * self.expiration_bucket
+    
+    def _discard(self, key: Tuple[str, int]):
+        del self._entries[key]
+        buckets = self._buckets[key[0]]
+        buckets.discard(key[1])
+        if not buckets:
+            del self._buckets[key[0]]
+    
+    def get(self, object_key: str, expiration: int) -> Optional[str]:
+        key = (object_key, self.bucket(expiration))
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        url, expires_at = entry
+        if time.time() >= expires_at - min(self.refresh_margin, key[1] // 2):
+            self._discard(key)
+            return None
+        self._entries.move_to_end(key)
+        return url
+    
+    def put(self, object_key: str, expiration: int, url: str, signed_at: float):
+        """Cache a URL that was signed with bucket(expiration) seconds of validity"""
+        key = (object_key, self.bucket(expiration))
+        self._entries[key] = (url, signed_at + key[1])
+        self._entries.move_to_end(key)
+        self._buckets.setdefault(object_key, set()).add(key[1])
+        while len(self._entries) > self.max_entries:
+            self._discard(next(iter(self._entries)))
+    
+    def invalidate(self, object_key: str):
+        for bucket in self._buckets.pop(object_key, ()):
+            del self._entries[(object_key, bucket)]
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+
 class S3Service:
     def __init__(self):
+        scheme = "https" if settings.MINIO_SECURE else "http"
         self.client = boto3.client(
             's3',
-            endpoint_url=f"http://{settings.MINIO_ENDPOINT}",
+            endpoint_url=f"{scheme}://{settings.MINIO_ENDPOINT}",
             aws_access_key_id=settings.MINIO_ACCESS_KEY,
             aws_secret_access_key=settings.MINIO_SECRET_KEY,
-            config=Config(signature_version='s3v4'),
+            config=Config(
+                signature_version='s3v4',
+                max_pool_connections=settings.S3_MAX_POOL_CONNECTIONS
+            ),
             region_name='us-east-1'
         )
         self.bucket_name = settings.MINIO_BUCKET_NAME
-        self._ensure_bucket_exists()
+        # boto3 clients are thread-safe; blocking calls run on a dedicated pool
+        # sized to the connection pool so every thread can hold a connection
+        self._executor = ThreadPoolExecutor(
+            max_workers=settings.S3_MAX_POOL_CONNECTIONS,
+            thread_name_prefix="s3"
+        )
+        # One part in flight per streamed upload keeps memory at one chunk per stream
+        self._stream_transfer = TransferConfig(
+            multipart_threshold=settings.S3_MULTIPART_CHUNKSIZE,
+            multipart_chunksize=settings.S3_MULTIPART_CHUNKSIZE,
+            max_concurrency=1,
+            use_threads=False
+        )
+        self.url_cache = PresignedUrlCache(
+            max_entries=settings.S3_PRESIGN_CACHE_SIZE,
+            refresh_margin=settings.S3_PRESIGN_REFRESH_MARGIN,
+            expiration_bucket=settings.S3_PRESIGN_EXPIRATION_BUCKET
+        )
+    
+    async def ensure_bucket(self):
+        """Create the bucket if needed, off the event loop (called at startup)"""
+        await self._run(self._ensure_bucket_exists)
+    
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+    
+    async def _run(self, func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """Run a blocking boto3 call on the S3 thread pool, off the event loop"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor,
+            functools.partial(func, *args, **kwargs)
+        )
+    
+    async def _as_completed_bounded(
+        self,
+        items: Iterable[Any],
+        worker: Callable[[Any], Awaitable[T]],
+        max_concurrency: Optional[int],
+        return_exceptions: bool
+    ) -> AsyncIterator[Tuple[Any, Union[T, BaseException]]]:
+        """
+        Run worker over items with at most max_concurrency calls in flight,
+        yielding (item, result) pairs in completion order
+        
+        Items are pulled lazily, so arbitrarily long iterables never hold more
+        than max_concurrency pending tasks.
+        """
+        limit = max(1, max_concurrency or settings.S3_MAX_CONCURRENCY)
+        iterator = iter(items)
+        pending = {}
+        
+        def start_next() -> bool:
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return False
+            pending[asyncio.ensure_future(worker(item))] = item
+            return True
+        
+        try:
+            while len(pending) < limit and start_next():
+                pass
+            
+            while pending:
+                done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    item = pending.pop(task)
+                    start_next()
+                    error = task.exception()
+                    if error is not None:
+                        if not return_exceptions:
+                            raise error
+                        yield item, error
+                    else:
+                        yield item, task.result()
+        finally:
+            for task in pending:
+                task.cancel()
     
     def _ensure_bucket_exists(self):
         """Create bucket if it doesn't exist"""
@@ -38,6 +187,7 @@ class S3Service:
                 logger.error(f"Error checking bucket: {e}")
                 raise
     
+    @timed("s3", "put_object")
     async def upload_file(
         self,
         file_data: BinaryIO,
@@ -56,18 +206,58 @@ class S3Service:
             S3 path (bucket/key)
         """
         try:
-            self.client.put_object(
+            await self._run(
+                self.client.put_object,
                 Bucket=self.bucket_name,
                 Key=object_key,
                 Body=file_data,
                 ContentType=content_type
             )
+            if isinstance(file_data, (bytes, bytearray)):
+                S3_BYTES.labels("upload").inc(len(file_data))
             logger.info(f"Uploaded file to s3://{self.bucket_name}/{object_key}")
             return f"{self.bucket_name}/{object_key}"
         except ClientError as e:
             logger.error(f"Failed to upload file: {e}")
             raise
     
+    @timed("s3", "upload_stream")
+    async def upload_stream(
+        self,
+        stream: BinaryIO,
+        object_key: str,
+        content_type: str
+    ) -> str:
+        """
+        Upload a non-seekable stream to S3 without buffering it whole
+        
+        Objects larger than S3_MULTIPART_CHUNKSIZE go up as a multipart upload,
+        one part at a time.
+        
+        Args:
+            stream: Readable binary stream
+            object_key: S3 object key (path)
+            content_type: MIME type of the file
+            
+        Returns:
+            S3 path (bucket/key)
+        """
+        try:
+            await self._run(
+                self.client.upload_fileobj,
+                stream,
+                self.bucket_name,
+                object_key,
+                ExtraArgs={'ContentType': content_type},
+                Config=self._stream_transfer
+            )
+            logger.info(f"Uploaded stream to s3://{self.bucket_name}/{object_key}")
+            return f"{self.bucket_name}/{object_key}"
+        except ClientError as e:
+            logger.error(f"Failed to upload stream: {e}")
+            raise
+    
+    @timed("s3", "get_object")
     async def download_file(self, object_key: str) -> bytes:
         """
         Download a file from S3
@@ -79,15 +269,69 @@ class S3Service:
             File binary data
         """
         try:
-            response = self.client.get_object(
-                Bucket=self.bucket_name,
-                Key=object_key
-            )
-            return response['Body'].read()
+            return await self._run(self._get_object_bytes, object_key)
         except ClientError as e:
             logger.error(f"Failed to download file: {e}")
             raise
     
+    def _get_object_bytes(self, object_key: str) -> bytes:
+        """Fetch an object and drain its body (runs on the S3 thread pool)"""
+        response = self.client.get_object(
+            Bucket=self.bucket_name,
+            Key=object_key
+        )
+        data = response['Body'].read()
+        S3_BYTES.labels("download").inc(len(data))
+        return data
+    
+    async def download_many(
+        self,
+        object_keys: Iterable[str],
+        max_concurrency: Optional[int] = None,
+        return_exceptions: bool = False
+    ) -> AsyncIterator[Tuple[str, Union[bytes, BaseException]]]:
+        """
+        Download many objects concurrently, yielding results as they complete
+        
+        Args:
+            object_keys: S3 object keys to fetch
+            max_concurrency: Maximum in-flight downloads (default S3_MAX_CONCURRENCY)
+            return_exceptions: Yield (key, exception) for failed objects instead of raising
+            
+        Yields:
+            Tuples of (object_key, file binary data) in completion order
+        """
+        async for object_key, result in self._as_completed_bounded(
+            object_keys, self.download_file, max_concurrency, return_exceptions
+        ):
+            yield object_key, result
+    
+    async def upload_many(
+        self,
+        items: Iterable[UploadItem],
+        max_concurrency: Optional[int] = None,
+        return_exceptions: bool = False
+    ) -> AsyncIterator[Tuple[str, Union[str, BaseException]]]:
+        """
+        Upload many objects concurrently, yielding results as they complete
+        
+        Args:
+            items: Tuples of (object_key, file binary data, content_type)
+            max_concurrency: Maximum in-flight uploads (default S3_MAX_CONCURRENCY)
+            return_exceptions: Yield (key, exception) for failed objects instead of raising
+            
+        Yields:
+            Tuples of (object_key, S3 path) in completion order
+        """
+        async def upload(item: UploadItem) -> str:
+            object_key, file_data, content_type = item
+            return await self.upload_file(file_data, object_key, content_type)
+        
+        async for item, result in self._as_completed_bounded(
+            items, upload, max_concurrency, return_exceptions
+        ):
+            yield item[0], result
+    
     async def delete_file(self, object_key: str) -> bool:
         """
         Delete a file from S3
@@ -99,29 +343,84 @@ class S3Service:
             True if successful
         """
         try:
-            self.client.delete_object(
+            await self._run(
+                self.client.delete_object,
                 Bucket=self.bucket_name,
                 Key=object_key
             )
+            self.url_cache.invalidate(object_key)
             logger.info(f"Deleted file s3://{self.bucket_name}/{object_key}")
             return True
         except ClientError as e:
             logger.error(f"Failed to delete file: {e}")
             return False
     
-    async def get_file_url(self, object_key: str, expiration: int = 3600) -> str:
+    async def get_file_url(self, object_key: str, expiration: Optional[int] = None) -> str:
         """
         Generate a presigned URL for file access
         
         Args:
             object_key: S3 object key (path)
-            expiration: URL expiration time in seconds (default 1 hour)
+            expiration: URL expiration time in seconds (default S3_PRESIGN_EXPIRATION)
             
         Returns:
             Presigned URL
         """
-        try:
-            url = self.client.generate_presigned_url(
+        urls = await self.get_file_urls([object_key], expiration)
+        return urls[object_key]
+    
+    async def get_file_urls(
+        self,
+        object_keys: Iterable[str],
+        expiration: Optional[int] = None
+    ) -> Dict[str, str]:
+        """
+        Generate presigned URLs for a batch of objects, reusing cached URLs
+        
+        Signing is local HMAC work, so all cache misses are signed together in a
+        single trip to the S3 thread pool. The expiration is rounded up to the
+        cache's expiry bucket, so URLs may live up to one bucket longer.
+        
+        Args:
+            object_keys: S3 object keys (paths)
+            expiration: URL expiration time in seconds (default S3_PRESIGN_EXPIRATION)
+            
+        Returns:
+            Mapping of object key to presigned URL
+        """
+        expiration = self.url_cache.bucket(expiration or settings.S3_PRESIGN_EXPIRATION)
+        urls: Dict[str, str] = {}
+        missing: List[str] = []
+        for object_key in object_keys:
+            if object_key in urls:
+                continue
+            url = self.url_cache.get(object_key, expiration)
+            if url is None:
+                missing.append(object_key)
+                urls[object_key] = ""
+            else:
+                urls[object_key] = url
+        
+        CACHE_REQUESTS.labels("presigned_url", "hit").inc(len(urls) - len(missing))
+        if missing:
+            CACHE_REQUESTS.labels("presigned_url", "miss").inc(len(missing))
+            try:
+                signed_at = time.time()
+                with timed("s3", "presign_batch"):
+                    signed = await self._run(self._sign_urls, missing, expiration)
+            except ClientError as e:
+                logger.error(f"Failed to generate presigned URL: {e}")
+                raise
+            for object_key, url in zip(missing, signed):
+                self.url_cache.put(object_key, expiration, url, signed_at)
+                urls[object_key] = url
+        
+        return urls
+    
+    def _sign_urls(self, object_keys: List[str], expiration: int) -> List[str]:
+        """Presign GET URLs for object_keys (runs on the S3 thread pool)"""
+        return [
+            self.client.generate_presigned_url(
                 'get_object',
                 Params={
                     'Bucket': self.bucket_name,
@@ -129,10 +428,8 @@ class S3Service:
                 },
                 ExpiresIn=expiration
             )
-            return url
-        except ClientError as e:
-            logger.error(f"Failed to generate presigned URL: {e}")
-            raise
+            for object_key in object_keys
+        ]
 
 # Singleton instance
 s3_service = S3Service()
@@ -0,0 +1,216 @@
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from collections import OrderedDict
+from datetime import datetime, timedelta
+import asyncio
+import logging
+from typing import Dict, Iterable, Optional, Tuple
+from ..core.config import settings
+from ..core.metrics import CACHE_REQUESTS
+from ..db.database import SessionLocal, autocommit_engine, insert
+from ..models.session import Session as SessionModel
+from ..schemas.session import SessionResponse
+
+logger = logging.getLogger(__name__)
+
+class SessionService:
+    def __init__(self):
+        self.flush_interval = settings.SESSION_TOUCH_FLUSH_INTERVAL
+        self.cache_size = settings.SESSION_CACHE_SIZE
+        # session_id -> (created_at, last_active as persisted in Postgres, when that was read)
+        self._known: "OrderedDict[str, Tuple[datetime, datetime, datetime]]" = OrderedDict()
+        # session_id -> newest last_active not yet written
+        self._pending: Dict[str, datetime] = {}
+        self._flusher: Optional[asyncio.Task] = None
+    
+    def _remember(self, session_id: str, created_at: datetime, last_active: datetime):
+        self._known[session_id] = (created_at, last_active, datetime.utcnow())
+        self._known.move_to_end(session_id)
+        while len(self._known) > self.cache_size:
+            # Any pending touch for the evicted session is still flushed
+            self._known.popitem(last=False)
+    
+    async def touch(self, session_id: str) -> SessionResponse:
+        """
+        Create a session or mark it active
+        
+        Sessions this worker has already seen are touched in memory only and
+        written back by the periodic flush, so a page load costs no database
+        round trip. Unknown sessions take a single INSERT ... ON CONFLICT DO
+        UPDATE ... RETURNING statement in autocommit mode.
+        
+        Args:
+            session_id: Session identifier
+        
+        Returns:
+            Session with its current last_active
+        """
+        now = datetime.utcnow()
+        known = self._known.get(session_id)
+        if known is not None:
+            created_at, persisted, _ = known
+            self._known.move_to_end(session_id)
+            if now - persisted < timedelta(seconds=self.flush_interval):
+                CACHE_REQUESTS.labels("session", "hit").inc()
+                self._pending[session_id] = now
+                return SessionResponse(session_id=session_id, created_at=created_at, last_active=now)
+        
+        CACHE_REQUESTS.labels("session", "miss").inc()
+        stmt = insert(SessionModel).values(session_id=session_id, created_at=now, last_active=now)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[SessionModel.session_id],
+            set_={"last_active": stmt.excluded.last_active}
+        ).returning(SessionModel.session_id, SessionModel.created_at, SessionModel.last_active)
+        
+        async with autocommit_engine.connect() as conn:
+            row = (await conn.execute(stmt)).one()
+        
+        self._pending.pop(session_id, None)
+        self._remember(row.session_id, row.created_at, row.last_active)
+        return SessionResponse(session_id=row.session_id, created_at=row.created_at, last_active=row.last_active)
+    
+    async def get(self, db: AsyncSession, session_id: str) -> Optional[SessionResponse]:
+        """
+        Look up a session, overlaying any last_active touch not yet flushed
+        
+        Other API processes touch sessions too, so a cached entry is only
+        served for SESSION_TOUCH_FLUSH_INTERVAL after it was read; after that
+        the row is read again, which bounds how stale last_active can be.
+        
+        Args:
+            db: Database session
+            session_id: Session identifier
+        
+        Returns:
+            Session, or None if it does not exist
+        """
+        known = self._known.get(session_id)
+        if known is not None:
+            created_at, persisted, cached_at = known
+            if datetime.utcnow() - cached_at < timedelta(seconds=self.flush_interval):
+                last_active = max(persisted, self._pending.get(session_id, persisted))
+                return SessionResponse(session_id=session_id, created_at=created_at, last_active=last_active)
+        
+        session = await db.get(SessionModel, session_id)
+        if session is None:
+            return None
+        self._remember(session.session_id, session.created_at, session.last_active)
+        last_active = max(session.last_active, self._pending.get(session_id, session.last_active))
+        return SessionResponse(session_id=session.session_id, created_at=session.created_at, last_active=last_active)
+    
+    async def content_version(self, db: AsyncSession, session_id: str) -> int:
+        """
+        Current content version of a session (0 if it has no row yet)
+        
+        Always read from Postgres: workers in other processes bump it.
+        
+        Args:
+            db: Database session
+            session_id: Session identifier
+        
+        Returns:
+            Content version
+        """
+        version = await db.scalar(
+            select(SessionModel.content_version).where(SessionModel.session_id == session_id)
+        )
+        return version or 0
+    
+    async def bump_content_version(self, db: AsyncSession, session_ids: Iterable[str]):
+        """
+        Increment the content version of sessions in the caller's transaction
+        
+        Sessions without a row yet get one, so a version is never reused.
+        
+        Args:
+            db: Database session (committed by the caller)
+            session_ids: Sessions whose embeddings changed
+        """
+        now = datetime.utcnow()
+        # Sorted so concurrent bumps lock rows in the same order
+        rows = [
+            {"session_id": sid, "created_at": now, "last_active": now, "content_version": 1}
+            for sid in sorted(set(session_ids))
+        ]
+        if not rows:
+            return
+        
+        stmt = insert(SessionModel).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[SessionModel.session_id],
+            set_={"content_version": SessionModel.content_version + 1}
+        )
+        await db.execute(stmt)
+    
+    async def bump_all_content_versions(self, db: AsyncSession):
+        """
+        Increment every session's content version in the caller's transaction
+        
+        Used when all vectors change at once (an embedding model migration),
+        so no cached analysis response outlives the switch.
+        
+        Args:
+            db: Database session (committed by the caller)
+        """
+        await db.execute(update(SessionModel).values(content_version=SessionModel.content_version + 1))
+    
+    async def flush(self) -> int:
+        """
+        Write all coalesced last_active touches in one bulk UPDATE
+        
+        Returns:
+            Number of sessions updated
+        """
+        if not self._pending:
+            return 0
+        
+        pending, self._pending = self._pending, {}
+        try:
+            async with SessionLocal() as db:
+                await db.execute(
+                    update(SessionModel),
+                    [{"session_id": sid, "last_active": ts} for sid, ts in pending.items()]
+                )
+                await db.commit()
+        except Exception as e:
+            logger.error(f"Failed to flush session activity: {e}")
+            # Put the touches back unless a newer one arrived meanwhile
+            for sid, ts in pending.items():
+                if ts > self._pending.get(sid, datetime.min):
+                    self._pending[sid] = ts
+            raise
+        
+        for sid, ts in pending.items():
+            known = self._known.get(sid)
+            if known is not None:
+                self._known[sid] = (known[0], max(known[1], ts), known[2])
+        
+        logger.info(f"Flushed last_active for {len(pending)} sessions")
+        return len(pending)
+    
+    async def _flush_periodically(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception:
+                pass
+    
+    def start(self):
+        """Start the background flush loop"""
+        if self._flusher is None:
+            self._flusher = asyncio.create_task(self._flush_periodically())
+    
+    async def stop(self):
+        """Stop the flush loop and write any remaining touches"""
+        if self._flusher is not None:
+            self._flusher.cancel()
+            try:
+                await self._flusher
+            except asyncio.CancelledError:
+                pass
+            self._flusher = None
+        await self.flush()
+
+# Singleton instance
+session_service = SessionService()
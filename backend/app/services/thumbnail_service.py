@@ -0,0 +1,94 @@
+from PIL import Image
+import asyncio
+import io
+import logging
+import posixpath
+from typing import Dict, List
+from ..core.config import settings
+from ..core.metrics import timed
+from .s3_service import s3_service
+
+logger = logging.getLogger(__name__)
+
+_FORMATS = {
+    "WEBP": ("webp", "image/webp"),
+    "JPEG": ("jpg", "image/jpeg"),
+}
+
+class ThumbnailService:
+    def __init__(self):
+        self.format = settings.THUMBNAIL_FORMAT.upper()
+        if self.format not in _FORMATS:
+            raise ValueError(f"Unsupported thumbnail format: {settings.THUMBNAIL_FORMAT}")
+        self.extension, self.content_type = _FORMATS[self.format]
+        self.sizes = sorted(set(settings.THUMBNAIL_SIZES), reverse=True)
+        self.quality = settings.THUMBNAIL_QUALITY
+    
+    def thumbnail_key(self, s3_key: str, size: int) -> str:
+        """
+        Derive the S3 key of a thumbnail stored next to the original object
+        
+        Args:
+            s3_key: Original object key ({session_id}/{file_id}/{filename})
+            size: Longest edge of the thumbnail in pixels
+        
+        Returns:
+            Thumbnail object key ({session_id}/{file_id}/thumbnails/{size}.{ext})
+        """
+        return posixpath.join(posixpath.dirname(s3_key), "thumbnails", f"{size}.{self.extension}")
+    
+    @timed("thumbnail", "render")
+    def render_thumbnails(self, image: Image.Image) -> Dict[int, bytes]:
+        """
+        Encode resized copies of a decoded image at every configured size
+        
+        Sizes are rendered largest first, each one downscaled from the previous
+        derivative rather than from the full-resolution original.
+        
+        Args:
+            image: Decoded RGB image
+        
+        Returns:
+            Mapping of size to encoded thumbnail bytes
+        """
+        thumbnails = {}
+        current = image
+        for size in self.sizes:
+            resized = current.copy()
+            resized.thumbnail((size, size), Image.LANCZOS)
+            
+            buffer = io.BytesIO()
+            resized.save(buffer, format=self.format, quality=self.quality)
+            thumbnails[size] = buffer.getvalue()
+            current = resized
+        return thumbnails
+    
+    async def store_thumbnails(self, s3_key: str, image: Image.Image) -> List[int]:
+        """
+        Render and upload thumbnails for an ingested image
+        
+        Args:
+            s3_key: Object key of the original image
+            image: The image already decoded for embedding
+        
+        Returns:
+            Sizes that were stored
+        """
+        try:
+            thumbnails = await asyncio.to_thread(self.render_thumbnails, image)
+            
+            stored = []
+            async for object_key, _ in s3_service.upload_many(
+                (self.thumbnail_key(s3_key, size), data, self.content_type)
+                for size, data in thumbnails.items()
+            ):
+                stored.append(object_key)
+            
+            logger.info(f"Stored {len(stored)} thumbnails for {s3_key}")
+            return sorted(thumbnails)
+        except Exception as e:
+            logger.error(f"Failed to store thumbnails: {e}")
+            raise
+
+# Singleton instance
+thumbnail_service = ThumbnailService()
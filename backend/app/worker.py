@@ -0,0 +1,144 @@
+"""
+Embedding worker
+
+Claims embedding jobs in batches from the embedding_jobs table, downloads the
+files concurrently from S3, runs them through the embedding models and records
+the outcome in bulk. Scale by adding processes or replicas:
+
+    python -m app.worker --processes 4
+"""
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import os
+import shutil
+import signal
+import socket
+import tempfile
+from typing import Dict, List, Optional, Tuple
+from prometheus_client import CollectorRegistry, multiprocess, start_http_server
+from .core.config import settings
+from .models.file import File
+from .services.embedding_service import embedding_service
+from .services.ingestion_service import ingestion_service
+from .services.job_queue import job_queue
+from .services.s3_service import s3_service
+
+logger = logging.getLogger(__name__)
+
+class EmbeddingWorker:
+    def __init__(
+        self,
+        worker_id: Optional[str] = None,
+        batch_size: Optional[int] = None,
+        poll_interval: Optional[float] = None
+    ):
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        self.batch_size = batch_size or settings.EMBEDDING_BATCH_SIZE
+        self.poll_interval = poll_interval or settings.EMBEDDING_WORKER_POLL_INTERVAL
+    
+    async def run_once(self) -> int:
+        """
+        Claim and process a single batch of jobs
+        
+        Returns:
+            Number of jobs claimed
+        """
+        files = await job_queue.claim(self.worker_id, self.batch_size)
+        if not files:
+            return 0
+        
+        by_key = {f.s3_key: f for f in files}
+        downloads: List[Tuple[File, bytes]] = []
+        errors: Dict[str, str] = {}
+        async for object_key, result in s3_service.download_many(by_key, return_exceptions=True):
+            if isinstance(result, BaseException):
+                errors[by_key[object_key].id] = f"Download failed: {result}"
+            else:
+                downloads.append((by_key[object_key], result))
+        
+        succeeded, failed = await ingestion_service.process_batch(downloads)
+        errors.update(failed)
+        
+        await job_queue.complete(self.worker_id, succeeded)
+        await job_queue.fail(self.worker_id, errors)
+        return len(files)
+    
+    async def run(self, stop: asyncio.Event):
+        """Process batches until stop is set, sleeping while the queue is empty"""
+        await asyncio.to_thread(embedding_service.load_models)
+        logger.info(f"Embedding worker {self.worker_id} started (batch size {self.batch_size})")
+        while not stop.is_set():
+            try:
+                claimed = await self.run_once()
+            except Exception as e:
+                # Claimed jobs are retried once their visibility timeout lapses
+                logger.error(f"Embedding worker batch failed: {e}")
+                claimed = 0
+            
+            if claimed == 0:
+                try:
+                    await asyncio.wait_for(stop.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+        logger.info(f"Embedding worker {self.worker_id} stopped")
+
+async def _serve():
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    await EmbeddingWorker().run(stop)
+
+def _run_process(serve_metrics: bool = True):
+    logging.basicConfig(level=logging.INFO)
+    if serve_metrics and settings.WORKER_METRICS_PORT:
+        start_http_server(settings.WORKER_METRICS_PORT)
+    asyncio.run(_serve())
+
+def main():
+    parser = argparse.ArgumentParser(description="Run embedding worker processes")
+    parser.add_argument(
+        "--processes",
+        type=int,
+        default=settings.EMBEDDING_WORKER_PROCESSES,
+        help="Number of worker processes (each loads its own models unless INFERENCE_SOCKET is set)"
+    )
+    args = parser.parse_args()
+    
+    if args.processes <= 1:
+        _run_process()
+        return
+    
+    # Worker processes write their samples to a shared directory and this
+    # process serves them all on one port. Spawned children import
+    # prometheus_client afresh, so they pick the directory up from the environment.
+    metrics_dir = tempfile.mkdtemp(prefix="worker-metrics-")
+    os.environ["PROMETHEUS_MULTIPROC_DIR"] = metrics_dir
+    if settings.WORKER_METRICS_PORT:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry, path=metrics_dir)
+        start_http_server(settings.WORKER_METRICS_PORT, registry=registry)
+    
+    context = multiprocessing.get_context("spawn")
+    processes = [
+        context.Process(target=_run_process, args=(False,), daemon=False)
+        for _ in range(args.processes)
+    ]
+    for process in processes:
+        process.start()
+    
+    def forward(signum, frame):
+        for process in processes:
+            if process.is_alive():
+                os.kill(process.pid, signum)
+    
+    signal.signal(signal.SIGINT, forward)
+    signal.signal(signal.SIGTERM, forward)
+    for process in processes:
+        process.join()
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
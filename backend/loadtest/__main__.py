@@ -0,0 +1,513 @@
+"""
+End-to-end load test against local stand-ins
+
+Boots the API under uvicorn in a subprocess, backed by:
+  - SQLite (or --database-url for a local Postgres)
+  - Qdrant's in-memory mode
+  - moto's S3 server, run in this process
+  - the stub embedding backend (--real-models loads the configured models)
+with the embedding worker embedded in the API process. It then drives
+concurrent sessions through upload -> embed -> list -> cluster -> anomalies ->
+search, and reports throughput, per-endpoint latency percentiles and the
+server's CPU and memory use.
+
+Everything runs offline on one machine:
+
+    cd backend
+    pip install -r requirements.txt -r loadtest/requirements.txt
+    python -m loadtest --sessions 8 --concurrency 4 --files 60 --output report.json
+
+The exit status is 1 when a --max-* gate is exceeded, so a release pipeline
+can run it as a check.
+"""
+import argparse
+import asyncio
+import io
+import json
+import logging
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+import zipfile
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+import numpy as np
+from PIL import Image, ImageDraw
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+WORDS = (
+    "invoice shipment pallet order receipt warehouse quantity supplier delivery "
+    "platinum sequence sample batch label inventory audit stock return carrier "
+    "manifest customer account region quarter forecast report summary total"
+).split()
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def percentile(values: List[float], q: float) -> float:
+    return float(np.percentile(values, q)) if values else 0.0
+
+# ---------------------------------------------------------------------------
+# Synthetic workload
+# ---------------------------------------------------------------------------
+
+def make_image(rng: random.Random) -> Tuple[str, bytes, str]:
+    """A photo-sized PNG or JPEG with a few shapes, so decode and resize do real work"""
+    width, height = rng.choice([(320, 240), (800, 600), (1280, 960), (2048, 1536)])
+    image = Image.new("RGB", (width, height), tuple(rng.randrange(256) for _ in range(3)))
+    draw = ImageDraw.Draw(image)
+    for _ in range(rng.randint(3, 12)):
+        x0, y0 = rng.randrange(width), rng.randrange(height)
+        box = (x0, y0, x0 + rng.randint(10, width // 2), y0 + rng.randint(10, height // 2))
+        draw.rectangle(box, fill=tuple(rng.randrange(256) for _ in range(3)))
+    
+    buffer = io.BytesIO()
+    if rng.random() < 0.5:
+        image.save(buffer, format="JPEG", quality=85)
+        return f"{uuid.uuid4().hex[:12]}.jpg", buffer.getvalue(), "image/jpeg"
+    image.save(buffer, format="PNG")
+    return f"{uuid.uuid4().hex[:12]}.png", buffer.getvalue(), "image/png"
+
+def make_text(rng: random.Random) -> Tuple[str, bytes, str]:
+    """Plain text from a few hundred bytes to ~20 KB"""
+    lines = [" ".join(rng.choices(WORDS, k=rng.randint(5, 15))) for _ in range(rng.randint(5, 250))]
+    return f"{uuid.uuid4().hex[:12]}.txt", "\n".join(lines).encode(), "text/plain"
+
+def make_files(rng: random.Random, count: int, image_ratio: float) -> List[Tuple[str, bytes, str]]:
+    return [make_image(rng) if rng.random() < image_ratio else make_text(rng) for _ in range(count)]
+
+def make_archive(files: List[Tuple[str, bytes, str]]) -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_STORED) as archive:
+        for filename, data, _ in files:
+            archive.writestr(filename, data)
+    return buffer.getvalue()
+
+# ---------------------------------------------------------------------------
+# Measurement
+# ---------------------------------------------------------------------------
+
+class Recorder:
+    """Latency and error counts per endpoint template"""
+    
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.error_samples: List[str] = []
+        self.timings: Dict[str, List[float]] = defaultdict(list)
+    
+    async def request(
+        self,
+        client: httpx.AsyncClient,
+        label: str,
+        method: str,
+        url: str,
+        expect: Tuple[int, ...] = (200,),
+        **kwargs
+    ) -> Optional[httpx.Response]:
+        start = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+        except httpx.HTTPError as e:
+            self._error(label, f"{label}: {type(e).__name__} {e}")
+            return None
+        self.latencies[label].append(time.perf_counter() - start)
+        if response.status_code not in expect:
+            self._error(label, f"{label}: HTTP {response.status_code} {response.text[:200]}")
+            return None
+        return response
+    
+    def _error(self, label: str, sample: str):
+        self.errors[label] += 1
+        if len(self.error_samples) < 20:
+            self.error_samples.append(sample)
+
+class ResourceSampler:
+    """Samples a process's CPU time and resident memory from /proc"""
+    
+    def __init__(self, pid: int, interval: float = 0.5):
+        self.pid = pid
+        self.interval = interval
+        self.ticks = os.sysconf("SC_CLK_TCK")
+        self.peak_rss = 0
+        self.rss_samples: List[int] = []
+        self._cpu_start = 0.0
+        self._cpu_end = 0.0
+        self._task: Optional[asyncio.Task] = None
+    
+    def _cpu_seconds(self) -> float:
+        with open(f"/proc/{self.pid}/stat") as f:
+            # Fields after the parenthesised command name; utime and stime are 14 and 15
+            fields = f.read().rsplit(")", 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / self.ticks
+    
+    def _rss_bytes(self) -> int:
+        with open(f"/proc/{self.pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+        return 0
+    
+    async def _run(self):
+        while True:
+            try:
+                rss = self._rss_bytes()
+                self._cpu_end = self._cpu_seconds()
+            except OSError:
+                return
+            self.rss_samples.append(rss)
+            self.peak_rss = max(self.peak_rss, rss)
+            await asyncio.sleep(self.interval)
+    
+    def start(self):
+        self._cpu_start = self._cpu_end = self._cpu_seconds()
+        self._task = asyncio.create_task(self._run())
+    
+    async def stop(self) -> Dict[str, float]:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        try:
+            self._cpu_end = self._cpu_seconds()
+        except OSError:
+            pass
+        return {
+            "cpu_seconds": round(self._cpu_end - self._cpu_start, 2),
+            "peak_rss_mb": round(self.peak_rss / 2**20, 1),
+            "mean_rss_mb": round(sum(self.rss_samples) / max(len(self.rss_samples), 1) / 2**20, 1)
+        }
+
+# ---------------------------------------------------------------------------
+# Stand-in environment
+# ---------------------------------------------------------------------------
+
+class StandIns:
+    """moto S3 plus a uvicorn subprocess configured to use it, SQLite and in-memory Qdrant"""
+    
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        self.workdir = tempfile.mkdtemp(prefix="loadtest-")
+        self.s3_server = None
+        self.process: Optional[subprocess.Popen] = None
+        self.base_url = ""
+    
+    def server_env(self, s3_port: int) -> Dict[str, str]:
+        env = dict(os.environ)
+        env.update({
+            "DATABASE_URL": self.args.database_url or f"sqlite+aiosqlite:///{self.workdir}/loadtest.db",
+            "QDRANT_LOCATION": ":memory:",
+            "MINIO_ENDPOINT": f"127.0.0.1:{s3_port}",
+            "MINIO_ACCESS_KEY": "loadtest",
+            "MINIO_SECRET_KEY": "loadtest",
+            "MINIO_BUCKET_NAME": "loadtest",
+            "MINIO_SECURE": "false",
+            "EMBEDDING_BACKEND": "transformers" if self.args.real_models else "stub",
+            "EMBEDDING_WORKER_EMBEDDED": "true",
+            "EMBEDDING_WORKER_POLL_INTERVAL": "0.2",
+            "DB_CREATE_SCHEMA": "true",
+        })
+        return env
+    
+    def start(self):
+        from moto.server import ThreadedMotoServer
+        
+        # The S3 server logs every request through werkzeug
+        logging.getLogger("werkzeug").setLevel(logging.ERROR)
+        s3_port = free_port()
+        self.s3_server = ThreadedMotoServer(ip_address="127.0.0.1", port=s3_port, verbose=False)
+        self.s3_server.start()
+        
+        api_port = free_port()
+        self.base_url = f"http://127.0.0.1:{api_port}"
+        self.log = open(os.path.join(self.workdir, "server.log"), "wb")
+        self.process = subprocess.Popen(
+            [
+                sys.executable, "-m", "uvicorn", "app.main:app",
+                "--host", "127.0.0.1", "--port", str(api_port),
+                "--log-level", "warning", "--no-access-log"
+            ],
+            cwd=BACKEND_DIR,
+            env=self.server_env(s3_port),
+            stdout=self.log,
+            stderr=subprocess.STDOUT
+        )
+    
+    async def wait_ready(self, timeout: float):
+        deadline = time.monotonic() + timeout
+        async with httpx.AsyncClient(base_url=self.base_url) as client:
+            while time.monotonic() < deadline:
+                if self.process.poll() is not None:
+                    raise RuntimeError(f"API exited during startup; see {self.log.name}")
+                try:
+                    if (await client.get("/ready")).status_code == 200:
+                        return
+                except httpx.HTTPError:
+                    pass
+                await asyncio.sleep(0.25)
+        raise RuntimeError(f"API not ready after {timeout:.0f}s; see {self.log.name}")
+    
+    def stop(self):
+        if self.process is not None and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+        if self.s3_server is not None:
+            self.s3_server.stop()
+
+# ---------------------------------------------------------------------------
+# Session flow
+# ---------------------------------------------------------------------------
+
+async def wait_embedded(
+    client: httpx.AsyncClient,
+    recorder: Recorder,
+    session_id: str,
+    expected: int,
+    timeout: float
+) -> Optional[Dict[str, Any]]:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        response = await recorder.request(
+            client, "GET /api/embeddings/session/{session_id}/summary",
+            "GET", f"/api/embeddings/session/{session_id}/summary"
+        )
+        if response is not None:
+            summary = response.json()
+            if summary["total"] >= expected and summary["pending"] + summary["processing"] == 0:
+                return summary
+        await asyncio.sleep(0.5)
+    return None
+
+async def run_session(client: httpx.AsyncClient, recorder: Recorder, args: argparse.Namespace, index: int):
+    rng = random.Random(args.seed + index)
+    session_id = f"loadtest-{index}-{uuid.uuid4().hex[:8]}"
+    files = make_files(rng, args.files, args.image_ratio)
+    session_start = time.perf_counter()
+    
+    await recorder.request(client, "POST /api/session", "POST", "/api/session", json={"session_id": session_id})
+    
+    if args.archive:
+        await recorder.request(
+            client, "POST /api/files/ingest", "POST", "/api/files/ingest",
+            params={"session_id": session_id},
+            content=make_archive(files),
+            headers={"Content-Type": "application/zip"}
+        )
+    else:
+        for offset in range(0, len(files), args.batch_size):
+            batch = files[offset:offset + args.batch_size]
+            await recorder.request(
+                client, "POST /api/files/upload", "POST", "/api/files/upload",
+                params={"session_id": session_id},
+                files=[("files", item) for item in batch]
+            )
+    
+    summary = await wait_embedded(client, recorder, session_id, len(files), args.embed_timeout)
+    if summary is None:
+        recorder._error("embedding", f"{session_id}: not embedded within {args.embed_timeout:.0f}s")
+        return
+    recorder.timings["time_to_embedded"].append(time.perf_counter() - session_start)
+    recorder.timings["files_embedded"].append(summary["completed"])
+    
+    file_ids: List[str] = []
+    cursor = None
+    while True:
+        params = {"limit": 100, **({"cursor": cursor} if cursor else {})}
+        response = await recorder.request(
+            client, "GET /api/files/session/{session_id}", "GET", f"/api/files/session/{session_id}", params=params
+        )
+        if response is None:
+            break
+        page = response.json()
+        file_ids.extend(item["id"] for item in page["files"])
+        cursor = page["next_cursor"]
+        if not cursor:
+            break
+    
+    dendrogram_url = f"/api/clustering/dendrogram/{session_id}"
+    response = await recorder.request(
+        client, "GET /api/clustering/dendrogram/{session_id}", "GET", dendrogram_url,
+        params={"vector_format": "base64"}
+    )
+    if response is not None and "etag" in response.headers:
+        await recorder.request(
+            client, "GET /api/clustering/dendrogram/{session_id} (revalidate)", "GET", dendrogram_url,
+            params={"vector_format": "base64"},
+            headers={"If-None-Match": response.headers["etag"]},
+            expect=(304,)
+        )
+    await recorder.request(
+        client, "GET /api/clustering/clusters/{session_id}", "GET", f"/api/clustering/clusters/{session_id}"
+    )
+    await recorder.request(
+        client, "GET /api/analysis/anomalies/{session_id}", "GET", f"/api/analysis/anomalies/{session_id}"
+    )
+    
+    for file_id in rng.sample(file_ids, min(args.searches, len(file_ids))):
+        await recorder.request(
+            client, "POST /api/search/similar", "POST", "/api/search/similar",
+            json={"session_id": session_id, "file_id": file_id, "top_k": 10}
+        )
+    await recorder.request(
+        client, "POST /api/search/similar (text)", "POST", "/api/search/similar",
+        json={"session_id": session_id, "query_text": " ".join(rng.choices(WORDS, k=4)), "top_k": 10}
+    )
+
+# ---------------------------------------------------------------------------
+# Report
+# ---------------------------------------------------------------------------
+
+def build_report(
+    args: argparse.Namespace,
+    recorder: Recorder,
+    wall_seconds: float,
+    resources: Dict[str, float]
+) -> Dict[str, Any]:
+    endpoints = {}
+    for label in sorted(set(recorder.latencies) | set(recorder.errors)):
+        values = recorder.latencies.get(label, [])
+        errors = recorder.errors.get(label, 0)
+        endpoints[label] = {
+            "requests": len(values) + (errors if not values else 0),
+            "errors": errors,
+            "p50_ms": round(percentile(values, 50) * 1000, 1),
+            "p95_ms": round(percentile(values, 95) * 1000, 1),
+            "p99_ms": round(percentile(values, 99) * 1000, 1),
+            "max_ms": round(max(values, default=0.0) * 1000, 1)
+        }
+    
+    total_requests = sum(len(values) for values in recorder.latencies.values())
+    total_errors = sum(recorder.errors.values())
+    embedded = recorder.timings["time_to_embedded"]
+    return {
+        "config": {
+            "sessions": args.sessions,
+            "concurrency": args.concurrency,
+            "files_per_session": args.files,
+            "image_ratio": args.image_ratio,
+            "archive": args.archive,
+            "real_models": args.real_models,
+            "database": "postgres" if args.database_url else "sqlite"
+        },
+        "wall_seconds": round(wall_seconds, 2),
+        "requests": total_requests,
+        "errors": total_errors,
+        "error_rate": round(total_errors / max(total_requests + total_errors, 1), 4),
+        "requests_per_second": round(total_requests / wall_seconds, 1),
+        "files_embedded_per_second": round(sum(recorder.timings["files_embedded"]) / wall_seconds, 1),
+        "time_to_embedded_p50_s": round(percentile(embedded, 50), 2),
+        "time_to_embedded_p95_s": round(percentile(embedded, 95), 2),
+        "server": {**resources, "cpu_percent": round(100 * resources["cpu_seconds"] / wall_seconds, 1)},
+        "endpoints": endpoints,
+        "error_samples": recorder.error_samples
+    }
+
+def print_report(report: Dict[str, Any]):
+    print(f"\n{report['requests']} requests in {report['wall_seconds']}s "
+          f"({report['requests_per_second']} req/s), {report['errors']} errors, "
+          f"{report['files_embedded_per_second']} files embedded/s")
+    print(f"time to embedded: p50 {report['time_to_embedded_p50_s']}s, p95 {report['time_to_embedded_p95_s']}s")
+    server = report["server"]
+    print(f"server: {server['cpu_seconds']} CPU s ({server['cpu_percent']}%), "
+          f"peak RSS {server['peak_rss_mb']} MB, mean RSS {server['mean_rss_mb']} MB\n")
+    
+    width = max((len(label) for label in report["endpoints"]), default=10)
+    print(f"{'endpoint':<{width}} {'n':>6} {'err':>5} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    for label, stats in report["endpoints"].items():
+        print(f"{label:<{width}} {stats['requests']:>6} {stats['errors']:>5} {stats['p50_ms']:>9} "
+              f"{stats['p95_ms']:>9} {stats['p99_ms']:>9} {stats['max_ms']:>9}")
+    for sample in report["error_samples"]:
+        print(f"  ! {sample}")
+
+def check_gates(args: argparse.Namespace, report: Dict[str, Any]) -> List[str]:
+    failures = []
+    if args.max_error_rate is not None and report["error_rate"] > args.max_error_rate:
+        failures.append(f"error rate {report['error_rate']} > {args.max_error_rate}")
+    if args.max_p95_ms is not None:
+        for label, stats in report["endpoints"].items():
+            if stats["p95_ms"] > args.max_p95_ms:
+                failures.append(f"{label} p95 {stats['p95_ms']} ms > {args.max_p95_ms} ms")
+    if args.max_embed_seconds is not None and report["time_to_embedded_p95_s"] > args.max_embed_seconds:
+        failures.append(f"time to embedded p95 {report['time_to_embedded_p95_s']}s > {args.max_embed_seconds}s")
+    if args.max_rss_mb is not None and report["server"]["peak_rss_mb"] > args.max_rss_mb:
+        failures.append(f"peak RSS {report['server']['peak_rss_mb']} MB > {args.max_rss_mb} MB")
+    return failures
+
+# ---------------------------------------------------------------------------
+# Entry point
+# ---------------------------------------------------------------------------
+
+async def run(args: argparse.Namespace) -> int:
+    stand_ins = StandIns(args)
+    stand_ins.start()
+    try:
+        await stand_ins.wait_ready(args.startup_timeout)
+        
+        recorder = Recorder()
+        sampler = ResourceSampler(stand_ins.process.pid)
+        semaphore = asyncio.Semaphore(args.concurrency)
+        limits = httpx.Limits(max_connections=args.concurrency * 4)
+        
+        async def session(index: int):
+            async with semaphore:
+                await run_session(client, recorder, args, index)
+        
+        async with httpx.AsyncClient(base_url=stand_ins.base_url, timeout=args.request_timeout, limits=limits) as client:
+            sampler.start()
+            start = time.perf_counter()
+            await asyncio.gather(*(session(index) for index in range(args.sessions)))
+            wall_seconds = time.perf_counter() - start
+            resources = await sampler.stop()
+    finally:
+        stand_ins.stop()
+    
+    report = build_report(args, recorder, wall_seconds, resources)
+    print_report(report)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    
+    failures = check_gates(args, report)
+    for failure in failures:
+        print(f"GATE FAILED: {failure}")
+    return 1 if failures else 0
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="python -m loadtest", description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--sessions", type=int, default=4, help="Sessions to run in total")
+    parser.add_argument("--concurrency", type=int, default=4, help="Sessions in flight at once")
+    parser.add_argument("--files", type=int, default=40, help="Files uploaded per session")
+    parser.add_argument("--image-ratio", type=float, default=0.7, help="Fraction of files that are images")
+    parser.add_argument("--batch-size", type=int, default=10, help="Files per multipart upload")
+    parser.add_argument("--archive", action="store_true", help="Upload each session as one zip via /ingest")
+    parser.add_argument("--searches", type=int, default=5, help="Similarity searches per session")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--database-url", help="Use this database (e.g. a local Postgres) instead of SQLite")
+    parser.add_argument("--real-models", action="store_true", help="Load the configured embedding models")
+    parser.add_argument("--startup-timeout", type=float, default=120.0)
+    parser.add_argument("--embed-timeout", type=float, default=300.0)
+    parser.add_argument("--request-timeout", type=float, default=120.0)
+    parser.add_argument("--output", help="Write the JSON report here")
+    parser.add_argument("--max-p95-ms", type=float, help="Fail if any endpoint's p95 exceeds this")
+    parser.add_argument("--max-error-rate", type=float, help="Fail if the error rate exceeds this fraction")
+    parser.add_argument("--max-embed-seconds", type=float, help="Fail if p95 time-to-embedded exceeds this")
+    parser.add_argument("--max-rss-mb", type=float, help="Fail if the server's peak RSS exceeds this")
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(run(parse_args())))
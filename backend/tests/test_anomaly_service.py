@@ -0,0 +1,96 @@
+import asyncio
+import numpy as np
+import pytest
+from app.services import anomaly_service as anomaly_module
+from app.services.anomaly_service import AnomalyMethod, NeighborSource, anomaly_service
+
+def brute_force_knn(vectors, k):
+    distances = np.linalg.norm(vectors[:, None, :] - vectors[None, :, :], axis=2)
+    np.fill_diagonal(distances, np.inf)
+    indices = np.argsort(distances, axis=1, kind="stable")[:, :k]
+    return np.take_along_axis(distances, indices, axis=1), indices
+
+@pytest.mark.parametrize("block_size", [1, 7, 16, 1000])
+@pytest.mark.parametrize("normalize", [True, False])
+def test_nearest_neighbors_matches_brute_force(block_size, normalize):
+    # 53 items: no block size above divides it, so tiles straddle the diagonal unevenly
+    vectors = np.random.default_rng(0).standard_normal((53, 8)).astype(np.float32)
+    k = 5
+    expected_vectors = vectors / np.linalg.norm(vectors, axis=1, keepdims=True) if normalize else vectors
+    expected_distances, expected_indices = brute_force_knn(expected_vectors.astype(np.float64), k)
+    
+    distances, indices = anomaly_service.nearest_neighbors(vectors, k, block_size=block_size, normalize=normalize)
+    
+    np.testing.assert_allclose(distances, expected_distances, rtol=1e-4, atol=1e-4)
+    # Random data has no ties, so the neighbours themselves must agree
+    np.testing.assert_array_equal(indices, expected_indices)
+    assert not np.any(indices == np.arange(len(vectors))[:, None])
+
+def test_local_outlier_factor_flags_planted_outlier():
+    rng = np.random.default_rng(1)
+    cluster = rng.normal(0, 0.1, (60, 2))
+    vectors = np.vstack([cluster, [[3.0, 3.0]]]).astype(np.float32)
+    distances, indices = anomaly_service.nearest_neighbors(vectors, 5, block_size=16, normalize=False)
+    
+    scores = anomaly_service.local_outlier_factor(distances, indices)
+    
+    assert np.argmax(scores) == len(vectors) - 1
+    assert scores[-1] > 5
+    # Inliers sit around 1
+    assert np.median(scores[:-1]) == pytest.approx(1.0, abs=0.2)
+
+def test_local_outlier_factor_with_exact_duplicates_is_finite():
+    vectors = np.array([[0, 0]] * 4 + [[1, 1]], dtype=np.float32)
+    distances, indices = anomaly_service.nearest_neighbors(vectors, 2, normalize=False)
+    assert np.all(np.isfinite(anomaly_service.local_outlier_factor(distances, indices)))
+
+def embeddings_for(vectors):
+    return [
+        {"id": f"id{i}", "vector": vector.tolist(), "payload": {"filename": f"{i}.txt"}}
+        for i, vector in enumerate(vectors)
+    ]
+
+def fake_search(monkeypatch, embeddings, hits_by_id):
+    """Answer Qdrant neighbour searches from hits_by_id, honouring the limit"""
+    ids = {tuple(emb["vector"]): emb["id"] for emb in embeddings}
+    
+    async def search_neighbors(vectors, session_id, limit):
+        return [hits_by_id[ids[tuple(vector)]][:limit] for vector in vectors]
+    
+    monkeypatch.setattr(anomaly_module.qdrant_service, "search_neighbors", search_neighbors)
+
+def test_search_neighbors_pads_short_hit_lists(monkeypatch):
+    embeddings = embeddings_for(np.eye(3, dtype=np.float32))
+    fake_search(monkeypatch, embeddings, {
+        "id0": [("id0", 1.0), ("id2", 0.5), ("id1", 0.2)],
+        # A point stored after the session was read takes up one of the k + 1 hits
+        "id1": [("id1", 1.0), ("late", 0.6), ("id0", 0.2)],
+        "id2": [("id2", 1.0), ("id0", 0.5)]
+    })
+    
+    distances, indices = asyncio.run(anomaly_service.search_neighbors(embeddings, "s", 2))
+    
+    np.testing.assert_array_equal(indices, [[2, 1], [0, 0], [0, 0]])
+    # Cosine similarity s becomes the unit-vector distance sqrt(2 - 2s)
+    np.testing.assert_allclose(distances[0], np.sqrt([1.0, 1.6]), rtol=1e-6)
+    # Short lists are padded with the farthest hit found
+    np.testing.assert_allclose(distances[1], np.sqrt([1.6, 1.6]), rtol=1e-6)
+    np.testing.assert_allclose(distances[2], [1.0, 1.0], rtol=1e-6)
+
+def test_search_neighbors_without_hits_falls_back_to_local(monkeypatch):
+    vectors = np.random.default_rng(2).standard_normal((6, 4)).astype(np.float32)
+    embeddings = embeddings_for(vectors)
+    # Every item only finds itself, as when the index lags the session
+    fake_search(monkeypatch, embeddings, {emb["id"]: [(emb["id"], 1.0)] for emb in embeddings})
+    
+    with pytest.raises(LookupError):
+        asyncio.run(anomaly_service.search_neighbors(embeddings, "s", 2))
+    
+    anomalies, threshold = asyncio.run(anomaly_service.detect_anomalies(
+        embeddings, "s", AnomalyMethod.KNN, k=2, threshold_percentile=50, neighbor_source=NeighborSource.QDRANT
+    ))
+    distances, _ = anomaly_service.nearest_neighbors(vectors, 2)
+    assert threshold == pytest.approx(float(np.percentile(distances[:, -1], 50)))
+    assert {anomaly["file_id"] for anomaly in anomalies} == {
+        embeddings[i]["id"] for i in np.flatnonzero(distances[:, -1] > threshold)
+    }
@@ -0,0 +1,180 @@
+import asyncio
+import io
+import tarfile
+import threading
+import zipfile
+import pytest
+from app.services.archive_stream import ArchiveError, iter_archive, unpack_stream
+
+class Unseekable(io.RawIOBase):
+    """Write-only sink that hides tell/seek, so zipfile writes data descriptors"""
+    
+    def __init__(self):
+        self.buffer = io.BytesIO()
+    
+    def writable(self) -> bool:
+        return True
+    
+    def write(self, data) -> int:
+        return self.buffer.write(data)
+    
+    def seekable(self) -> bool:
+        return False
+
+def make_zip(files, compression=zipfile.ZIP_DEFLATED, streamed=False) -> bytes:
+    sink = Unseekable() if streamed else io.BytesIO()
+    with zipfile.ZipFile(sink, "w", compression=compression) as archive:
+        for name, data in files.items():
+            archive.writestr(name, data)
+    return (sink.buffer if streamed else sink).getvalue()
+
+def make_tar(files, mode="w:gz") -> bytes:
+    sink = io.BytesIO()
+    with tarfile.open(fileobj=sink, mode=mode) as archive:
+        for name, data in files.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            archive.addfile(info, io.BytesIO(data))
+    return sink.getvalue()
+
+def read_all(data: bytes):
+    return {name: stream.read() for name, stream in iter_archive(io.BytesIO(data))}
+
+FILES = {
+    "notes.txt": b"hello " * 1000,
+    "dir/data.csv": b"a,b\n1,2\n",
+    "empty.md": b"",
+    "big.json": bytes(range(256)) * 2000
+}
+
+@pytest.mark.parametrize("compression", [zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED])
+def test_zip_round_trip(compression):
+    assert read_all(make_zip(FILES, compression)) == FILES
+
+def test_zip_with_data_descriptors():
+    data = make_zip(FILES, streamed=True)
+    # Deflated entries written to an unseekable sink carry the data descriptor flag
+    assert data[6] & 0x8
+    assert read_all(data) == FILES
+
+def test_stored_zip_entry_with_data_descriptor_is_rejected():
+    with pytest.raises(ArchiveError, match="cannot be streamed"):
+        read_all(make_zip(FILES, zipfile.ZIP_STORED, streamed=True))
+
+def test_entries_can_be_skipped_unread():
+    names = [name for name, _ in iter_archive(io.BytesIO(make_zip(FILES, streamed=True)))]
+    assert names == list(FILES)
+
+@pytest.mark.parametrize("compression", [zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED])
+def test_truncated_zip(compression):
+    data = make_zip(FILES, compression)
+    with pytest.raises(ArchiveError):
+        read_all(data[:len(data) // 2])
+
+def test_corrupt_zip_entry_fails_crc():
+    data = bytearray(make_zip({"notes.txt": b"x" * 100}, zipfile.ZIP_STORED))
+    data[data.index(b"x" * 100) + 50] = ord("y")
+    with pytest.raises(ArchiveError, match="CRC"):
+        read_all(bytes(data))
+
+@pytest.mark.parametrize("mode", ["w", "w:gz", "w:bz2", "w:xz"])
+def test_tar_round_trip(mode):
+    assert read_all(make_tar(FILES, mode)) == FILES
+
+def test_truncated_tar():
+    data = make_tar(FILES)
+    with pytest.raises((ArchiveError, tarfile.TarError, EOFError)):
+        read_all(data[:len(data) // 2])
+
+async def chunked(data: bytes, size: int = 64):
+    for offset in range(0, len(data), size):
+        yield data[offset:offset + size]
+        await asyncio.sleep(0)
+
+def run_in_thread(coroutine_function, timeout: float = 10):
+    """
+    asyncio.run on a separate thread, failing instead of hanging
+    
+    asyncio.run also waits for the default executor, so a parser thread left
+    blocked on the queue shows up here as a timeout.
+    """
+    outcome = {}
+    
+    def target():
+        try:
+            outcome["result"] = asyncio.run(coroutine_function())
+        except BaseException as e:
+            outcome["error"] = e
+    
+    thread = threading.Thread(target=target, daemon=True)
+    thread.start()
+    thread.join(timeout)
+    assert not thread.is_alive(), "event loop did not shut down"
+    if "error" in outcome:
+        raise outcome["error"]
+    return outcome["result"]
+
+def unpack(make_chunks, queue_chunks: int = 2, handle_entry=None):
+    """Run unpack_stream over make_chunks() and return what each entry contained"""
+    received = {}
+    
+    async def collect(name, stream):
+        # Entry streams block on the body queue, so they are read off the loop
+        received[name] = await asyncio.to_thread(stream.read)
+    
+    async def main():
+        await unpack_stream(make_chunks(), handle_entry or collect, queue_chunks)
+        # Nothing may be left running once unpack_stream returns
+        assert asyncio.all_tasks() == {asyncio.current_task()}
+    
+    run_in_thread(main)
+    return received
+
+def test_unpack_stream_zip_and_tar():
+    assert unpack(lambda: chunked(make_zip(FILES, streamed=True))) == FILES
+    assert unpack(lambda: chunked(make_tar(FILES))) == FILES
+
+def test_unpack_stream_central_directory_larger_than_queue():
+    # Many small entries give a central directory spanning far more chunks than the queue holds
+    files = {f"file{i:04}.txt": b"x" for i in range(400)}
+    data = make_zip(files, zipfile.ZIP_STORED)
+    central_directory = len(data) - data.index(b"PK\x01\x02")
+    assert central_directory > 10 * 64 * 2
+    assert unpack(lambda: chunked(data), queue_chunks=2) == files
+
+def test_unpack_stream_entry_failure_with_unread_body():
+    files = {f"file{i:04}.txt": b"x" * 100 for i in range(200)}
+    
+    async def fail(name, stream):
+        raise RuntimeError("upload failed")
+    
+    with pytest.raises(RuntimeError, match="upload failed"):
+        unpack(lambda: chunked(make_zip(files, zipfile.ZIP_STORED)), queue_chunks=2, handle_entry=fail)
+
+def test_unpack_stream_truncated_body():
+    data = make_zip(FILES)
+    with pytest.raises(ArchiveError):
+        unpack(lambda: chunked(data[:len(data) // 2]))
+
+def test_unpack_stream_body_broken_off():
+    async def broken():
+        data = make_zip(FILES)
+        yield data[:1000]
+        raise ConnectionError("client disconnected")
+    
+    with pytest.raises(ArchiveError):
+        unpack(broken)
+
+def test_unpack_stream_cancelled_mid_body():
+    async def stalled():
+        yield make_zip(FILES)[:1000]
+        await asyncio.Event().wait()
+    
+    async def main():
+        task = asyncio.create_task(unpack_stream(stalled(), lambda name, stream: asyncio.sleep(0), 2))
+        await asyncio.sleep(0.2)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+    
+    run_in_thread(main)
@@ -0,0 +1,116 @@
+import asyncio
+import numpy as np
+import pytest
+from app.services.duplicate_service import DisjointSet, duplicate_service
+
+def components(n, rows, cols):
+    """Connected components by breadth-first search, as a set of frozensets"""
+    neighbours = [[] for _ in range(n)]
+    for a, b in zip(rows, cols):
+        neighbours[a].append(b)
+        neighbours[b].append(a)
+    seen, groups = set(), set()
+    for start in range(n):
+        if start in seen:
+            continue
+        group, frontier = {start}, [start]
+        while frontier:
+            for other in neighbours[frontier.pop()]:
+                if other not in group:
+                    group.add(other)
+                    frontier.append(other)
+        seen |= group
+        groups.add(frozenset(group))
+    return groups
+
+def groups_of(roots):
+    by_root = {}
+    for item, root in enumerate(roots):
+        by_root.setdefault(int(root), set()).add(item)
+    return {frozenset(group) for group in by_root.values()}
+
+def near_duplicates(n_bases=30, seed=0):
+    """Random base vectors, each with up to four slightly perturbed copies"""
+    rng = np.random.default_rng(seed)
+    vectors = []
+    for _ in range(n_bases):
+        base = rng.standard_normal(64)
+        vectors.append(base)
+        for _ in range(rng.integers(0, 5)):
+            vectors.append(base + 0.01 * rng.standard_normal(64))
+    vectors = np.array(vectors, dtype=np.float32)
+    return vectors[rng.permutation(len(vectors))]
+
+def brute_force(vectors, threshold):
+    unit = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    similarities = unit @ unit.T
+    rows, cols = np.nonzero(np.triu(similarities >= threshold, k=1))
+    return similarities, rows, cols
+
+@pytest.mark.parametrize("seed", range(5))
+def test_union_many_matches_components(seed):
+    rng = np.random.default_rng(seed)
+    n = 200
+    # Long chains and shared endpoints need several rounds of hooking
+    a = rng.integers(0, n, 150)
+    b = rng.integers(0, n, 150)
+    chain = np.arange(50, 99)
+    a = np.concatenate([a, chain[::-1]])
+    b = np.concatenate([b, chain[::-1] + 1])
+    
+    groups = DisjointSet(n)
+    groups.union_many(a, b)
+    assert groups_of(groups.roots()) == components(n, a, b)
+
+def test_union_many_in_batches():
+    groups = DisjointSet(6)
+    groups.union_many(np.array([0, 2]), np.array([1, 3]))
+    groups.union_many(np.array([3]), np.array([5]))
+    groups.union_many(np.array([1]), np.array([5]))
+    assert groups_of(groups.roots()) == {frozenset({0, 1, 2, 3, 5}), frozenset({4})}
+
+@pytest.mark.parametrize("block_size", [7, 16, 1000])
+def test_find_duplicates_matches_brute_force(block_size):
+    vectors = near_duplicates()
+    n = len(vectors)
+    # Tiles must straddle the diagonal blocks in uneven sizes
+    assert block_size >= n or n % block_size
+    threshold = 0.99
+    similarities, rows, cols = brute_force(vectors, threshold)
+    
+    roots, best, (kept_rows, kept_cols, kept_scores), pair_count = duplicate_service.find_duplicates(
+        vectors, threshold, max_pairs=10, block_size=block_size
+    )
+    
+    assert pair_count == len(rows) > 10
+    assert groups_of(roots) == components(n, rows, cols)
+    
+    np.fill_diagonal(similarities, -np.inf)
+    expected_best = similarities.max(axis=1)
+    expected_best[expected_best < threshold] = -np.inf
+    np.testing.assert_allclose(best, np.minimum(expected_best, 1.0), atol=1e-5)
+    
+    assert len(kept_rows) == 10
+    assert np.all(kept_rows < kept_cols)
+    assert set(zip(kept_rows.tolist(), kept_cols.tolist())) <= set(zip(rows.tolist(), cols.tolist()))
+    np.testing.assert_allclose(kept_scores, np.minimum(similarities[kept_rows, kept_cols], 1.0), atol=1e-5)
+
+def test_exact_duplicates_and_no_self_pairs():
+    vectors = np.array([[1, 0], [1, 0], [0, 1], [1, 0]], dtype=np.float32)
+    roots, best, _, pair_count = duplicate_service.find_duplicates(vectors, 0.999, block_size=3)
+    assert pair_count == 3
+    assert groups_of(roots) == {frozenset({0, 1, 3}), frozenset({2})}
+    assert best[2] == -np.inf and np.all(best[[0, 1, 3]] <= 1.0)
+
+def test_find_session_duplicates_groups():
+    vectors = near_duplicates(seed=1)
+    embeddings = [{"id": str(i), "vector": v.tolist(), "payload": {}} for i, v in enumerate(vectors)]
+    _, rows, cols = brute_force(vectors, 0.99)
+    
+    result = asyncio.run(duplicate_service.find_session_duplicates(embeddings, 0.99, max_pairs=5))
+    
+    expected = sorted((group for group in components(len(vectors), rows, cols) if len(group) > 1), key=len, reverse=True)
+    assert [len(group) for group in result["groups"]] == [len(group) for group in expected]
+    assert {frozenset(i for i, _ in group) for group in result["groups"]} == set(expected)
+    assert result["pair_count"] == len(rows)
+    assert len(result["pairs"]) == 5
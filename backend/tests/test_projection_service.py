@@ -0,0 +1,137 @@
+import asyncio
+import numpy as np
+import pytest
+from app.services import projection_service as projection_module
+from app.services.projection_service import ProjectionService
+
+def low_rank(n=300, d=64, rank=5, noise=1e-4, seed=0):
+    rng = np.random.default_rng(seed)
+    scales = np.array([10.0, 6.0, 3.0, 1.5, 0.5])[:rank]
+    return ((rng.standard_normal((n, rank)) * scales) @ rng.standard_normal((rank, d))
+            + noise * rng.standard_normal((n, d))).astype(np.float32)
+
+def pairwise(vectors):
+    return np.linalg.norm(vectors[:, None, :] - vectors[None, :, :], axis=2)
+
+def test_fit_matches_exact_svd_on_low_rank_data():
+    vectors = low_rank()
+    centered = vectors.astype(np.float64) - vectors.mean(axis=0)
+    singular_values = np.linalg.svd(centered, compute_uv=False)
+    expected = singular_values ** 2 / (singular_values ** 2).sum()
+    
+    projected, explained = ProjectionService().fit(vectors, 5)
+    
+    assert projected.shape == (300, 5)
+    np.testing.assert_allclose(explained, expected[:5], rtol=1e-3, atol=1e-6)
+    assert explained.sum() == pytest.approx(1.0, abs=1e-4)
+    # The components span all the variance, so distances are preserved
+    np.testing.assert_allclose(pairwise(projected), pairwise(centered), rtol=1e-3, atol=1e-3)
+
+def test_fit_keeps_the_leading_components():
+    vectors = low_rank()
+    centered = vectors.astype(np.float64) - vectors.mean(axis=0)
+    singular_values = np.linalg.svd(centered, compute_uv=False)
+    
+    projected, explained = ProjectionService().fit(vectors, 2)
+    
+    np.testing.assert_allclose(explained, singular_values[:2] ** 2 / (singular_values ** 2).sum(), rtol=1e-3)
+    # Component variances come out in decreasing order
+    variances = projected.var(axis=0)
+    assert variances[0] > variances[1]
+
+def test_fit_is_repeatable_and_clips_dimension():
+    vectors = low_rank(n=20, d=8)
+    first, _ = ProjectionService().fit(vectors, 50)
+    second, _ = ProjectionService().fit(vectors, 50)
+    assert first.shape == (20, 8)
+    np.testing.assert_array_equal(first, second)
+
+class FakeDB:
+    async def __aenter__(self):
+        return self
+    
+    async def __aexit__(self, *exc_info):
+        return False
+
+@pytest.fixture
+def service(monkeypatch):
+    """ProjectionService whose content versions come from a dict and whose fits are counted"""
+    versions = {}
+    
+    async def content_version(db, session_id):
+        return versions.get(session_id, 0)
+    
+    monkeypatch.setattr(projection_module, "SessionLocal", FakeDB)
+    monkeypatch.setattr(projection_module.session_service, "content_version", content_version)
+    
+    service = ProjectionService()
+    service.versions = versions
+    service.fits = 0
+    fit = service.fit
+    
+    def counting_fit(*args, **kwargs):
+        service.fits += 1
+        return fit(*args, **kwargs)
+    
+    monkeypatch.setattr(service, "fit", counting_fit)
+    return service
+
+def session(n=40, d=16, seed=0):
+    vectors = np.random.default_rng(seed).standard_normal((n, d))
+    return [{"id": f"id{i}", "vector": vector.tolist(), "payload": {}} for i, vector in enumerate(vectors)]
+
+def test_project_session_is_cached_per_version_and_dimension(service):
+    embeddings = session()
+    
+    async def project(session_id, dimension, items=embeddings):
+        return await service.project_session(session_id, items, dimension)
+    
+    first = asyncio.run(project("s", 4))
+    assert asyncio.run(project("s", 4)) is first
+    assert service.fits == 1
+    
+    # Another dimension or session is a separate entry
+    assert asyncio.run(project("s", 3)).vectors.shape == (40, 3)
+    asyncio.run(project("t", 4))
+    assert service.fits == 3
+    
+    # New content version: refitted
+    service.versions["s"] = 1
+    assert asyncio.run(project("s", 4)) is not first
+    assert service.fits == 4
+    
+    # Same version but different items (e.g. a filtered read) is not served from the cache
+    asyncio.run(project("s", 4, embeddings[:30]))
+    assert service.fits == 5
+
+def test_project_session_fits_unit_vectors(service):
+    embeddings = session()
+    scaled = [{**emb, "vector": [x * (i + 1) for x in emb["vector"]]} for i, emb in enumerate(embeddings)]
+    plain = asyncio.run(service.project_session("s", embeddings, 4))
+    service.versions["s"] = 1
+    rescaled = asyncio.run(service.project_session("s", scaled, 4))
+    np.testing.assert_allclose(plain.vectors, rescaled.vectors, rtol=1e-4, atol=1e-5)
+
+def test_projection_cache_evicts_least_recently_used(service):
+    embeddings = session()
+    entry_bytes = 40 * 4 * 4
+    service.max_bytes = 2 * entry_bytes
+    
+    def project(session_id):
+        return asyncio.run(service.project_session(session_id, embeddings, 4))
+    
+    project("a")
+    project("b")
+    project("a")  # a becomes the most recently used
+    project("c")  # evicts b
+    assert service.fits == 3
+    assert [key[0] for key in service._entries] == ["a", "c"]
+    assert service._size == 2 * entry_bytes
+    
+    project("b")
+    assert service.fits == 4
+    
+    # An entry larger than the whole cache is returned but not kept
+    service.max_bytes = entry_bytes - 1
+    project("d")
+    assert ("d", 0, 4) not in service._entries
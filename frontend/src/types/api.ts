@@ -31,7 +31,8 @@ export interface FileResponse {
 
 export interface FileListResponse {
   files: FileResponse[];
-  total: number;
+  total?: number | null;
+  next_cursor?: string | null;
 }
 
 // Embedding Types
@@ -55,6 +56,15 @@ export interface ModelInfoResponse {
   image_model_loaded: boolean;
 }
 
+export interface SessionEmbeddingSummary {
+  session_id: string;
+  total: number;
+  pending: number;
+  processing: number;
+  completed: number;
+  failed: number;
+}
+
 // Clustering Types
 export interface ClusterItem {
   file_id: string;
@@ -80,18 +90,34 @@ export interface DendrogramNode {
   items: string[];
 }
 
+export interface ProjectionInfo {
+  dimension: number;
+  original_dimension: number;
+  explained_variance_ratio: number;
+}
+
+export interface ProjectionReport {
+  session_id: string;
+  total_items: number;
+  original_dimension: number;
+  explained_variance_ratio: number[];
+  cumulative_variance_ratio: number[];
+}
+
 export interface DendrogramResponse {
   session_id: string;
   linkage_matrix: number[][];
   nodes: DendrogramNode[];
   cluster_summaries: ClusterSummary[];
   total_items: number;
+  projection?: ProjectionInfo | null;
 }
 
 export interface ClusterRequest {
   session_id: string;
   num_clusters?: number;
   distance_threshold?: number;
+  projection_dim?: number;
 }
 
 // Search Types
@@ -117,6 +143,8 @@ export interface SimilaritySearchResponse {
 }
 
 // Analysis Types
+export type AnomalyMethod = 'centroid' | 'knn' | 'lof';
+
 export interface AnomalyItem {
   file_id: string;
   filename: string;
@@ -132,6 +160,48 @@ export interface AnomalyDetectionResponse {
   threshold: number;
   total_files: number;
   anomaly_count: number;
+  projection?: ProjectionInfo | null;
+}
+
+export interface DuplicateItem {
+  file_id: string;
+  filename: string;
+  file_type: string;
+  best_similarity: number;
+}
+
+export interface DuplicateGroup {
+  group_id: number;
+  item_count: number;
+  items: DuplicateItem[];
+}
+
+export interface DuplicatePair {
+  file_id_a: string;
+  file_id_b: string;
+  similarity: number;
+}
+
+export interface DuplicateDetectionResponse {
+  session_id: string;
+  threshold: number;
+  total_files: number;
+  groups: DuplicateGroup[];
+  pair_count: number;
+  pairs: DuplicatePair[];
+}
+
+// Compact vector encoding, returned for linkage_matrix and centroid when
+// requested with ?vector_format=base64 (little-endian float32, row-major)
+export interface EncodedArray {
+  dtype: 'float32';
+  shape: number[];
+  data: string;
+}
+
+export function decodeFloat32(encoded: EncodedArray): Float32Array {
+  const bytes = Uint8Array.from(atob(encoded.data), c => c.charCodeAt(0));
+  return new Float32Array(bytes.buffer);
 }
 
 // API Client Configuration
@@ -234,6 +304,19 @@ export class InventoryAPI {
     return response.json();
   }
 
+  // Subscribe to Session Embedding Progress (Server-Sent Events)
+  // The browser reconnects on its own and resumes from the last event id.
+  subscribeSessionProgress(
+    sessionId: string,
+    onProgress: (summary: SessionEmbeddingSummary) => void
+  ): () => void {
+    const source = new EventSource(`${this.baseUrl}/api/embeddings/session/${sessionId}/events`);
+    source.addEventListener('progress', event => {
+      onProgress(JSON.parse((event as MessageEvent).data));
+    });
+    return () => source.close();
+  }
+
   // Get Model Info
   async getModelInfo(): Promise<ModelInfoResponse> {
     const response = await fetch(`${this.baseUrl}/api/embeddings/models/info`);
@@ -264,11 +347,13 @@ export class InventoryAPI {
   async getClusters(
     sessionId: string,
     numClusters?: number,
-    distanceThreshold?: number
+    distanceThreshold?: number,
+    projectionDim?: number
   ): Promise<ClusterSummary[]> {
     const params = new URLSearchParams();
     if (numClusters) params.append('num_clusters', numClusters.toString());
     if (distanceThreshold) params.append('distance_threshold', distanceThreshold.toString());
+    if (projectionDim !== undefined) params.append('projection_dim', projectionDim.toString());
 
     const response = await fetch(
       `${this.baseUrl}/api/clustering/clusters/${sessionId}?${params.toString()}`
@@ -296,13 +381,38 @@ export class InventoryAPI {
     return response.json();
   }
 
+  // Variance kept per projection dimension
+  async getProjectionReport(
+    sessionId: string,
+    maxDimension: number = 256
+  ): Promise<ProjectionReport> {
+    const response = await fetch(
+      `${this.baseUrl}/api/clustering/projection/${sessionId}?max_dimension=${maxDimension}`
+    );
+
+    if (!response.ok) {
+      throw new Error(`Failed to get projection report: ${response.statusText}`);
+    }
+
+    return response.json();
+  }
+
   // Detect Anomalies
   async detectAnomalies(
     sessionId: string,
-    thresholdPercentile: number = 95.0
+    thresholdPercentile: number = 95.0,
+    method: AnomalyMethod = 'centroid',
+    k?: number
   ): Promise<AnomalyDetectionResponse> {
+    const params = new URLSearchParams({
+      threshold_percentile: String(thresholdPercentile),
+      method,
+    });
+    if (k !== undefined) {
+      params.set('k', String(k));
+    }
     const response = await fetch(
-      `${this.baseUrl}/api/analysis/anomalies/${sessionId}?threshold_percentile=${thresholdPercentile}`
+      `${this.baseUrl}/api/analysis/anomalies/${sessionId}?${params}`
     );
 
     if (!response.ok) {
@@ -311,6 +421,23 @@ export class InventoryAPI {
 
     return response.json();
   }
+
+  // Detect Near-Duplicates
+  async detectDuplicates(
+    sessionId: string,
+    threshold: number = 0.95,
+    maxPairs: number = 0
+  ): Promise<DuplicateDetectionResponse> {
+    const response = await fetch(
+      `${this.baseUrl}/api/analysis/duplicates/${sessionId}?threshold=${threshold}&max_pairs=${maxPairs}`
+    );
+
+    if (!response.ok) {
+      throw new Error(`Failed to detect duplicates: ${response.statusText}`);
+    }
+
+    return response.json();
+  }
 }
 
 // Export singleton instance